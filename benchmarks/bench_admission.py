@@ -0,0 +1,199 @@
+# benchmarks/bench_admission.py
+"""Latencia de clientes bem-comportados com e sem o controle de admissao do tracker.
+
+Um peer semeador anuncia um catalogo grande (list_files fica caro); clientes
+"bons" fazem poucas requisicoes por segundo (search, get_peer_score, heartbeat)
+enquanto clientes abusivos repetem list_files sem pausa e sem respeitar o
+retry_after. Tres cenarios, cada um com um tracker novo:
+
+- sem_abuso: so os clientes bons (referencia);
+- abuso_aberto: com abusivos e o tracker sem controle
+  (--max-handlers 0 --rate-limits off: uma thread por conexao, sem limites);
+- abuso_admissao: com abusivos e o controle padrao (pool de handlers + limites).
+
+Reporta p50/p95/p99 e taxa de erro dos bons, requisicoes atendidas/recusadas
+dos abusivos e o contador "rejected" do tracker.
+
+Uso:
+    python3 benchmarks/bench_admission.py --files 3000 --abusers 4 --abuser-threads 8 --duration 15
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+
+import harness
+from common.connection import recv_all
+from common.protocol import create_message
+
+PASSWORD = "bench"
+SCENARIOS = {
+    "sem_abuso": ([], False),
+    "abuso_aberto": (["--max-handlers", "0", "--rate-limits", "off"], True),
+    "abuso_admissao": ([], True),
+}
+GOOD_MIX = ("search", "get_peer_score", "heartbeat")
+# O semeador renova o lease bem antes dos 30 s padrao
+SEED_HEARTBEAT = 10.0
+
+
+def _call(port, action, data, timeout):
+    """Uma requisicao em conexao nova. Retorna (latencia, resposta ou None, tipo de erro ou None)."""
+    started = time.perf_counter()
+    response, error = None, None
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout)
+            s.connect(('127.0.0.1', port))
+            s.sendall(create_message(action, data).encode())
+            response = json.loads(recv_all(s))
+        if not response.get("status", True):
+            error = "retry_after" if "retry_after" in response else "status_false"
+    except socket.timeout:
+        error = "timeout"
+    except (ConnectionRefusedError, ConnectionResetError, BrokenPipeError):
+        error = "reset"
+    except (OSError, ValueError):
+        error = "other"
+    return time.perf_counter() - started, response, error
+
+
+def _seed(port, num_files, stop):
+    """Anuncia o catalogo e mantem a sessao do semeador viva ate 'stop'."""
+    files = [{"name": f"arquivo_{i:05d}.bin", "size": 4 * 1024 * 1024, "hash": f"{i:064x}",
+              "chunk_hashes": [f"{i:060x}{c:04x}" for c in range(4)]} for i in range(num_files)]
+    _call(port, "login", {"port": 30000, "username": "seed", "password": PASSWORD}, 10)
+    _call(port, "announce", {"port": 30000, "username": "seed", "files": files}, 30)
+    while not stop.wait(SEED_HEARTBEAT):
+        _call(port, "heartbeat", {"port": 30000, "username": "seed"}, 10)
+
+
+def _good_client(port, index, rate, num_files, deadline, timeout, queue):
+    username = f"good{index}"
+    peer = {"port": 31000 + index, "username": username}
+    _call(port, "login", dict(peer, password=PASSWORD), timeout)
+    latencies, errors = [], {}
+    interval = 1.0 / rate
+    next_at = time.time()
+    while time.time() < deadline:
+        action = random.choice(GOOD_MIX)
+        if action == "search":
+            data = dict(peer, query=f"arquivo_{random.randrange(num_files):05d}")
+        elif action == "get_peer_score":
+            data = dict(peer, target_username="seed")
+        else:
+            data = peer
+        latency, _, error = _call(port, action, data, timeout)
+        latencies.append(latency)
+        if error:
+            errors[error] = errors.get(error, 0) + 1
+        next_at += interval
+        time.sleep(max(0.0, next_at - time.time()))
+    queue.put(("good", latencies, errors))
+
+
+def _abuser(port, index, threads, deadline, timeout, queue):
+    """Um cliente (usuario proprio) com varias threads pedindo list_files sem parar."""
+    counts = {}
+    lock = threading.Lock()
+
+    def hammer():
+        while time.time() < deadline:
+            _, _, error = _call(port, "list_files", {"username": f"abuser{index}"}, timeout)
+            with lock:
+                counts[error or "ok"] = counts.get(error or "ok", 0) + 1
+
+    workers = [threading.Thread(target=hammer) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    queue.put(("abuser", counts, None))
+
+
+def run_scenario(name, args, workdir):
+    tracker_args, abuse = SCENARIOS[name]
+    state_file = os.path.join(workdir, f"{name}_state.json")
+    users = {"seed": PASSWORD, **{f"good{i}": PASSWORD for i in range(args.good)}}
+    harness.write_state(state_file, users)
+    port = harness.free_port()
+    tracker = harness.start_tracker(port, state_file, tracker_args)
+    stop = threading.Event()
+    seeder = threading.Thread(target=_seed, args=(port, args.files, stop), daemon=True)
+    try:
+        seeder.start()
+        while len(_call(port, "list_files", {}, 30)[1].get("files", {})) < args.files:
+            time.sleep(0.2)
+        deadline = time.time() + args.duration
+        queue = multiprocessing.Queue()
+        children = [multiprocessing.Process(target=_good_client,
+                                            args=(port, i, args.good_rate, args.files, deadline, args.timeout, queue))
+                    for i in range(args.good)]
+        if abuse:
+            children += [multiprocessing.Process(target=_abuser,
+                                                 args=(port, i, args.abuser_threads, deadline, args.timeout, queue))
+                         for i in range(args.abusers)]
+        for p in children:
+            p.start()
+        latencies, good_errors, abuser_counts = [], {}, {}
+        for _ in children:
+            kind, values, errors = queue.get()
+            if kind == "good":
+                latencies.extend(values)
+                for key, n in errors.items():
+                    good_errors[key] = good_errors.get(key, 0) + n
+            else:
+                for key, n in values.items():
+                    abuser_counts[key] = abuser_counts.get(key, 0) + n
+        for p in children:
+            p.join()
+        rejected = _call(port, "get_metrics", {}, 10)[1]["metrics"].get("rejected", {})
+    finally:
+        stop.set()
+        harness.stop_process(tracker)
+
+    ms = lambda pct: round(harness.percentile(latencies, pct) * 1000, 2)  # noqa: E731
+    failed = sum(good_errors.values())
+    return {
+        "scenario": name,
+        "tracker_args": tracker_args,
+        "good_requests": len(latencies),
+        "good_error_rate": round(failed / len(latencies), 4) if latencies else None,
+        "good_errors": good_errors,
+        "good_latency_ms": {"p50": ms(50), "p95": ms(95), "p99": ms(99)},
+        "abuser_rps": {k: round(n / args.duration, 1) for k, n in sorted(abuser_counts.items())},
+        "tracker_rejected": rejected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=3000, help='Arquivos no catalogo (peso de cada list_files)')
+    parser.add_argument('--good', type=int, default=4, help='Clientes bem-comportados')
+    parser.add_argument('--good-rate', type=float, default=5.0, help='Requisicoes por segundo de cada cliente bom')
+    parser.add_argument('--abusers', type=int, default=4, help='Clientes abusivos (um processo e usuario cada)')
+    parser.add_argument('--abuser-threads', type=int, default=8, help='Conexoes simultaneas de cada abusivo')
+    parser.add_argument('--duration', type=float, default=15.0, help='Segundos por cenario')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Timeout por requisicao (s)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--output', default='admission_results.json')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.scenarios.split(','):
+            res = run_scenario(name, args, workdir)
+            lat = res["good_latency_ms"]
+            print(f"{name:>15}: bons p50 {lat['p50']} ms, p95 {lat['p95']} ms, p99 {lat['p99']} ms, "
+                  f"erros {'n/a' if res['good_error_rate'] is None else format(res['good_error_rate'], '.2%')} | abusivos {res['abuser_rps']} req/s")
+            results.append(res)
+    harness.save_results(args.output, {"git_revision": harness.git_revision(), "args": vars(args), "runs": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/bench_group_broadcast.py
+"""Latencia de broadcast numa sala com muitos membros, com e sem um membro travado.
+
+Cada membro e um par de sockets locais. Os membros "rapidos" sao lidos por uma
+unica thread com selectors; o membro travado nunca le, entao o buffer do socket
+dele enche. A latencia medida e o tempo entre broadcast() e a chegada da
+mensagem ao ultimo membro rapido.
+
+Uso:
+    python3 benchmarks/bench_group_broadcast.py --members 500 --messages 200
+"""
+import argparse
+import os
+import selectors
+import socket
+import tempfile
+import threading
+import time
+
+import harness
+
+ROOM = "bench"
+
+
+def _reader(socks, expected, arrivals, done):
+    """Le todos os membros rapidos e registra quando cada mensagem chegou ao ultimo deles."""
+    sel = selectors.DefaultSelector()
+    buffers = {}
+    for s in socks:
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ)
+        buffers[s] = b''
+    counts = {}
+    while len(arrivals) < expected:
+        for key, _ in sel.select(timeout=1):
+            data = key.fileobj.recv(65536)
+            if not data:
+                continue
+            buffers[key.fileobj] += data
+            *lines, buffers[key.fileobj] = buffers[key.fileobj].split(b'\n')
+            now = time.perf_counter()
+            for line in lines:
+                seq = int(line.split(b' ', 2)[1])
+                counts[seq] = counts.get(seq, 0) + 1
+                if counts[seq] == len(socks):
+                    arrivals[seq] = now
+    done.set()
+
+
+def run(group_chat, members, messages, payload, stalled):
+    group_chat.start_moderator_room(ROOM, "mod")
+    info = group_chat.rooms[ROOM]
+    fast_clients = []
+    keep = []
+    for i in range(members):
+        server_side, client_side = socket.socketpair()
+        keep.append((server_side, client_side))
+        writer = group_chat.MemberWriter(server_side, f"m{i}")
+        info['members'][f"m{i}"] = writer
+        if stalled and i == 0:
+            continue  # membro travado: ninguem le o client_side
+        fast_clients.append(client_side)
+
+    arrivals = {}
+    done = threading.Event()
+    threading.Thread(target=_reader, args=(fast_clients, messages, arrivals, done), daemon=True).start()
+
+    sent_at = {}
+    call_times = []
+    for seq in range(messages):
+        sent_at[seq] = time.perf_counter()
+        group_chat.broadcast(ROOM, f"msg {seq} {payload}")
+        call_times.append(time.perf_counter() - sent_at[seq])
+    done.wait(timeout=60)
+
+    latencies = [arrivals[s] - sent_at[s] for s in arrivals]
+    for server_side, client_side in keep:
+        server_side.close()
+        client_side.close()
+    group_chat.close_room(ROOM)
+    return {
+        "stalled_member": stalled,
+        "delivered": len(latencies),
+        "broadcast_call_ms_p50": round(harness.percentile(call_times, 50) * 1000, 3),
+        "latency_ms_p50": round(harness.percentile(latencies, 50) * 1000, 3),
+        "latency_ms_p99": round(harness.percentile(latencies, 99) * 1000, 3),
+        "latency_ms_max": round(max(latencies) * 1000, 3) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--members', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--payload', type=int, default=1024, help='Bytes por mensagem')
+    parser.add_argument('--policy', default='drop', choices=['drop', 'disconnect'])
+    parser.add_argument('--output', default='bench_group_broadcast.json')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # group_chat cria group_logs/ no diretorio atual
+        from features import group_chat
+        group_chat.SLOW_CONSUMER_POLICY = args.policy
+        payload = 'x' * args.payload
+        results = []
+        for stalled in (False, True):
+            res = run(group_chat, args.members, args.messages, payload, stalled)
+            print(f"membro travado={stalled}: broadcast() p50 {res['broadcast_call_ms_p50']} ms | "
+                  f"entrega p50 {res['latency_ms_p50']} ms, p99 {res['latency_ms_p99']} ms "
+                  f"({res['delivered']}/{args.messages} entregues)")
+            results.append(res)
+    harness.save_results(output, {"members": args.members, "messages": args.messages,
+                                  "payload": args.payload, "policy": args.policy, "runs": results})
+
+
+if __name__ == "__main__":
+    main()
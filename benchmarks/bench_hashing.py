@@ -0,0 +1,99 @@
+# benchmarks/bench_hashing.py
+"""Compara a vazao (MB/s) dos algoritmos de hash aceitos em utils/hashing.py.
+
+Mede tres usos reais:
+- chunk: um hash por chunk de 1 MB, como no anuncio (varias threads, como
+  os downloads paralelos; o hashlib libera o GIL para blocos grandes);
+- incremental: update em pedacos de 64 KB, como download.py faz enquanto recebe;
+- anuncio: split_file_into_chunks de um arquivo em disco para um repositorio
+  de chunks temporario (leitura + hash do arquivo + hash dos chunks + escrita).
+
+CPUs com instrucoes SHA (SHA-NI, ARMv8 SHA2) aceleram o sha256 em hardware;
+sem elas o blake2b costuma ser bem mais rapido. Rode no host de destino antes
+de escolher o --hash-algo do tracker.
+
+Uso:
+    python3 benchmarks/bench_hashing.py --size-mb 256 --threads 1,4
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import harness
+from utils.chunk_manager import split_file_into_chunks, CHUNK_SIZE
+from utils.chunk_store import ChunkStore
+from utils.hashing import HASH_ALGORITHMS, new_hasher
+
+PIECE = 64 * 1024
+
+
+def hash_chunks(algo, data, threads):
+    """Hash de cada chunk de 'data', dividido entre as threads. Retorna MB/s."""
+    chunks = [data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
+
+    def work(part):
+        for chunk in part:
+            new_hasher(algo, chunk).hexdigest()
+
+    workers = [threading.Thread(target=work, args=(chunks[i::threads],)) for i in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return len(data) / (1024 * 1024) / (time.perf_counter() - started)
+
+
+def hash_incremental(algo, data):
+    view = memoryview(data)
+    started = time.perf_counter()
+    hasher = new_hasher(algo)
+    for i in range(0, len(data), PIECE):
+        hasher.update(view[i:i + PIECE])
+    hasher.hexdigest()
+    return len(data) / (1024 * 1024) / (time.perf_counter() - started)
+
+
+def hash_announce(algo, path, size_mb):
+    with tempfile.TemporaryDirectory() as store_dir:
+        started = time.perf_counter()
+        split_file_into_chunks(path, ChunkStore(store_dir), algo)
+        return size_mb / (time.perf_counter() - started)
+
+
+def best(fn, repeat):
+    return round(max(fn() for _ in range(repeat)), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=128, help='Dados hasheados por medida')
+    parser.add_argument('--threads', default='1,4', help='Threads para o hash por chunk')
+    parser.add_argument('--algos', default=','.join(sorted(HASH_ALGORITHMS)))
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticoes (vale a melhor)')
+    parser.add_argument('--output', default='hashing_results.json')
+    args = parser.parse_args()
+
+    thread_counts = [int(t) for t in args.threads.split(',')]
+    algos = [a.strip() for a in args.algos.split(',')]
+    data = os.urandom(args.size_mb * 1024 * 1024)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "dados.bin")
+        with open(path, 'wb') as f:
+            f.write(data)
+        for algo in algos:
+            res = {"algo": algo}
+            for threads in thread_counts:
+                res[f"chunk_{threads}t_mb_s"] = best(lambda: hash_chunks(algo, data, threads), args.repeat)
+            res["incremental_mb_s"] = best(lambda: hash_incremental(algo, data), args.repeat)
+            res["announce_mb_s"] = best(lambda: hash_announce(algo, path, args.size_mb), args.repeat)
+            print(f"{algo:>8}: " + " | ".join(f"{k.replace('_mb_s', '')} {v} MB/s" for k, v in res.items() if k != "algo"))
+            results.append(res)
+    harness.save_results(args.output, {"git_revision": harness.git_revision(), "args": vars(args), "runs": results})
+
+
+if __name__ == "__main__":
+    main()
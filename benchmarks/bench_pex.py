@@ -0,0 +1,175 @@
+# benchmarks/bench_pex.py
+"""Enxame em localhost para medir quanto o PEX tira do tracker.
+
+Sobe um tracker e N semeadores headless com o mesmo arquivo (1 slot de upload
+cada) e dispara D downloaders ao mesmo tempo, cada um em seu processo. Cada
+downloader recebe do tracker so os --top-k peers do arquivo; as demais fontes
+vem por PEX (modo "pex") ou de novas buscas no tracker quando todas as fontes
+conhecidas estao ocupadas (modo "tracker", PEX=0). Os downloaders tem
+pontuacao baixa, entao os semeadores limitam a banda e as filas de upload
+enchem: e nesse ponto que um downloader precisa de mais fontes. Com --churn,
+parte dos semeadores sai do enxame no meio dos downloads (logout), e quem
+dependia deles precisa achar outras fontes.
+
+Mostra o tempo dos downloads e as requisicoes recebidas pelo tracker
+(descoberta = search/list_files), lidas de get_metrics.
+
+Uso:
+    python3 benchmarks/bench_pex.py --seeders 6 --downloaders 8 --size-mb 8 --top-k 2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import harness
+from common.connection import send_message
+from swarm_bench import make_file
+
+PASSWORD = "bench"
+FILE_NAME = "enxame.bin"
+DISCOVERY_ACTIONS = ("search", "list_files")
+
+
+def tracker_requests(port):
+    res = send_message('127.0.0.1', port, "get_metrics", {})
+    return res.get("metrics", {}).get("requests", {})
+
+
+def wait_announced(port, seeders, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        res = send_message('127.0.0.1', port, "search", {"query": FILE_NAME})
+        meta = (res.get("files") or {}).get(FILE_NAME)
+        if meta and meta.get("peer_count") == seeders:
+            return
+        time.sleep(0.2)
+    raise TimeoutError("Os semeadores nao anunciaram o arquivo a tempo")
+
+
+def downloader(workdir, port, username, top_k, threads, pex_enabled, results):
+    """Processo downloader: uma busca no tracker e o download do arquivo."""
+    os.makedirs(os.path.join(workdir, "downloads"), exist_ok=True)
+    os.chdir(workdir)
+    os.environ['PEX'] = '1' if pex_enabled else '0'
+    os.environ['PEER_TELEMETRY_FILE'] = os.path.join(workdir, "transfers.jsonl")
+    from utils.config import set_tracker_address
+    from features import download
+    from features.network import send_to_tracker
+    set_tracker_address('127.0.0.1', port)
+
+    def search():
+        res = send_to_tracker({"action": "search", "query": FILE_NAME, "username": username, "max_peers": top_k})
+        return (res.get("files") or {}).get(FILE_NAME)
+
+    started = time.perf_counter()
+    info = search()
+    ok = download.download_file(FILE_NAME, info, username, num_threads=threads,
+                                lookup=lambda: [p['peer'] for p in (search() or {}).get("peers", [])])
+    results.put({"username": username, "ok": ok, "elapsed_s": round(time.perf_counter() - started, 3)})
+
+
+def run_mode(mode, args, workdir):
+    pex_enabled = mode == "pex"
+    users = {f"seed{i}": PASSWORD for i in range(args.seeders)}
+    users.update({f"dl{i}": PASSWORD for i in range(args.downloaders)})
+    scores = {f"seed{i}": 10 for i in range(args.seeders)}
+    state_file = os.path.join(workdir, "tracker_state.json")
+    harness.write_state(state_file, users, scores)
+
+    port = harness.free_port()
+    tracker = harness.start_tracker(port, state_file)
+    peers = []
+    try:
+        source = os.path.join(workdir, FILE_NAME)
+        make_file(source, args.size_mb, seed=args.size_mb)
+        for i in range(args.seeders):
+            shared = os.path.join(workdir, f"seed{i}", "shared")
+            os.makedirs(shared)
+            shutil.copy(source, shared)
+            peers.append(harness.start_peer(os.path.join(workdir, f"seed{i}"), port, f"seed{i}", PASSWORD))
+        wait_announced(port, args.seeders)
+
+        before = tracker_requests(port)
+        ctx = multiprocessing.get_context("fork")
+        results = ctx.Queue()
+        procs = [ctx.Process(target=downloader,
+                             args=(os.path.join(workdir, f"dl{i}"), port, f"dl{i}", args.top_k, args.threads,
+                                   pex_enabled, results))
+                 for i in range(args.downloaders)]
+        started = time.perf_counter()
+        for proc in procs:
+            proc.start()
+        if args.churn:
+            time.sleep(args.churn_after)
+            for proc in peers[:int(args.seeders * args.churn)]:
+                harness.stop_process(proc)
+        runs = [results.get(timeout=args.timeout) for _ in procs]
+        wall = time.perf_counter() - started
+        for proc in procs:
+            proc.join()
+        after = tracker_requests(port)
+    finally:
+        for proc in peers:
+            harness.stop_process(proc)
+        harness.stop_process(tracker)
+
+    delta = {action: after.get(action, 0) - before.get(action, 0) for action in after}
+    delta.pop("get_metrics", None)
+    downloads = []
+    for i in range(args.downloaders):
+        path = os.path.join(workdir, f"dl{i}", "transfers.jsonl")
+        if os.path.exists(path):
+            with open(path) as f:
+                downloads += [r for r in map(json.loads, f) if r.get("event") == "download"]
+    times = [r["elapsed_s"] for r in runs]
+    return {
+        "mode": mode,
+        "ok": sum(1 for r in runs if r["ok"]),
+        "downloads": len(runs),
+        "wall_s": round(wall, 3),
+        "mean_download_s": round(sum(times) / len(times), 3),
+        "p95_download_s": round(harness.percentile(times, 95), 3),
+        "discovery_requests": sum(delta.get(a, 0) for a in DISCOVERY_ACTIONS),
+        "tracker_requests": sum(delta.values()),
+        "tracker_requests_by_action": delta,
+        "sources_per_download": round(sum(r.get("peers", 0) for r in downloads) / max(1, len(downloads)), 2),
+        "sources_from_pex": sum(r.get("pex_peers", 0) for r in downloads),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seeders', type=int, default=6)
+    parser.add_argument('--downloaders', type=int, default=8)
+    parser.add_argument('--size-mb', type=int, default=8)
+    parser.add_argument('--top-k', type=int, default=2, help='Peers devolvidos pelo tracker em cada busca')
+    parser.add_argument('--threads', type=int, default=4, help='Threads por download')
+    parser.add_argument('--upload-slots', type=int, default=1, help='Slots de upload de cada semeador')
+    parser.add_argument('--churn', type=float, default=0.5, help='Fracao dos semeadores que sai no meio')
+    parser.add_argument('--churn-after', type=float, default=4.0, help='Segundos ate a saida dos semeadores')
+    parser.add_argument('--modes', default='tracker,pex')
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--output', default='pex_results.json')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+
+    # Herdado pelos semeadores (ver utils/config.py)
+    os.environ['UPLOAD_SLOTS'] = str(args.upload_slots)
+    results = []
+    for mode in [m.strip() for m in args.modes.split(',')]:
+        with tempfile.TemporaryDirectory() as workdir:
+            res = run_mode(mode, args, workdir)
+        print(f"{mode:>7}: {res['ok']}/{res['downloads']} downloads em {res['wall_s']}s "
+              f"(medio {res['mean_download_s']}s, p95 {res['p95_download_s']}s) | "
+              f"tracker: {res['discovery_requests']} buscas, {res['tracker_requests']} requisicoes | "
+              f"{res['sources_per_download']} fontes por download ({res['sources_from_pex']} via PEX)")
+        results.append(res)
+    harness.save_results(output, {"git_revision": harness.git_revision(), "args": vars(args), "runs": results})
+
+
+if __name__ == "__main__":
+    main()
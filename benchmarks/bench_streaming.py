@@ -0,0 +1,154 @@
+# benchmarks/bench_streaming.py
+"""Tempo ate o primeiro byte: download normal x sequencial (features/streaming.py).
+
+Sobe um tracker e N semeadores headless com o mesmo arquivo e baixa neste
+processo. No modo normal o arquivo so existe depois do ultimo chunk e da
+montagem; no sequencial um consumidor le o arquivo enquanto ele cresce, e
+e medido quando recebe o primeiro byte e quando ja leu 25%, 50% e 100%.
+--rate-mb limita a banda do download (como um enlace mais lento) para que
+a diferenca apareca mesmo em localhost.
+
+Uso:
+    python3 benchmarks/bench_streaming.py --size-mb 32 --rate-mb 16 --readahead 4,8,16 --repeat 3
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+import harness
+from common.connection import send_message
+from swarm_bench import make_file
+
+PASSWORD = "bench"
+FILE_NAME = "midia.bin"
+READ_SIZE = 64 * 1024
+MILESTONES = (0.25, 0.5, 1.0)
+
+
+def wait_announced(port, seeders, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        res = send_message('127.0.0.1', port, "search", {"query": FILE_NAME})
+        meta = (res.get("files") or {}).get(FILE_NAME)
+        if meta and meta.get("peer_count") == seeders:
+            return meta
+        time.sleep(0.2)
+    raise TimeoutError("Os semeadores nao anunciaram o arquivo a tempo")
+
+
+def _consume(reader, size, started, marks):
+    """Le o stream ate o fim anotando o instante do primeiro byte e de cada marco."""
+    total = 0
+    pending = list(MILESTONES)
+    while True:
+        data = reader.read(READ_SIZE)
+        if not data:
+            break
+        if total == 0:
+            marks["first_byte"] = time.perf_counter() - started
+        total += len(data)
+        while pending and total >= pending[0] * size:
+            marks[f"read_{int(pending.pop(0) * 100)}"] = time.perf_counter() - started
+    reader.close()
+    marks["bytes_read"] = total
+
+
+def run_once(download, streaming, TokenBucket, info, args, readahead):
+    target = os.path.join(download.DOWNLOADS_FOLDER, FILE_NAME)
+    if os.path.exists(target):
+        os.remove(target)
+    # Sem isso o repositorio de chunks da rodada anterior evitaria a transferencia
+    shutil.rmtree(download.chunk_store.root, ignore_errors=True)
+    # Rajada de um chunk: sem isso o primeiro segundo de banda chegaria de uma vez
+    limiter = TokenBucket(args.rate_mb * 1024 * 1024, download.CHUNK_SIZE) if args.rate_mb else None
+    size = info["size"]
+    marks = {}
+    started = time.perf_counter()
+    if readahead is None:
+        ok = download.download_file(FILE_NAME, info, "leitor", num_threads=args.threads, rate_limiter=limiter)
+        elapsed = time.perf_counter() - started
+        # Nada pode ser lido antes do arquivo final existir
+        for key in ["first_byte"] + [f"read_{int(m * 100)}" for m in MILESTONES]:
+            marks[key] = elapsed
+    else:
+        stream = streaming.StreamingFile(target)
+        consumer = threading.Thread(target=_consume, args=(stream.open_reader(), size, started, marks))
+        consumer.start()
+        ok = download.download_file(FILE_NAME, info, "leitor", num_threads=args.threads, rate_limiter=limiter,
+                                    stream=stream, readahead=readahead)
+        elapsed = time.perf_counter() - started
+        consumer.join()
+        ok = ok and marks.get("bytes_read") == size
+    return ok, elapsed, marks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seeders', type=int, default=3)
+    parser.add_argument('--size-mb', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=4, help='Threads de download')
+    parser.add_argument('--rate-mb', type=float, default=16.0, help='Limite de banda do download em MB/s (0 = sem limite)')
+    parser.add_argument('--readahead', default='4,8,16', help='Janelas (em chunks) do modo sequencial')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='streaming_results.json')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    modes = [("normal", None)] + [(f"sequencial/janela {w}", int(w)) for w in args.readahead.split(',')]
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        first = os.path.join(workdir, "seed0", "shared", FILE_NAME)
+        for i in range(args.seeders):
+            os.makedirs(os.path.join(workdir, f"seed{i}", "shared"))
+        make_file(first, args.size_mb, seed=args.size_mb)
+        for i in range(1, args.seeders):
+            shutil.copy(first, os.path.join(workdir, f"seed{i}", "shared", FILE_NAME))
+        users = {f"seed{i}": PASSWORD for i in range(args.seeders)}
+        users["leitor"] = PASSWORD
+        state_file = os.path.join(workdir, "tracker_state.json")
+        # Pontuacao alta: os semeadores nao limitam a banda do leitor
+        harness.write_state(state_file, users, {u: 100 for u in users})
+        port = harness.free_port()
+        tracker = harness.start_tracker(port, state_file)
+        peers = []
+        try:
+            for i in range(args.seeders):
+                peers.append(harness.start_peer(os.path.join(workdir, f"seed{i}"), port, f"seed{i}", PASSWORD))
+            info = wait_announced(port, args.seeders)
+
+            requester_dir = os.path.join(workdir, "leitor")
+            os.makedirs(requester_dir)
+            os.chdir(requester_dir)
+            os.environ['PEER_TELEMETRY_FILE'] = os.path.join(requester_dir, "transfers.jsonl")
+            from utils.config import set_tracker_address
+            from utils.rate_limiter import TokenBucket
+            from features import download, streaming
+            set_tracker_address('127.0.0.1', port)
+
+            for name, readahead in modes:
+                runs = [run_once(download, streaming, TokenBucket, info, args, readahead) for _ in range(args.repeat)]
+                good = [(elapsed, marks) for ok, elapsed, marks in runs if ok]
+                res = {"mode": name, "readahead": readahead, "runs": len(runs), "failed": len(runs) - len(good)}
+                if good:
+                    res["elapsed_s"] = round(statistics.median(e for e, _ in good), 3)
+                    for key in good[0][1]:
+                        if key != "bytes_read":
+                            res[f"{key}_s"] = round(statistics.median(m[key] for _, m in good), 3)
+                print(f"{name:>22}: primeiro byte {res.get('first_byte_s')} s, 50% lido {res.get('read_50_s')} s, "
+                      f"total {res.get('elapsed_s')} s" + (f" ({res['failed']} falha(s))" if res["failed"] else ""))
+                results.append(res)
+        finally:
+            os.chdir(harness.REPO_ROOT)
+            for proc in peers:
+                harness.stop_process(proc)
+            harness.stop_process(tracker)
+
+    harness.save_results(output, {"git_revision": harness.git_revision(), "args": vars(args), "runs": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_tracker_shards.py
+"""Mede a vazao de announce/search de um cluster de trackers com 1, 2, 4... shards.
+
+Uso:
+    python3 benchmarks/bench_tracker_shards.py --shards 1,2,4 --clients 8 --duration 5
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import harness
+import utils.config as config
+from features.network import send_to_tracker
+
+BENCH_PASSWORD = "bench"
+
+
+def _client(shards, client_id, action, duration, counter):
+    config.set_tracker_shards(shards)
+    user = f"bench{client_id}"
+    port = 20000 + client_id  # porta "virtual" que identifica este peer
+    res = send_to_tracker({"action": "login", "port": port, "username": user, "password": BENCH_PASSWORD})
+    if not res.get("status"):
+        print(f"Cliente {client_id}: login falhou: {res.get('message')}")
+        return
+    ops = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        if action == "announce":
+            name = f"file_{client_id}_{ops}.bin"
+            send_to_tracker({"action": "announce", "port": port, "username": user, "files": [
+                {"name": name, "size": 1024, "hash": name, "chunk_hashes": [name]}
+            ]})
+        else:
+            send_to_tracker({"action": "search", "port": port, "username": user, "query": f"file_{client_id}_{ops % 50}."})
+        ops += 1
+    with counter.get_lock():
+        counter.value += ops
+
+
+def run_cluster(num_shards, clients, duration, workdir):
+    ports = [harness.free_port() for _ in range(num_shards)]
+    shards = [f"127.0.0.1:{p}" for p in ports]
+    state_file = os.path.join(workdir, f"state_{num_shards}.json")
+    harness.write_state(state_file, {f"bench{i}": BENCH_PASSWORD for i in range(clients)})
+
+    procs = []
+    try:
+        for idx, port in enumerate(ports):
+            procs.append(harness.start_tracker(port, state_file, ['--shards', ','.join(shards), '--shard-index', str(idx)]))
+        result = {"shards": num_shards}
+        for action in ("announce", "search"):
+            counter = multiprocessing.Value('i', 0)
+            workers = [multiprocessing.Process(target=_client, args=(shards, i, action, duration, counter))
+                       for i in range(clients)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            result[f"{action}_ops_per_sec"] = round(counter.value / duration, 1)
+        return result
+    finally:
+        for p in procs:
+            harness.stop_process(p)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shards', default='1,2,4', help='Quantidades de shards a testar')
+    parser.add_argument('--clients', type=int, default=8, help='Processos clientes simultaneos')
+    parser.add_argument('--duration', type=float, default=5.0, help='Segundos por fase')
+    parser.add_argument('--output', default='bench_shards.json')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in [int(x) for x in args.shards.split(',')]:
+            res = run_cluster(n, args.clients, args.duration, workdir)
+            print(f"{n} shard(s): announce {res['announce_ops_per_sec']} ops/s | search {res['search_ops_per_sec']} ops/s")
+            results.append(res)
+    harness.save_results(args.output, {"clients": args.clients, "duration": args.duration, "runs": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_tracker_workers.py
+"""Mede a vazao de list_files/get_peer_score com o tracker em 0 (processo unico), 1, 2, 4... workers.
+
+Uso:
+    python3 benchmarks/bench_tracker_workers.py --workers 0,1,2,4 --clients 8 --duration 5
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import harness
+from common.connection import send_message
+
+NUM_FILES = 200
+NUM_USERS = 50
+
+
+def _populate(port):
+    """Um peer semeador anuncia NUM_FILES arquivos para dar trabalho ao list_files."""
+    send_message('127.0.0.1', port, "login", {"port": 30000, "username": "seeder", "password": "bench"})
+    files = [{"name": f"file_{i}.bin", "size": 1024 * 1024, "hash": f"{i:064x}", "chunk_hashes": [f"{i:064x}"]}
+             for i in range(NUM_FILES)]
+    send_message('127.0.0.1', port, "announce", {"port": 30000, "username": "seeder", "files": files})
+
+
+def _client(port, action, duration, counter, errors):
+    ops = errs = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        if action == "list_files":
+            res = send_message('127.0.0.1', port, "list_files", {"port": 1, "username": "bench"})
+            ok = len(res.get("files", {})) == NUM_FILES
+        else:
+            res = send_message('127.0.0.1', port, "get_peer_score", {"target_username": f"user{ops % NUM_USERS}"})
+            ok = res.get("status", False)
+        ops += 1
+        errs += 0 if ok else 1
+    with counter.get_lock():
+        counter.value += ops
+    with errors.get_lock():
+        errors.value += errs
+
+
+def run(workers, clients, duration, workdir):
+    port = harness.free_port()
+    state_file = os.path.join(workdir, f"state_{workers}.json")
+    users = {f"user{i}": "bench" for i in range(NUM_USERS)}
+    users["seeder"] = "bench"
+    harness.write_state(state_file, users, {u: i for i, u in enumerate(users)})
+    proc = harness.start_tracker(port, state_file, ['--workers', str(workers)])
+    try:
+        _populate(port)
+        time.sleep(0.5)  # tempo para as replicas dos workers sincronizarem
+        result = {"workers": workers}
+        for action in ("list_files", "get_peer_score"):
+            counter = multiprocessing.Value('i', 0)
+            errors = multiprocessing.Value('i', 0)
+            procs = [multiprocessing.Process(target=_client, args=(port, action, duration, counter, errors))
+                     for _ in range(clients)]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+            result[f"{action}_ops_per_sec"] = round(counter.value / duration, 1)
+            result[f"{action}_errors"] = errors.value
+        return result
+    finally:
+        harness.stop_process(proc)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', default='0,1,2,4', help='Quantidades de workers (0 = processo unico)')
+    parser.add_argument('--clients', type=int, default=8, help='Processos clientes simultaneos')
+    parser.add_argument('--duration', type=float, default=5.0, help='Segundos por acao')
+    parser.add_argument('--output', default='bench_workers.json')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in [int(x) for x in args.workers.split(',')]:
+            res = run(n, args.clients, args.duration, workdir)
+            print(f"{n} worker(s): list_files {res['list_files_ops_per_sec']} ops/s "
+                  f"({res['list_files_errors']} erros) | get_peer_score {res['get_peer_score_ops_per_sec']} ops/s "
+                  f"({res['get_peer_score_errors']} erros)")
+            results.append(res)
+    harness.save_results(args.output, {"clients": args.clients, "duration": args.duration,
+                                       "cpu_count": os.cpu_count(), "runs": results})
+
+
+if __name__ == "__main__":
+    main()
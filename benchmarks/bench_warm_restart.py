@@ -0,0 +1,141 @@
+# benchmarks/bench_warm_restart.py
+"""Mede o tempo entre reiniciar o tracker e voltar a servir o catalogo inteiro.
+
+- quente: o tracker grava o snapshot do catalogo ao receber SIGTERM e o carrega
+  na subida; os peers so confirmam com "reconcile" (um resumo por peer).
+- frio: sem snapshot (--catalog-file ""); todos os peers refazem login e
+  reanunciam seus arquivos ao mesmo tempo.
+
+Os anuncios do modo frio ja vem com os hashes prontos: o tempo real seria maior,
+pois cada peer ainda releria e recalcularia os hashes dos seus arquivos.
+
+Uso:
+    python3 benchmarks/bench_warm_restart.py --peers 100 --files-per-peer 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import harness
+from common.connection import send_message
+from common.catalog import catalog_digest
+
+BASE_PEER_PORT = 30000
+CHUNKS_PER_FILE = 4
+FILES_PER_PEER = 1000
+PASSWORD = "bench"
+
+
+def peer_files(peer):
+    return [{"name": f"p{peer}_f{i}.bin", "size": CHUNKS_PER_FILE * 1024 * 1024,
+             "hash": f"{peer:08x}{i:056x}",
+             "chunk_hashes": [f"{peer:08x}{i:048x}{c:08x}" for c in range(CHUNKS_PER_FILE)]}
+            for i in range(FILES_PER_PEER)]
+
+
+def login_and_announce(port, peer):
+    data = {"port": BASE_PEER_PORT + peer, "username": f"p{peer}"}
+    send_message('127.0.0.1', port, "login", {**data, "password": PASSWORD}, timeout=60)
+    res = send_message('127.0.0.1', port, "announce", {**data, "files": peer_files(peer)}, timeout=60)
+    return bool(res.get("status"))
+
+
+def reconcile(port, peer):
+    digest = catalog_digest({f["name"]: f["hash"] for f in peer_files(peer)})
+    res = send_message('127.0.0.1', port, "reconcile",
+                       {"port": BASE_PEER_PORT + peer, "username": f"p{peer}", "digest": digest}, timeout=60)
+    return bool(res.get("in_sync"))
+
+
+def serves_catalog(port, peers):
+    """O ultimo arquivo do ultimo peer aparece na busca com o peer que o tem."""
+    name = f"p{peers - 1}_f{FILES_PER_PEER - 1}.bin"
+    res = send_message('127.0.0.1', port, "search", {"query": name}, timeout=60)
+    return bool(res.get("files", {}).get(name, {}).get("peers"))
+
+
+def file_count(port):
+    res = send_message('127.0.0.1', port, "get_metrics", {}, timeout=60)
+    return res.get("metrics", {}).get("gauges", {}).get("files")
+
+
+def run_all(fn, port, peers, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return sum(pool.map(lambda peer: fn(port, peer), range(peers)))
+
+
+def restart(port, state_file, extra_args):
+    started = time.perf_counter()
+    proc = harness.start_tracker(port, state_file, extra_args)
+    return proc, started, time.perf_counter() - started
+
+
+def run(mode, peers, concurrency, workdir):
+    port = harness.free_port()
+    state_file = os.path.join(workdir, f"state_{mode}.json")
+    harness.write_state(state_file, {f"p{i}": PASSWORD for i in range(peers)})
+    args = ['--lease-seconds', '600']
+    if mode == "frio":
+        args += ['--catalog-file', '']
+
+    proc = harness.start_tracker(port, state_file, args)
+    try:
+        run_all(login_and_announce, port, peers, concurrency)
+        populated = file_count(port)
+    finally:
+        # SIGTERM: no modo quente o tracker grava o snapshot antes de sair
+        stop_started = time.perf_counter()
+        harness.stop_process(proc, timeout=120)
+        stop_seconds = time.perf_counter() - stop_started
+
+    catalog_file = os.path.splitext(state_file)[0] + ".catalog"
+    proc, started, listen_seconds = restart(port, state_file, args)
+    try:
+        if mode == "frio":
+            synced = run_all(login_and_announce, port, peers, concurrency)
+        serving_seconds = None
+        if serves_catalog(port, peers):
+            serving_seconds = time.perf_counter() - started
+        if mode == "quente":
+            synced = run_all(reconcile, port, peers, concurrency)
+        synced_seconds = time.perf_counter() - started
+        return {
+            "mode": mode, "files": populated, "restored_files": file_count(port),
+            "snapshot_bytes": os.path.getsize(catalog_file) if os.path.exists(catalog_file) else 0,
+            "stop_seconds": round(stop_seconds, 3), "listen_seconds": round(listen_seconds, 3),
+            "serving_seconds": serving_seconds and round(serving_seconds, 3),
+            "peers_synced": synced, "synced_seconds": round(synced_seconds, 3),
+        }
+    finally:
+        harness.stop_process(proc, timeout=120)
+
+
+def main():
+    global FILES_PER_PEER
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', type=int, default=100, help='Peers virtuais')
+    parser.add_argument('--files-per-peer', type=int, default=1000, help='Arquivos anunciados por peer')
+    parser.add_argument('--concurrency', type=int, default=16, help='Peers reconectando ao mesmo tempo')
+    parser.add_argument('--modes', default='quente,frio')
+    parser.add_argument('--output', default='bench_warm_restart.json')
+    args = parser.parse_args()
+    FILES_PER_PEER = args.files_per_peer
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in args.modes.split(','):
+            res = run(mode, args.peers, args.concurrency, workdir)
+            print(f"{mode}: {res['restored_files']}/{res['files']} arquivos | porta aberta em {res['listen_seconds']}s | "
+                  f"servindo em {res['serving_seconds']}s | {res['peers_synced']}/{args.peers} peers em dia em "
+                  f"{res['synced_seconds']}s | snapshot {res['snapshot_bytes'] / 1e6:.1f} MB "
+                  f"(gravado em {res['stop_seconds']}s)")
+            results.append(res)
+    harness.save_results(args.output, {"peers": args.peers, "files_per_peer": args.files_per_peer,
+                                       "concurrency": args.concurrency, "git_revision": harness.git_revision(),
+                                       "runs": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/harness.py
+"""Utilitarios compartilhados pelos benchmarks: sobe trackers/peers locais e mede tempos."""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TRACKER_SCRIPT = os.path.join(REPO_ROOT, 'tracker', 'tracker_server.py')
+PEER_SCRIPT = os.path.join(REPO_ROOT, 'peer', 'peer_client.py')
+
+# Permite importar utils/, common/ e as features do peer a partir dos benchmarks
+for path in (REPO_ROOT, os.path.join(REPO_ROOT, 'peer'), os.path.join(REPO_ROOT, 'tracker')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from auth_manager import hash_password  # noqa: E402
+
+
+def free_port():
+    """Reserva uma porta TCP livre no localhost."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(host, port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"{host}:{port} nao respondeu em {timeout}s")
+
+
+def write_state(path, users, scores=None):
+    """Cria um tracker_state.json com usuarios (senha em texto) e pontuacoes iniciais."""
+    scores = scores or {}
+    data = {
+        'users': {u: hash_password(p) for u, p in users.items()},
+        'scores': {u: {"uploads": 0, "uptime_seconds": 0, "score": scores.get(u, 0)} for u in users},
+        'rooms': {},
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def start_tracker(port, state_file, extra_args=(), quiet=True):
+    """Inicia um tracker em 127.0.0.1:port e espera ele aceitar conexoes."""
+    cmd = [sys.executable, TRACKER_SCRIPT, '--host', '127.0.0.1', '--port', str(port),
+           '--state-file', state_file, *extra_args]
+    out = subprocess.DEVNULL if quiet else None
+    proc = subprocess.Popen(cmd, stdout=out, stderr=out, cwd=REPO_ROOT)
+    wait_for_port('127.0.0.1', port)
+    return proc
+
+
+def start_peer(workdir, tracker_port, username, password, quiet=True):
+    """Inicia um peer em modo --headless; 'workdir' e o diretorio de trabalho dele (contem shared/)."""
+    cmd = [sys.executable, PEER_SCRIPT, '--tracker', f'127.0.0.1:{tracker_port}', '--headless',
+           '--user', username, '--password', password]
+    out = subprocess.DEVNULL if quiet else None
+    return subprocess.Popen(cmd, stdout=out, stderr=out, cwd=workdir)
+
+
+def stop_process(proc, timeout=5):
+    if proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def git_revision():
+    """Commit atual do repositorio, para identificar de onde veio cada arquivo de resultados."""
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Resultados salvos em {path}")
@@ -0,0 +1,174 @@
+# benchmarks/sim_peer_selection.py
+"""Simulacao de um enxame para comparar politicas de escolha de peers do tracker.
+
+- score: todos os peers ordenados por pontuacao; todas as threads do
+  downloader comecam pelo primeiro da lista (comportamento antigo).
+- score_top_k: os K de maior pontuacao, cada thread comecando por um
+  deles (isola o efeito de espalhar as threads).
+- load: top-K sorteado por pontuacao e carga (tracker/peer_selection.py), com
+  cada thread comecando por um peer diferente da lista.
+
+Semeadores tem capacidades de upload diferentes, divididas igualmente entre as
+conexoes abertas. O tracker so conhece a carga informada no ultimo heartbeat.
+Mostra vazao agregada, tempo de download e o indice de justica de Jain sobre a
+utilizacao dos semeadores e sobre a vazao de cada downloader.
+
+Uso:
+    python3 benchmarks/sim_peer_selection.py --seeders 10 --arrival-rate 2 --duration 120
+"""
+import argparse
+import random
+
+import harness
+from peer_selection import select_peers, TOP_K
+from features.upload_load import MAX_UPLOAD_SLOTS
+
+CHUNK_MB = 1.0
+DT = 0.05
+
+
+def jain(values):
+    """Indice de justica de Jain: 1 = perfeitamente igual, 1/n = um so recebe tudo."""
+    values = [v for v in values if v is not None]
+    if not values or not any(values):
+        return 0.0
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values))
+
+
+class Seeder:
+    def __init__(self, name, capacity, score):
+        self.name = name
+        self.capacity = capacity  # MB/s
+        self.score = score
+        self.connections = 0
+        self.served = 0.0
+        self.recent = []  # (instante, MB) para a vazao informada
+        self.reported = None
+
+    def report(self, now, window=10.0):
+        self.recent = [(t, mb) for t, mb in self.recent if now - t <= window]
+        self.reported = {"active_uploads": self.connections,
+                         "free_slots": max(0, MAX_UPLOAD_SLOTS - self.connections),
+                         "throughput": sum(mb for _, mb in self.recent) / window, "at": now}
+
+
+class Downloader:
+    def __init__(self, arrived, chunks):
+        self.arrived = arrived
+        self.pending = chunks
+        self.done_chunks = 0
+        self.total = chunks
+        self.finished = None
+
+
+def simulate(policy, seeders, arrivals, chunks, threads, heartbeat, duration, top_k, rng):
+    now = 0.0
+    next_heartbeat = 0.0
+    downloaders = []
+    transfers = []  # [downloader, semeador, MB restantes, peers, indice da thread]
+    started = []    # transferencias abertas no passo atual
+    arrivals = list(arrivals)
+
+    def assign(downloader, peers, thread_index):
+        if downloader.pending <= 0:
+            return
+        if policy == "score":
+            seeder = peers[0]
+        else:
+            seeder = peers[thread_index % len(peers)]
+        downloader.pending -= 1
+        seeder.connections += 1
+        started.append([downloader, seeder, CHUNK_MB, peers, thread_index])
+
+    while now < duration or transfers or started:
+        if now >= next_heartbeat:
+            for s in seeders:
+                s.report(now)
+            next_heartbeat += heartbeat
+        while arrivals and arrivals[0] <= now:
+            arrivals.pop(0)
+            d = Downloader(now, chunks)
+            downloaders.append(d)
+            if policy == "score":
+                peers = sorted(seeders, key=lambda s: s.score, reverse=True)
+            elif policy == "score_top_k":
+                peers = sorted(seeders, key=lambda s: s.score, reverse=True)[:top_k]
+            else:
+                chosen = select_peers([(s, s.score, s.reported) for s in seeders], top_k, rng=rng, now=now)
+                peers = [c[0] for c in chosen]
+            for i in range(min(threads, len(peers))):
+                assign(d, peers, i)
+
+        remaining = []
+        for transfer in transfers:
+            downloader, seeder, left, peers, thread_index = transfer
+            step = seeder.capacity / seeder.connections * DT
+            if step >= left:
+                seeder.connections -= 1
+                seeder.served += left
+                seeder.recent.append((now, left))
+                downloader.done_chunks += 1
+                if downloader.done_chunks == downloader.total:
+                    downloader.finished = now + DT
+                else:
+                    assign(downloader, peers, thread_index)
+            else:
+                transfer[2] = left - step
+                seeder.served += step
+                remaining.append(transfer)
+        transfers = remaining + started
+        started = []
+        now += DT
+        if now > duration * 10:
+            break  # politica que nao da conta da demanda: para e conta so os concluidos
+
+    finished = [d for d in downloaders if d.finished is not None]
+    times = sorted(d.finished - d.arrived for d in finished)
+    end = max((d.finished for d in finished), default=duration)
+    return {
+        "policy": policy,
+        "downloads": len(downloaders),
+        "finished": len(finished),
+        "throughput_mb_s": round(sum(s.served for s in seeders) / end, 2),
+        "mean_download_s": round(sum(times) / len(times), 2) if times else None,
+        "p95_download_s": round(harness.percentile(times, 95), 2) if times else None,
+        "seeder_fairness": round(jain([s.served / s.capacity for s in seeders]), 3),
+        "downloader_fairness": round(jain([d.total * CHUNK_MB / (d.finished - d.arrived) for d in finished]), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seeders', type=int, default=10)
+    parser.add_argument('--arrival-rate', type=float, default=2.0, help='Downloads iniciados por segundo')
+    parser.add_argument('--duration', type=float, default=120.0, help='Segundos com chegadas de downloads')
+    parser.add_argument('--chunks', type=int, default=16, help='Chunks de 1 MB por arquivo')
+    parser.add_argument('--threads', type=int, default=4, help='Threads por download')
+    parser.add_argument('--heartbeat', type=float, default=10.0, help='Segundos entre relatos de carga')
+    parser.add_argument('--top-k', type=int, default=TOP_K)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='sim_peer_selection.json')
+    args = parser.parse_args()
+
+    results = []
+    for policy in ("score", "score_top_k", "load"):
+        rng = random.Random(args.seed)
+        seeders = [Seeder(f"s{i}", capacity=rng.uniform(1.0, 8.0), score=rng.paretovariate(1.2) * 10)
+                   for i in range(args.seeders)]
+        arrivals, t = [], 0.0
+        while True:
+            t += rng.expovariate(args.arrival_rate)
+            if t >= args.duration:
+                break
+            arrivals.append(t)
+        res = simulate(policy, seeders, arrivals, args.chunks, args.threads, args.heartbeat,
+                       args.duration, args.top_k, rng)
+        print(f"{policy:>11}: {res['finished']}/{res['downloads']} downloads concluidos | {res['throughput_mb_s']} MB/s agregados | "
+              f"download medio {res['mean_download_s']}s (p95 {res['p95_download_s']}s) | "
+              f"justica semeadores {res['seeder_fairness']} downloaders {res['downloader_fairness']}")
+        results.append(res)
+    harness.save_results(args.output, {"args": vars(args), "runs": results})
+
+
+if __name__ == "__main__":
+    main()
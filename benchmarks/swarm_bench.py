@@ -0,0 +1,174 @@
+# benchmarks/swarm_bench.py
+"""Benchmark ponta a ponta: tracker + N peers headless em localhost.
+
+Gera arquivos sinteticos, distribui cada um entre 1 ou N semeadores e mede o
+download (feito por este processo, com features/download.py) variando o
+numero de threads e o requisitante: "unthrottled" (pontuacao alta) ou
+"throttled" (pontuacao abaixo do limite de throttling dos peers).
+
+O arquivo de resultados inclui o commit atual; com --compare ele e comparado
+a um resultado anterior, cenario a cenario, para achar regressoes em
+download.py, peer_client.py ou tracker_server.py.
+
+Uso:
+    python3 benchmarks/swarm_bench.py --seeders 3 --sizes 4,16 --threads 1,4
+    python3 benchmarks/swarm_bench.py --compare swarm_results_antes.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import harness
+import transfer_report
+from common.connection import send_message
+
+PASSWORD = "bench"
+# Requisitante -> (usuario, pontuacao inicial no tracker)
+REQUESTERS = {"unthrottled": ("fast", 100), "throttled": ("slow", 0)}
+BLOCK = 1024 * 1024
+
+
+def make_file(path, size_mb, seed):
+    rng = random.Random(seed)
+    with open(path, 'wb') as f:
+        for _ in range(size_mb):
+            f.write(rng.randbytes(BLOCK))
+
+
+def setup_files(workdir, seeders, sizes):
+    """Cria os diretorios dos semeadores; cada tamanho tem uma versao com 1 e outra com N semeadores."""
+    for i in range(seeders):
+        os.makedirs(os.path.join(workdir, f"seed{i}", "shared"), exist_ok=True)
+    files = {}
+    for size in sizes:
+        for copies in sorted({1, seeders}):
+            name = f"{size}mb_{copies}seed.bin"
+            first = os.path.join(workdir, "seed0", "shared", name)
+            make_file(first, size, seed=size * 1000 + copies)
+            for i in range(1, copies):
+                shutil.copy(first, os.path.join(workdir, f"seed{i}", "shared", name))
+            files[name] = (size, copies)
+    return files
+
+
+def wait_announced(port, files, timeout=120):
+    """Espera todos os semeadores anunciarem; retorna a lista de arquivos do tracker."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        res = send_message('127.0.0.1', port, "list_files", {"port": 1, "username": "fast"})
+        listed = res.get("files") or {}
+        if all(len(listed.get(name, {}).get("peers", [])) == copies for name, (_, copies) in files.items()):
+            return listed
+        time.sleep(0.2)
+    raise TimeoutError("Os semeadores nao anunciaram os arquivos a tempo")
+
+
+def run_download(download, name, info, username, threads):
+    target = os.path.join(download.DOWNLOADS_FOLDER, name)
+    if os.path.exists(target):
+        os.remove(target)
+    # Sem isso o repositorio de chunks da rodada anterior evitaria a transferencia
+    shutil.rmtree(download.chunk_store.root, ignore_errors=True)
+    started = time.perf_counter()
+    ok = download.download_file(name, info, username, num_threads=threads)
+    return ok, time.perf_counter() - started
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {r["scenario"]: r for r in json.load(f)["runs"]}
+    print(f"\nComparacao com {baseline_path}:")
+    for run in results:
+        old = baseline.get(run["scenario"])
+        if not old or not old["throughput_mb_s"] or not run["throughput_mb_s"]:
+            print(f"  {run['scenario']}: sem referencia")
+            continue
+        delta = (run["throughput_mb_s"] - old["throughput_mb_s"]) / old["throughput_mb_s"] * 100
+        print(f"  {run['scenario']}: {old['throughput_mb_s']} -> {run['throughput_mb_s']} MB/s ({delta:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seeders', type=int, default=3, help='Numero de peers semeadores')
+    parser.add_argument('--sizes', default='4', help='Tamanhos dos arquivos em MB, separados por virgula')
+    parser.add_argument('--threads', default='1,4', help='Threads de download a testar')
+    parser.add_argument('--requesters', default='unthrottled,throttled', help='unthrottled e/ou throttled')
+    parser.add_argument('--repeat', type=int, default=1, help='Repeticoes de cada cenario')
+    parser.add_argument('--output', default='swarm_results.json')
+    parser.add_argument('--compare', help='Resultado anterior para comparar')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    thread_counts = [int(t) for t in args.threads.split(',')]
+    requesters = [r.strip() for r in args.requesters.split(',')]
+    output = os.path.abspath(args.output)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        files = setup_files(workdir, args.seeders, sizes)
+        users = {f"seed{i}": PASSWORD for i in range(args.seeders)}
+        users.update({user: PASSWORD for user, _ in REQUESTERS.values()})
+        scores = {f"seed{i}": 10 for i in range(args.seeders)}
+        scores.update({user: score for user, score in REQUESTERS.values()})
+        state_file = os.path.join(workdir, "tracker_state.json")
+        harness.write_state(state_file, users, scores)
+
+        port = harness.free_port()
+        tracker = harness.start_tracker(port, state_file)
+        peers = []
+        try:
+            for i in range(args.seeders):
+                peers.append(harness.start_peer(os.path.join(workdir, f"seed{i}"), port, f"seed{i}", PASSWORD))
+            listed = wait_announced(port, files)
+
+            # O download roda neste processo, com a telemetria indo para o diretorio temporario
+            requester_dir = os.path.join(workdir, "requester")
+            os.makedirs(requester_dir)
+            os.chdir(requester_dir)
+            telemetry_file = os.path.join(requester_dir, "transfers.jsonl")
+            os.environ['PEER_TELEMETRY_FILE'] = telemetry_file
+            from features import download
+
+            runs = []
+            for name, (size, copies) in sorted(files.items()):
+                for threads in thread_counts:
+                    for requester in requesters:
+                        username = REQUESTERS[requester][0]
+                        scenario = f"{size}MB/{copies} semeador(es)/{threads} threads/{requester}"
+                        for _ in range(args.repeat):
+                            ok, elapsed = run_download(download, name, listed[name], username, threads)
+                            run = {"scenario": scenario, "size_mb": size, "seeders": copies, "threads": threads,
+                                   "requester": requester, "ok": ok, "elapsed_s": round(elapsed, 3),
+                                   "throughput_mb_s": round(size / elapsed, 3) if ok else None}
+                            print(f"{scenario}: {run['elapsed_s']} s, {run['throughput_mb_s']} MB/s"
+                                  + ("" if ok else " (FALHOU)"))
+                            runs.append(run)
+
+            chunks, downloads = transfer_report.load([telemetry_file])
+            telemetry = {
+                "per_peer": transfer_report.summarize_chunks(chunks, lambda r: r["peer"]),
+                "per_score_tier": transfer_report.summarize_chunks(
+                    chunks, lambda r: transfer_report.score_tier(r.get("peer_score"))),
+            }
+        finally:
+            os.chdir(harness.REPO_ROOT)
+            for proc in peers:
+                harness.stop_process(proc)
+            harness.stop_process(tracker)
+
+    harness.save_results(output, {
+        "git_revision": harness.git_revision(),
+        "config": {"seeders": args.seeders, "sizes_mb": sizes, "threads": thread_counts,
+                   "requesters": requesters, "repeat": args.repeat},
+        "runs": runs,
+        "telemetry": telemetry,
+    })
+    if args.compare:
+        compare(runs, args.compare)
+
+
+if __name__ == "__main__":
+    main()
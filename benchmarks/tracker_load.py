@@ -0,0 +1,225 @@
+# benchmarks/tracker_load.py
+"""Gerador de carga do plano de controle do tracker.
+
+Simula milhares de peers virtuais (usuarios vp0..vpN ja cadastrados) que
+executam uma mistura de acoes (login, announce, list_files, get_peer_score,
+report_upload). A concorrencia sobe em estagios (rampa); para cada estagio sao
+reportados vazao, taxa de erro (por tipo: timeout, conexao recusada/resetada,
+resposta com status falso) e percentis de latencia por acao. O primeiro
+estagio em que a vazao para de crescer ou os erros passam de 1% e apontado
+como ponto de saturacao.
+
+Cada conexao e aberta do zero, como fazem os peers, entao o backlog do
+listen() e o save_state() por requisicao aparecem no resultado.
+
+Uso:
+    python3 benchmarks/tracker_load.py --peers 5000 --stages 8,32,128,512 --stage-duration 10
+    python3 benchmarks/tracker_load.py --target 127.0.0.1:5000 ...   # tracker ja em execucao
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+
+import harness
+from common.connection import recv_all
+from common.protocol import create_message
+
+PASSWORD = "bench"
+DEFAULT_MIX = "login:5,announce:10,list_files:30,get_peer_score:40,report_upload:15"
+FILES_PER_PEER = 3
+# Ganho minimo de vazao entre estagios antes de considerar o tracker saturado
+SATURATION_GAIN = 1.10
+SATURATION_ERROR_RATE = 0.01
+# Refaz o login antes do lease padrao do tracker (30 s) expirar
+SESSION_REFRESH = 20.0
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        action, weight = item.split(':')
+        mix[action.strip()] = float(weight)
+    return mix
+
+
+def _call(host, port, action, data, timeout):
+    """Uma requisicao em conexao nova. Retorna (latencia, tipo de erro ou None)."""
+    started = time.perf_counter()
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout)
+            s.connect((host, port))
+            s.sendall(create_message(action, data).encode())
+            response = json.loads(recv_all(s))
+        error = None if response.get("status", True) else "status_false"
+    except socket.timeout:
+        error = "timeout"
+    except ConnectionRefusedError:
+        error = "refused"
+    except (ConnectionResetError, BrokenPipeError):
+        error = "reset"
+    except (OSError, ValueError):
+        error = "other"
+    return time.perf_counter() - started, error
+
+
+def _request_for(action, vp, num_peers):
+    username = f"vp{vp}"
+    port = 20000 + vp % 40000
+    if action == "login":
+        return {"port": port, "username": username, "password": PASSWORD}
+    if action == "announce":
+        files = [{"name": f"vp{vp}_file{i}.bin", "size": 1024 * 1024, "hash": f"{vp:032x}{i:032x}",
+                  "chunk_hashes": [f"{vp:032x}{i:032x}"]} for i in range(FILES_PER_PEER)]
+        return {"port": port, "username": username, "files": files}
+    if action == "get_peer_score":
+        return {"username": username, "target_username": f"vp{random.randrange(num_peers)}"}
+    return {"port": port, "username": username}
+
+
+def _virtual_peers(host, port, peers, num_peers, mix, deadline, timeout, out):
+    """Uma thread: escolhe um peer virtual ao acaso e executa uma acao da mistura."""
+    actions, weights = zip(*mix.items())
+    logged_in = {}  # peer virtual -> instante do login
+    latencies, errors = {}, {}
+    while time.time() < deadline:
+        vp = random.choice(peers)
+        # Um peer virtual precisa de sessao antes de anunciar ou reportar uploads
+        fresh = time.time() - logged_in.get(vp, 0) < SESSION_REFRESH
+        action = random.choices(actions, weights)[0] if fresh else "login"
+        latency, error = _call(host, port, action, _request_for(action, vp, num_peers), timeout)
+        if action == "login" and error is None:
+            logged_in[vp] = time.time()
+        latencies.setdefault(action, []).append(latency)
+        if error:
+            key = f"{action}:{error}"
+            errors[key] = errors.get(key, 0) + 1
+    out.append((latencies, errors))
+
+
+def _process(host, port, peers, num_peers, threads, mix, duration, timeout, queue):
+    deadline = time.time() + duration
+    out = []
+    workers = []
+    for t in range(threads):
+        share = peers[t::threads] or peers
+        th = threading.Thread(target=_virtual_peers,
+                              args=(host, port, share, num_peers, mix, deadline, timeout, out))
+        th.start()
+        workers.append(th)
+    for th in workers:
+        th.join()
+    latencies, errors = {}, {}
+    for lat, err in out:
+        for action, values in lat.items():
+            latencies.setdefault(action, []).extend(values)
+        for key, n in err.items():
+            errors[key] = errors.get(key, 0) + n
+    queue.put((latencies, errors))
+
+
+def run_stage(host, port, num_peers, concurrency, procs, mix, duration, timeout):
+    procs = max(1, min(procs, concurrency))
+    queue = multiprocessing.Queue()
+    children = []
+    for i in range(procs):
+        threads = concurrency // procs + (1 if i < concurrency % procs else 0)
+        peers = list(range(i, num_peers, procs))
+        p = multiprocessing.Process(target=_process,
+                                    args=(host, port, peers, num_peers, threads, mix, duration, timeout, queue))
+        p.start()
+        children.append(p)
+    latencies, errors = {}, {}
+    for _ in children:
+        lat, err = queue.get()
+        for action, values in lat.items():
+            latencies.setdefault(action, []).extend(values)
+        for key, n in err.items():
+            errors[key] = errors.get(key, 0) + n
+    for p in children:
+        p.join()
+
+    everything = [v for values in latencies.values() for v in values]
+    total = len(everything)
+    failed = sum(errors.values())
+    ms = lambda values, pct: round(harness.percentile(values, pct) * 1000, 3)  # noqa: E731
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": round(total / duration, 1),
+        "error_rate": round(failed / total, 4) if total else None,
+        "errors": errors,
+        "latency_ms": {"p50": ms(everything, 50), "p95": ms(everything, 95), "p99": ms(everything, 99)},
+        "per_action": {a: {"requests": len(v), "p50_ms": ms(v, 50), "p95_ms": ms(v, 95), "p99_ms": ms(v, 99)}
+                       for a, v in sorted(latencies.items())},
+    }
+
+
+def find_saturation(stages):
+    """Primeiro estagio em que a vazao nao cresce o suficiente ou os erros passam do limite."""
+    for prev, cur in zip([None] + stages, stages):
+        if cur["error_rate"] and cur["error_rate"] > SATURATION_ERROR_RATE:
+            return cur["concurrency"]
+        if prev and cur["throughput_rps"] < prev["throughput_rps"] * SATURATION_GAIN:
+            return cur["concurrency"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', type=int, default=2000, help='Peers virtuais (usuarios cadastrados)')
+    parser.add_argument('--stages', default='8,32,128,256', help='Conexoes simultaneas de cada estagio da rampa')
+    parser.add_argument('--stage-duration', type=float, default=10.0, help='Segundos por estagio')
+    parser.add_argument('--procs', type=int, default=os.cpu_count() or 1, help='Processos geradores de carga')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Pesos das acoes: acao:peso,...')
+    parser.add_argument('--timeout', type=float, default=5.0, help='Timeout por requisicao (s)')
+    parser.add_argument('--target', help='Tracker ja em execucao (IP:PORTA); os usuarios vp* devem existir')
+    parser.add_argument('--tracker-args', default='', help='Argumentos extras para o tracker iniciado aqui')
+    parser.add_argument('--output', default='tracker_load.json')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    stages = [int(c) for c in args.stages.split(',')]
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        tracker = None
+        if args.target:
+            host, port = args.target.split(':')
+            port = int(port)
+        else:
+            host, port = '127.0.0.1', harness.free_port()
+            state_file = os.path.join(workdir, "tracker_state.json")
+            harness.write_state(state_file, {f"vp{i}": PASSWORD for i in range(args.peers)})
+            tracker = harness.start_tracker(port, state_file, args.tracker_args.split())
+        try:
+            for concurrency in stages:
+                res = run_stage(host, port, args.peers, concurrency, args.procs, mix,
+                                args.stage_duration, args.timeout)
+                error_rate = "n/a" if res['error_rate'] is None else f"{res['error_rate']:.2%}"
+                print(f"{concurrency:>5} conexoes: {res['throughput_rps']} req/s, erros {error_rate}, "
+                      f"p50 {res['latency_ms']['p50']} ms, p99 {res['latency_ms']['p99']} ms")
+                results.append(res)
+        finally:
+            if tracker:
+                harness.stop_process(tracker)
+
+    saturation = find_saturation(results)
+    if saturation:
+        print(f"Saturacao a partir de {saturation} conexoes simultaneas")
+    harness.save_results(args.output, {
+        "git_revision": harness.git_revision(),
+        "config": {"peers": args.peers, "stages": stages, "stage_duration": args.stage_duration,
+                   "procs": args.procs, "mix": mix, "tracker_args": args.tracker_args},
+        "stages": results,
+        "saturation_concurrency": saturation,
+    })
+
+
+if __name__ == "__main__":
+    main()
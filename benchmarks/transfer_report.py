@@ -0,0 +1,123 @@
+# benchmarks/transfer_report.py
+"""Resume a telemetria de transferencias gravada pelos peers (telemetry/transfers.jsonl).
+
+Agrupa as tentativas de chunk por peer de origem e por faixa de pontuacao
+(vazao = bytes recebidos / tempo de transferencia, latencia p50/p95, falhas e
+tempo de verificacao de hash) e os downloads completos pelo numero de threads
+(vazao media e desvio padrao).
+
+Uso:
+    python3 benchmarks/transfer_report.py telemetry/transfers.jsonl [--json relatorio.json]
+"""
+import argparse
+import json
+import statistics
+
+import harness
+
+# Mesma fronteira do throttling de upload em peer_client.py (pontuacao < 5 e limitada)
+SCORE_TIERS = ((5, "<5 (limitado)"), (20, "5-19"), (float('inf'), ">=20"))
+
+
+def score_tier(score):
+    if score is None:
+        return "desconhecida"
+    for bound, name in SCORE_TIERS:
+        if score < bound:
+            return name
+
+
+def load(paths):
+    chunks, downloads = [], []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # linha cortada por um peer interrompido
+                if record.get("event") == "chunk":
+                    chunks.append(record)
+                elif record.get("event") == "download":
+                    downloads.append(record)
+    return chunks, downloads
+
+
+def summarize_chunks(records, key):
+    groups = {}
+    for r in records:
+        groups.setdefault(key(r), []).append(r)
+    summary = {}
+    for name, group in sorted(groups.items(), key=lambda item: str(item[0])):
+        ok = [r for r in group if r["ok"]]
+        transfer_time = sum(r["latency"] for r in ok)
+        total_bytes = sum(r["bytes"] for r in ok)
+        latencies = [r["latency"] for r in ok]
+        summary[str(name)] = {
+            "attempts": len(group),
+            "failures": len(group) - len(ok),
+            "retried": sum(1 for r in group if r.get("retry")),
+            "bytes": total_bytes,
+            "throughput_mb_s": round(total_bytes / transfer_time / 1e6, 3) if transfer_time else None,
+            "latency_ms_p50": round(harness.percentile(latencies, 50) * 1000, 3) if latencies else None,
+            "latency_ms_p95": round(harness.percentile(latencies, 95) * 1000, 3) if latencies else None,
+            "hash_ms_mean": round(statistics.mean(r["hash_time"] for r in ok) * 1000, 3) if ok else None,
+        }
+    return summary
+
+
+def summarize_downloads(records):
+    groups = {}
+    for r in records:
+        if r["ok"] and r.get("size") and r["elapsed"] > 0:
+            groups.setdefault(r["threads"], []).append(r["size"] / r["elapsed"] / 1e6)
+    summary = {}
+    for threads, rates in sorted(groups.items()):
+        summary[str(threads)] = {
+            "downloads": len(rates),
+            "throughput_mb_s_mean": round(statistics.mean(rates), 3),
+            "throughput_mb_s_stdev": round(statistics.stdev(rates), 3) if len(rates) > 1 else 0.0,
+        }
+    failed = sum(1 for r in records if not r["ok"])
+    return summary, failed
+
+
+def print_table(title, summary, columns):
+    print(f"\n== {title} ==")
+    if not summary:
+        print("(sem registros)")
+        return
+    width = max(len(name) for name in summary) + 2
+    widths = [max(len(c), 8) + 2 for c in columns]
+    print("".ljust(width) + "".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for name, row in summary.items():
+        print(name.ljust(width) + "".join(str(row[c]).rjust(w) for c, w in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='+', help='Arquivos JSONL de telemetria (de um ou mais peers)')
+    parser.add_argument('--json', help='Grava o relatorio tambem em JSON')
+    args = parser.parse_args()
+
+    chunks, downloads = load(args.files)
+    per_peer = summarize_chunks(chunks, lambda r: r["peer"])
+    per_tier = summarize_chunks(chunks, lambda r: score_tier(r.get("peer_score")))
+    per_threads, failed_downloads = summarize_downloads(downloads)
+
+    chunk_columns = ["attempts", "failures", "throughput_mb_s", "latency_ms_p50", "latency_ms_p95", "hash_ms_mean"]
+    print_table("Por peer", per_peer, chunk_columns)
+    print_table("Por faixa de pontuacao", per_tier, chunk_columns)
+    print_table("Downloads por numero de threads", per_threads,
+                ["downloads", "throughput_mb_s_mean", "throughput_mb_s_stdev"])
+    print(f"\n{len(downloads)} downloads ({failed_downloads} com falha), {len(chunks)} tentativas de chunk")
+
+    if args.json:
+        harness.save_results(args.json, {
+            "per_peer": per_peer, "per_score_tier": per_tier, "per_thread_count": per_threads,
+            "downloads": len(downloads), "failed_downloads": failed_downloads, "chunk_attempts": len(chunks),
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import hashlib
+
+
+def catalog_digest(files):
+    """Resumo de {nome: hash do arquivo}; peer e tracker chegam ao mesmo valor se concordam."""
+    digest = hashlib.sha1()
+    for name in sorted(files):
+        digest.update(f"{name}\0{files[name]}\n".encode())
+    return digest.hexdigest()
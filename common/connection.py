@@ -1,15 +1,54 @@
 import socket
 from common.protocol import parse_message, create_message
 
+# Limite de uma requisicao (anuncios de arquivos grandes trazem muitos hashes de chunk)
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
 
-def send_message(host, port, action, data):
+
+def recv_all(sock, bufsize=4096):
+    """Le do socket ate o outro lado fechar a conexao."""
+    parts = []
+    while True:
+        part = sock.recv(bufsize)
+        if not part:
+            break
+        parts.append(part)
+    return b''.join(parts)
+
+
+def recv_request(sock, bufsize=65536, max_bytes=MAX_REQUEST_BYTES):
+    """Le uma requisicao JSON completa, mesmo que chegue em varios pedacos.
+
+    O cliente mantem o socket aberto esperando a resposta, entao nao da para
+    ler ate o EOF: tenta decodificar sempre que o que chegou termina em '}'.
+    Retorna None se a conexao fechar sem dados.
+    """
+    parts = []
+    size = 0
+    while True:
+        part = sock.recv(bufsize)
+        if not part:
+            break
+        parts.append(part)
+        size += len(part)
+        if part.rstrip().endswith(b'}'):
+            try:
+                return parse_message(b''.join(parts))
+            except ValueError:
+                pass
+        if size > max_bytes:
+            raise ValueError(f"Requisicao excede {max_bytes} bytes")
+    return parse_message(b''.join(parts)) if parts else None
+
+
+def send_message(host, port, action, data, timeout=5):
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.settimeout(5)
+            s.settimeout(timeout)
             s.connect((host, port))
             msg = create_message(action, data)
             s.sendall(msg.encode())
-            response = s.recv(4096).decode()
+            response = recv_all(s).decode()
             return parse_message(response)
     except socket.timeout:
         return {"status": False, "message": "Timeout na conexao com o servidor"}
@@ -17,4 +56,3 @@ def send_message(host, port, action, data):
         return {"status": False, "message": "Nao foi possivel conectar ao servidor"}
     except Exception as e:
         return {"status": False, "message": f"Erro na comunicacao: {str(e)}"}
-
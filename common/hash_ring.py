@@ -0,0 +1,30 @@
+import bisect
+import hashlib
+
+
+class HashRing:
+    """Anel de hash consistente com nos virtuais para particionar chaves entre shards."""
+
+    def __init__(self, nodes, replicas=64):
+        self.nodes = list(nodes)
+        self.replicas = replicas
+        self._keys = []
+        self._owners = []
+        points = []
+        for node in self.nodes:
+            for i in range(replicas):
+                points.append((self._hash(f"{node}#{i}"), node))
+        points.sort()
+        self._keys = [p[0] for p in points]
+        self._owners = [p[1] for p in points]
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def get_node(self, key):
+        """Retorna o no responsavel pela chave (primeiro ponto no sentido horario)."""
+        if not self._keys:
+            return None
+        idx = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._owners[idx]
@@ -8,3 +8,10 @@ def create_message(action, data):
 
 def parse_message(raw):
     return json.loads(raw)
+
+# Resposta de um peer sem slot de upload livre (no lugar dos bytes do chunk):
+# o downloader passa para o proximo peer em vez de esperar
+BUSY_RESPONSE = b'{"status": "busy"}'
+
+# Hashes aceitos por pedido de locate_chunks: arquivos maiores pedem em partes
+MAX_LOCATE_HASHES = 4096
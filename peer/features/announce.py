@@ -1,55 +1,274 @@
-# peer/features/announce.py
 import os
+import shutil
+import threading
 from utils.chunk_manager import split_file_into_chunks
+from utils.chunk_store import store
+from utils.hashing import negotiate, DEFAULT_HASH_ALGO
 from utils.logger import log
+from common.catalog import catalog_digest
+import utils.config as config
 from .network import send_to_tracker
 
 SHARED_FOLDER = 'shared'
+# Intervalo (s) entre duas varreduras da pasta pelo SharedFolderWatcher
+WATCH_INTERVAL = 2.0
+
+# O que o tracker conhece deste peer:
+# nome -> {"stat": (tamanho, mtime_ns), "hash_algo", "file_hash", "chunk_hashes"}
+_announced = {}
+_announce_lock = threading.Lock()
+# Algoritmo dos hashes anunciados, combinado com o tracker no login (ver set_hash_algo)
+hash_algo = DEFAULT_HASH_ALGO
+
+
+def set_hash_algo(offered):
+    """Escolhe o algoritmo de hash entre os oferecidos pelo tracker no login."""
+    global hash_algo
+    hash_algo = negotiate(offered)
+    if hash_algo != DEFAULT_HASH_ALGO:
+        log(f"Hashes de arquivos e chunks em {hash_algo} (combinado com o tracker).", "INFO")
+    return hash_algo
+
+
+def scan_shared_folder():
+    """Retorna {nome: (tamanho, mtime_ns)} dos arquivos da pasta 'shared', sem ler o conteudo."""
+    os.makedirs(SHARED_FOLDER, exist_ok=True)
+    snapshot = {}
+    with os.scandir(SHARED_FOLDER) as entries:
+        for entry in entries:
+            # Ignora as pastas de chunks que criamos
+            if entry.is_file():
+                st = entry.stat()
+                snapshot[entry.name] = (st.st_size, st.st_mtime_ns)
+    return snapshot
+
+
+def _describe(name, stat):
+    """Hashes do arquivo; so relê o conteudo se o stat mudou desde o ultimo anuncio."""
+    known = _announced.get(name)
+    if known and known["stat"] == stat and known["hash_algo"] == hash_algo:
+        return known
+    log(f"Processando arquivo '{name}' para anunciar...", "INFO")
+    algo = hash_algo
+    file_hash, chunk_hashes = split_file_into_chunks(os.path.join(SHARED_FOLDER, name), store, algo)
+    # Os chunks agora ficam no repositorio por hash; a pasta antiga <nome>_chunks sobra
+    shutil.rmtree(os.path.join(SHARED_FOLDER, f"{name}_chunks"), ignore_errors=True)
+    return {"stat": stat, "hash_algo": algo, "file_hash": file_hash, "chunk_hashes": chunk_hashes}
+
+
+def _referenced_chunks():
+    return {h for meta in _announced.values() for h in meta["chunk_hashes"]}
+
+
+def _release_chunks(chunk_hashes):
+    """Apaga do repositorio os chunks que nenhum arquivo anunciado usa mais.
+
+    Os que um download em andamento ja contou como reaproveitados ficam (ver ChunkStore.pin).
+    """
+    for chunk_hash in set(chunk_hashes) - _referenced_chunks():
+        store.remove(chunk_hash)
+
+
+def trim_store():
+    """Aplica o limite de tamanho do repositorio sem tocar nos chunks anunciados."""
+    # Sob o lock: um arquivo sendo processado para anuncio nao perde os chunks recem-gravados
+    with _announce_lock:
+        removed = store.trim(_referenced_chunks())
+    if removed:
+        log(f"{removed} chunk(s) antigo(s) descartado(s) do repositório local.", "INFO")
+    return removed
+
+
+def chunk_hash_of(name, chunk_index):
+    """Hash do chunk de um arquivo anunciado (pedidos de peers que so mandam nome e indice)."""
+    meta = _announced.get(name)
+    if meta is None or not isinstance(chunk_index, int) or not 0 <= chunk_index < len(meta["chunk_hashes"]):
+        return None
+    return meta["chunk_hashes"][chunk_index]
+
+
+def _to_announce(name, meta):
+    return {"name": name, "size": meta["stat"][0], "hash_algo": meta["hash_algo"], "hash": meta["file_hash"],
+            "chunk_hashes": meta["chunk_hashes"]}
+
+
+def _warn_refused(res):
+    """Avisa dos arquivos que o tracker nao listou num anuncio aceito."""
+    if res.get('conflicts'):
+        log(f"Nome já usado por outro conteúdo no tracker (renomeie para compartilhar): "
+            f"{', '.join(res['conflicts'])}", "WARNING")
+    if res.get('rejected'):
+        log(f"Algoritmo de hash não aceito pelo tracker: {', '.join(res['rejected'])}", "WARNING")
+
+
+def forget_announced():
+    """Esquece o ultimo anuncio (o tracker descarta os arquivos do peer no logout)."""
+    with _announce_lock:
+        _announced.clear()
+
 
 def announce_files(peer_port, username):
     """
     Prepara e anuncia arquivos da pasta 'shared' para o tracker.
     Retorna um dicionário com os metadados dos arquivos locais.
     """
-    os.makedirs(SHARED_FOLDER, exist_ok=True)
-    files_to_announce = []
-    local_files_metadata = {}
-
-    for filename in os.listdir(SHARED_FOLDER):
-        # Ignora as pastas de chunks que criamos
-        if os.path.isdir(os.path.join(SHARED_FOLDER, filename)):
-            continue
-        
-        file_path = os.path.join(SHARED_FOLDER, filename)
-        file_size = os.path.getsize(file_path)
-
-        log(f"Processando arquivo '{filename}' para anunciar...", "INFO")
-        file_hash, chunk_hashes = split_file_into_chunks(file_path)
-
-        # Salva metadados localmente
-        local_files_metadata[filename] = { "file_hash": file_hash, "chunk_hashes": chunk_hashes }
-        
-        files_to_announce.append({
-            "name": filename,
-            "size": file_size,
-            "hash": file_hash,
-            "chunk_hashes": chunk_hashes
+    with _announce_lock:
+        described = {name: _describe(name, stat) for name, stat in scan_shared_folder().items()}
+        local_files_metadata = {name: {"file_hash": m["file_hash"], "chunk_hashes": m["chunk_hashes"]}
+                                for name, m in described.items()}
+
+        if not described:
+            log("Nenhum arquivo encontrado na pasta 'shared' para anunciar.", "WARNING")
+            return local_files_metadata
+
+        res = send_to_tracker({
+            "action": "announce",
+            "port": peer_port,
+            "username": username,
+            "files": [_to_announce(name, m) for name, m in described.items()]
         })
 
-    if not files_to_announce:
-        log("Nenhum arquivo encontrado na pasta 'shared' para anunciar.", "WARNING")
+        if res and res.get('status'):
+            log("Arquivos anunciados com sucesso!", "SUCCESS")
+            _warn_refused(res)
+            _announced.clear()
+            _announced.update(described)
+        else:
+            log(f"Falha ao anunciar arquivos: {res.get('message')}", "ERROR")
+
         return local_files_metadata
 
-    res = send_to_tracker({
-        "action": "announce",
-        "port": peer_port,
-        "username": username,
-        "files": files_to_announce
-    })
-    
-    if res and res.get('status'):
-        log("Arquivos anunciados com sucesso!", "SUCCESS")
-    else:
-        log(f"Falha ao anunciar arquivos: {res.get('message')}", "ERROR")
-
-    return local_files_metadata
+
+def sync_shared_folder(peer_port, username, snapshot=None, pending=()):
+    """Anuncio incremental: envia ao tracker so os arquivos novos, alterados ou removidos.
+
+    'pending' lista arquivos ainda sendo gravados, que ficam para a proxima varredura.
+    Retorna {"added": [...], "changed": [...], "removed": [...]}.
+    """
+    with _announce_lock:
+        if snapshot is None:
+            snapshot = scan_shared_folder()
+        removed = [name for name in _announced if name not in snapshot]
+        touched = [name for name, stat in snapshot.items()
+                   if name not in pending and (name not in _announced or _announced[name]["stat"] != stat)]
+        delta = {"added": [], "changed": [], "removed": []}
+
+        described = {}
+        for name in touched:
+            meta = _describe(name, snapshot[name])
+            old = _announced.get(name)
+            if old and old["file_hash"] == meta["file_hash"]:
+                _announced[name] = meta  # regravado com o mesmo conteudo: nada a anunciar
+            else:
+                described[name] = meta
+                delta["changed" if old else "added"].append(name)
+
+        if described:
+            res = send_to_tracker({"action": "announce", "port": peer_port, "username": username,
+                                   "files": [_to_announce(name, m) for name, m in described.items()]})
+            if res and res.get('status'):
+                _warn_refused(res)
+                replaced = [h for name in delta["changed"] for h in _announced[name]["chunk_hashes"]]
+                _announced.update(described)
+                _release_chunks(replaced)
+            else:
+                log(f"Falha ao anunciar arquivos: {res.get('message')}", "ERROR")
+                delta["added"], delta["changed"] = [], []
+
+        if removed:
+            res = send_to_tracker({"action": "unannounce", "port": peer_port, "username": username, "files": removed})
+            if res and res.get('status'):
+                released = [h for name in removed for h in _announced.pop(name)["chunk_hashes"]]
+                _release_chunks(released)
+                delta["removed"] = removed
+            else:
+                log(f"Falha ao remover anúncios: {res.get('message')}", "ERROR")
+
+        if any(delta.values()):
+            log(f"Pasta compartilhada sincronizada: {len(delta['added'])} novo(s), "
+                f"{len(delta['changed'])} alterado(s), {len(delta['removed'])} removido(s).", "INFO")
+        return delta
+
+
+def reannounce(peer_port, username):
+    """Reenvia o ultimo anuncio inteiro, com os hashes em memoria (sessao nova no tracker)."""
+    with _announce_lock:
+        described = dict(_announced)
+    if not described:
+        return True
+    res = send_to_tracker({"action": "announce", "port": peer_port, "username": username,
+                           "files": [_to_announce(name, m) for name, m in described.items()]})
+    if not res or not res.get('status'):
+        log(f"Falha ao reanunciar arquivos: {res.get('message')}", "WARNING")
+        return False
+    _warn_refused(res)
+    log(f"{len(described)} arquivo(s) reanunciado(s) ao tracker.", "INFO")
+    return True
+
+
+def reconcile(peer_port, username):
+    """Depois de um reinicio do tracker: confere por um resumo se o catalogo restaurado
+    ainda tem os nossos arquivos e reenvia so as diferencas, sem reler nada do disco.
+
+    Retorna True se o tracker ficou em dia com o ultimo anuncio.
+    """
+    if config.TRACKER_SHARDS:
+        # Cada shard guarda uma particao do catalogo: reanuncia tudo com os hashes em memoria
+        return reannounce(peer_port, username)
+
+    with _announce_lock:
+        local = {name: m["file_hash"] for name, m in _announced.items()}
+        res = send_to_tracker({"action": "reconcile", "port": peer_port, "username": username,
+                               "digest": catalog_digest(local)})
+        if not res or not res.get('status'):
+            log(f"Falha ao reconciliar com o tracker: {res.get('message')}", "WARNING")
+            return False
+        if res.get('in_sync'):
+            log(f"Tracker reiniciado; o catálogo restaurado já tem nossos {len(local)} arquivo(s).", "INFO")
+            return True
+
+        held = res.get('files', {})
+        stale = [name for name, file_hash in local.items() if held.get(name) != file_hash]
+        extra = [name for name in held if name not in local]
+        ok = True
+        if stale:
+            res = send_to_tracker({"action": "announce", "port": peer_port, "username": username,
+                                   "files": [_to_announce(name, _announced[name]) for name in stale]})
+            ok = bool(res and res.get('status'))
+            if ok:
+                _warn_refused(res)
+        if extra:
+            res = send_to_tracker({"action": "unannounce", "port": peer_port, "username": username, "files": extra})
+            ok = ok and bool(res and res.get('status'))
+        log(f"Catálogo reconciliado com o tracker: {len(stale)} reanunciado(s), {len(extra)} removido(s).",
+            "INFO" if ok else "WARNING")
+        return ok
+
+
+class SharedFolderWatcher(threading.Thread):
+    """Varre a pasta 'shared' periodicamente (snapshots de stat) e anuncia so o que mudou.
+
+    Um arquivo so e anunciado depois de duas varreduras com o mesmo tamanho e
+    mtime, para nao anunciar copias pela metade.
+    """
+
+    def __init__(self, peer_port, username, interval=WATCH_INTERVAL):
+        super().__init__(daemon=True)
+        self.peer_port = peer_port
+        self.username = username
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        previous = {}
+        while not self._stop_event.wait(self.interval):
+            try:
+                snapshot = scan_shared_folder()
+                pending = [name for name, stat in snapshot.items() if previous.get(name) != stat]
+                previous = snapshot
+                sync_shared_folder(self.peer_port, self.username, snapshot, pending)
+            except Exception as e:
+                log(f"Erro ao sincronizar a pasta compartilhada: {e}", "ERROR")
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,135 @@
+# peer/features/chat_history.py
+import bisect
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+# Mensagens recentes mantidas em memoria por sala
+HISTORY_RING_SIZE = 500
+# Atraso maximo ate uma mensagem ir para o disco (as escritas sao agrupadas)
+FLUSH_INTERVAL = 0.5
+# Registro do indice: (timestamp, offset no log)
+_INDEX_RECORD = struct.Struct('<dQ')
+
+
+class RoomHistory:
+    """Historico de uma sala: log em disco gravado em lotes, anel em memoria e indice de offsets.
+
+    O arquivo <sala>.log continua legivel (uma mensagem por linha). O <sala>.idx
+    guarda o timestamp e o offset de cada mensagem, permitindo buscar as ultimas N
+    ou as posteriores a um instante sem reler o log inteiro.
+    """
+
+    def __init__(self, room_name, log_dir, ring_size=HISTORY_RING_SIZE):
+        self.log_path = os.path.join(log_dir, f"{room_name}.log")
+        self.index_path = os.path.join(log_dir, f"{room_name}.idx")
+        self.ring = deque(maxlen=ring_size)  # (timestamp, bytes)
+        self._timestamps = []  # timestamps das mensagens ja gravadas, em ordem
+        self._offsets = []     # offset de inicio de cada mensagem gravada
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._load()
+        self._log_f = open(self.log_path, 'ab')
+        self._index_f = open(self.index_path, 'ab')
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % _INDEX_RECORD.size
+            for ts, offset in _INDEX_RECORD.iter_unpack(data[:usable]):
+                self._timestamps.append(ts)
+                self._offsets.append(offset)
+        elif os.path.exists(self.log_path):
+            # Log antigo sem indice: reconstroi os offsets (sem horario, timestamp 0)
+            offset = 0
+            with open(self.log_path, 'rb') as f, open(self.index_path, 'wb') as idx:
+                for line in f:
+                    self._timestamps.append(0.0)
+                    self._offsets.append(offset)
+                    idx.write(_INDEX_RECORD.pack(0.0, offset))
+                    offset += len(line)
+        # Recarrega o anel com a cauda do log
+        start = max(0, len(self._offsets) - self.ring.maxlen)
+        for ts, line in zip(self._timestamps[start:], self._read_lines(start)):
+            self.ring.append((ts, line))
+
+    def _read_lines(self, first):
+        """Le as mensagens gravadas a partir da posicao 'first' do indice."""
+        if first >= len(self._offsets):
+            return []
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._offsets[first])
+            data = f.read()
+        bounds = [o - self._offsets[first] for o in self._offsets[first:]] + [len(data)]
+        return [data[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+    def append(self, message):
+        """Registra uma mensagem; a escrita em disco acontece em lote na thread de escrita."""
+        entry = (time.time(), (message + '\n').encode())
+        with self._cond:
+            self.ring.append(entry)
+            self._pending.append(entry)
+            self._cond.notify()
+
+    def _writer(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+            time.sleep(FLUSH_INTERVAL)  # junta as mensagens que chegarem nesse intervalo
+            self.flush()
+
+    def flush(self):
+        """Grava no disco as mensagens pendentes."""
+        with self._cond:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            offset = self._log_f.tell()
+            index_records = []
+            for ts, line in batch:
+                self._timestamps.append(ts)
+                self._offsets.append(offset)
+                index_records.append(_INDEX_RECORD.pack(ts, offset))
+                offset += len(line)
+            self._log_f.write(b''.join(line for _, line in batch))
+            self._index_f.write(b''.join(index_records))
+            self._log_f.flush()
+            self._index_f.flush()
+
+    def replay(self, last=None, since=None):
+        """Retorna, num unico bloco de bytes, as ultimas 'last' mensagens e/ou as posteriores a 'since'."""
+        if last == 0:
+            return b''
+        with self._cond:
+            ring = list(self.ring)
+            total = len(self._offsets) + len(self._pending)
+            if since is not None:
+                # O anel basta se comeca antes do instante pedido ou se contem todo o historico
+                if ring and (ring[0][0] <= since or len(ring) == total):
+                    lines = [line for ts, line in ring if ts > since]
+                else:
+                    self.flush()
+                    lines = self._read_lines(bisect.bisect_right(self._timestamps, since))
+                return b''.join(lines[-last:] if last else lines)
+            if last is None or last <= len(ring):
+                selected = ring if last is None else ring[-last:]
+                return b''.join(line for _, line in selected)
+            self.flush()
+            return b''.join(self._read_lines(max(0, len(self._offsets) - last)))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+        self._log_f.close()
+        self._index_f.close()
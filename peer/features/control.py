@@ -0,0 +1,57 @@
+# peer/features/control.py
+import json
+import socket
+import threading
+
+from utils.logger import log
+from common.connection import recv_request
+
+# A API de controle so escuta no loopback: quem a usa esta na mesma maquina
+CONTROL_HOST = '127.0.0.1'
+CONTROL_PORT = 7070
+
+
+def _handle(conn, handlers):
+    try:
+        request = recv_request(conn)
+        if request is None:
+            return
+        handler = handlers.get(request.get("action"))
+        if handler is None:
+            response = {"status": False, "message": "Ação desconhecida"}
+        else:
+            response = handler(request)
+    except Exception as e:
+        log(f"Erro na API de controle: {e}", "ERROR")
+        response = {"status": False, "message": str(e)}
+    try:
+        conn.sendall(json.dumps(response).encode())
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def start_control_server(port, handlers):
+    """Atende requisicoes JSON locais ({"action": ...}) despachando para handlers[action].
+
+    Cada handler recebe o dict da requisicao e retorna o dict da resposta.
+    Retorna a porta efetivamente usada (port=0 escolhe uma livre).
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((CONTROL_HOST, port))
+    server.listen(16)
+    port = server.getsockname()[1]
+
+    def accept_loop():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                break
+            threading.Thread(target=_handle, args=(conn, handlers), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    log(f"API de controle em {CONTROL_HOST}:{port}", "INFO")
+    return port
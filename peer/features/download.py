@@ -2,63 +2,198 @@
 import json
 import os
 import threading
-import hashlib
-from queue import Queue
+from queue import Queue, Empty
 import socket
+import time
+import uuid
 from threading import Lock
 
-from utils.logger import log
-from utils.chunk_manager import reassemble_chunks, CHUNK_SIZE
+from utils import profiling
+from utils.logger import log, enabled as log_enabled
+from utils.chunk_manager import assemble_from_store, CHUNK_SIZE
+from utils.chunk_store import store as chunk_store
+from utils.hashing import new_hasher, HASH_ALGORITHMS, DEFAULT_HASH_ALGO
+from utils.buffer_pool import BufferPool
+from common.protocol import BUSY_RESPONSE
+from .telemetry import get_recorder
+from .pex import SourceSet
+from .announce import trim_store
+from .streaming import ReadaheadQueue, StreamingFile, READAHEAD_CHUNKS
 
 DOWNLOADS_FOLDER = 'downloads'
 NUM_DOWNLOAD_THREADS = 4
 MAX_CHUNK_RETRIES = 3
+# Rodadas em que todos os peers responderam "ocupado" antes de desistir do chunk;
+# essas rodadas nao gastam as tentativas de MAX_CHUNK_RETRIES
+MAX_BUSY_ROUNDS = 20
+BUSY_BACKOFF = 0.25  # segundos, dobrando a cada rodada (ate 4 s)
+# Buffers de recepcao reutilizados por todos os downloads do processo; limitam a
+# memoria de chunks em transito a RECV_POOL_BUFFERS * CHUNK_SIZE
+RECV_POOL_BUFFERS = 8
+RECV_SIZE = 64 * 1024
+# +1 byte para detectar um peer que envia mais do que o tamanho do chunk
+recv_pool = BufferPool(CHUNK_SIZE + 1, RECV_POOL_BUFFERS)
+
+class _NoLimit:
+    """Substituto nulo para semaforo de conexoes quando nao ha orcamento global."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
 
 class DownloaderThread(threading.Thread):
-    def __init__(self, file_name, chunk_queue, prioritized_peers, temp_dir, username, attempts, lock):
+    def __init__(self, file_name, chunk_queue, sources, store, username, attempts, lock,
+                 connection_slots=None, rate_limiter=None, on_chunk=None,
+                 recorder=None, download_id=None, peer_scores=None, num_threads=1,
+                 file_size=None, buffer_pool=None, peer_offset=0, busy_rounds=None, chunk_holders=None,
+                 hash_algo=DEFAULT_HASH_ALGO):
         super().__init__()
         self.file_name = file_name
         self.chunk_queue = chunk_queue
-        self.prioritized_peers = prioritized_peers
-        self.temp_dir = temp_dir
+        # Fontes compartilhadas (SourceSet): crescem com o que os peers contam por PEX
+        self.sources = sources
+        self.peer_offset = peer_offset
+        # Chunks verificados vao para o repositorio enderecado por hash
+        self.store = store
+        # Peers que tem chunks avulsos do arquivo (mesmo conteudo em outro arquivo)
+        self.chunk_holders = chunk_holders or {}
         self.username = username
         self.attempts = attempts
         self.lock = lock
+        # Recursos compartilhados entre downloads simultaneos (ver download_manager)
+        self.connection_slots = connection_slots or _NoLimit()
+        self.rate_limiter = rate_limiter
+        self.on_chunk = on_chunk
+        # Telemetria: um registro por tentativa de chunk (ver features/telemetry.py)
+        self.recorder = recorder
+        self.download_id = download_id
+        self.peer_scores = peer_scores or {}
+        self.num_threads = num_threads
+        self.file_size = file_size
+        self.buffer_pool = buffer_pool or recv_pool
+        self.busy_rounds = busy_rounds if busy_rounds is not None else {}
+        self.hash_algo = hash_algo
         self.daemon = True
 
+    def _chunk_length(self, chunk_index):
+        if not self.file_size:
+            return CHUNK_SIZE
+        return max(0, min(CHUNK_SIZE, self.file_size - chunk_index * CHUNK_SIZE))
+
+    def _receive(self, s, view):
+        """Le a resposta direto no buffer e calcula o hash a cada pedaco recebido.
+
+        Retorna (bytes recebidos, hasher, segundos gastos com hash).
+        """
+        hasher = new_hasher(self.hash_algo)
+        hash_time = 0.0
+        received = 0
+        while True:
+            n = s.recv_into(view[received:], min(RECV_SIZE, len(view) - received))
+            if not n:
+                break
+            if self.rate_limiter:
+                self.rate_limiter.consume(n)
+            hash_started = time.perf_counter()
+            hasher.update(view[received:received + n])
+            hash_time += time.perf_counter() - hash_started
+            received += n
+            if received == len(view):
+                raise ValueError("Resposta maior que o chunk esperado")
+        return received, hasher, hash_time
+
+    def _record(self, chunk_index, peer, nbytes, connect_time, latency, hash_time, ok, error=None):
+        if not self.recorder:
+            return
+        with self.lock:
+            retry = self.attempts.get(chunk_index, 0)
+        self.recorder.record(
+            "chunk", download_id=self.download_id, file=self.file_name, chunk=chunk_index,
+            peer=peer, peer_score=self.peer_scores.get(peer), threads=self.num_threads,
+            bytes=nbytes, connect_time=round(connect_time, 6), latency=round(latency, 6),
+            hash_time=round(hash_time, 6), retry=retry, ok=ok, error=error)
+
+    def _prioritized_peers(self, chunk_hash):
+        # Cada thread começa por um peer diferente da lista, espalhando as conexões
+        peers = self.sources.snapshot()
+        peers += [p for p in self.chunk_holders.get(chunk_hash, ()) if p not in peers]
+        offset = self.peer_offset % len(peers) if peers else 0
+        return peers[offset:] + peers[:offset]
+
     def run(self):
-        while not self.chunk_queue.empty():
+        while True:
+            try:
+                chunk_index, expected_hash = self.chunk_queue.get_nowait()
+            except Empty:
+                break
             try:
-                chunk_index, expected_hash = self.chunk_queue.get()
                 success = False
-                for peer_addr_str in self.prioritized_peers:
+                busy_peers = 0
+                prioritized_peers = self._prioritized_peers(expected_hash)
+                for peer_addr_str in prioritized_peers:
+                    started = time.perf_counter()
+                    connect_time = hash_time = 0.0
+                    received = 0
                     try:
                         peer_ip, peer_tcp_port = peer_addr_str.split(':')
-                        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                            s.settimeout(10)
-                            s.connect((peer_ip, int(peer_tcp_port)))
-                            request = {"action": "request_chunk", "file_name": self.file_name, "chunk_index": chunk_index, "username": self.username}
-                            s.sendall(json.dumps(request).encode())
-                            
-                            response_parts = []
-                            while True:
-                                part = s.recv(4096)
-                                if not part: break
-                                response_parts.append(part)
-                            response = b''.join(response_parts)
-
-                        if hashlib.sha256(response).hexdigest() == expected_hash:
-                            chunk_path = os.path.join(self.temp_dir, f"chunk_{chunk_index}")
-                            with open(chunk_path, 'wb') as f: f.write(response)
-                            log(f"Chunk {chunk_index} baixado de {peer_addr_str}", "SUCCESS")
-                            success = True
-                            break
-                        else:
-                            log(f"Falha de hash no chunk {chunk_index} de {peer_addr_str}", "WARNING")
+                        with self.buffer_pool.buffer() as buf:
+                            view = memoryview(buf)[:self._chunk_length(chunk_index) + 1]
+                            with self.connection_slots, profiling.span("download.transfer"), \
+                                    socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                                started = time.perf_counter()  # nao conta a espera pelo semaforo
+                                s.settimeout(10)
+                                s.connect((peer_ip, int(peer_tcp_port)))
+                                connect_time = time.perf_counter() - started
+                                request = {"action": "request_chunk", "file_name": self.file_name, "chunk_index": chunk_index,
+                                           "chunk_hash": expected_hash, "username": self.username}
+                                s.sendall(json.dumps(request).encode())
+                                received, hasher, hash_time = self._receive(s, view)
+                            latency = time.perf_counter() - started
+
+                            if hasher.hexdigest() == expected_hash:
+                                with profiling.span("download.store"):
+                                    self.store.put(expected_hash, view[:received])
+                                if log_enabled("NETWORK"):
+                                    log(f"Chunk {chunk_index} baixado de {peer_addr_str}", "NETWORK")
+                                self._record(chunk_index, peer_addr_str, received, connect_time, latency, hash_time, True)
+                                if self.on_chunk:
+                                    self.on_chunk(chunk_index, received)
+                                success = True
+                                break
+                            elif view[:received] == BUSY_RESPONSE:
+                                # Peer sem slot de upload livre: passa para o próximo
+                                busy_peers += 1
+                                self._record(chunk_index, peer_addr_str, 0, connect_time, latency, hash_time,
+                                             False, "busy")
+                            else:
+                                log(f"Falha de hash no chunk {chunk_index} de {peer_addr_str}", "WARNING")
+                                self._record(chunk_index, peer_addr_str, received, connect_time, latency, hash_time,
+                                             False, "hash")
                     
                     except Exception as e:
                         log(f"Não foi possível baixar chunk {chunk_index} de {peer_addr_str}: {e}", "ERROR")
+                        self._record(chunk_index, peer_addr_str, received, connect_time,
+                                     time.perf_counter() - started, hash_time, False, type(e).__name__)
                 
+                if success:
+                    # Quem nos serviu conta que outras fontes conhece (PEX), já sem o buffer do pool
+                    with profiling.span("download.gossip"):
+                        self.sources.gossip_with(peer_addr_str)
+                if not success and self.sources.refresh(some_alive=busy_peers > 0):
+                    # Fontes novas (PEX ou tracker): tenta de novo sem contar como falha
+                    self.chunk_queue.put((chunk_index, expected_hash))
+                    continue
+                if not success and busy_peers == len(prioritized_peers):
+                    with self.lock:
+                        rounds = self.busy_rounds[chunk_index] = self.busy_rounds.get(chunk_index, 0) + 1
+                    if rounds <= MAX_BUSY_ROUNDS:
+                        # Todos ocupados: espera um pouco e tenta de novo sem contar como falha
+                        time.sleep(min(4.0, BUSY_BACKOFF * 2 ** (rounds - 1)))
+                        self.chunk_queue.put((chunk_index, expected_hash))
+                        continue
                 if not success:
                     with self.lock:
                         self.attempts[chunk_index] = self.attempts.get(chunk_index, 0) + 1
@@ -72,52 +207,177 @@ class DownloaderThread(threading.Thread):
             finally:
                 self.chunk_queue.task_done()
 
-def download_file(file_name, file_info, username):
+def download_file(file_name, file_info, username, num_threads=NUM_DOWNLOAD_THREADS,
+                  connection_slots=None, rate_limiter=None, on_chunk=None, lookup=None, locate=None,
+                  sequential=False, stream=None, readahead=READAHEAD_CHUNKS):
+    """Baixa um arquivo em paralelo. Retorna True se o arquivo final foi verificado.
+
+    Chunks que ja estao no repositorio local (utils/chunk_store.py) nao sao
+    baixados de novo; todos os chunks do arquivo ficam presos no repositorio
+    ate o fim do download, e depois ele volta ao limite de tamanho
+    (ChunkStore.trim). 'lookup', se informado, devolve a lista atual de peers
+    do arquivo no tracker; so e chamado quando as fontes conhecidas e as
+    trocas PEX nao bastam (ver features/pex.py). 'locate', se informado,
+    recebe os hashes dos chunks que faltam e devolve {hash: ["ip:porta", ...]}
+    com outros peers que tem o mesmo conteudo, em qualquer arquivo.
+
+    Com 'sequential' (ou um 'stream' ja criado, ver features/streaming.py), os
+    chunks sao pedidos em ordem, no maximo 'readahead' a frente do primeiro que
+    falta, e o arquivo cresce em downloads/<nome>.part a cada chunk verificado.
+    """
+    chunk_hashes = file_info['chunk_hashes']
+    chunk_store.pin(chunk_hashes)
+    try:
+        return _download_file(file_name, file_info, username, num_threads, connection_slots, rate_limiter,
+                              on_chunk, lookup, locate, sequential, stream, readahead)
+    finally:
+        chunk_store.unpin(chunk_hashes)
+        trim_store()
+
+
+def _download_file(file_name, file_info, username, num_threads, connection_slots, rate_limiter,
+                   on_chunk, lookup, locate, sequential, stream, readahead):
     log(f"Iniciando download de '{file_name}'...", "INFO")
     
     file_hash = file_info['hash']
     chunk_hashes = file_info['chunk_hashes']
+    if sequential and stream is None:
+        stream = StreamingFile(os.path.join(DOWNLOADS_FOLDER, file_name))
+    # Listagens de trackers antigos nao trazem o algoritmo: eram todas sha256
+    hash_algo = file_info.get('hash_algo', DEFAULT_HASH_ALGO)
+    if hash_algo not in HASH_ALGORITHMS:
+        log(f"Algoritmo de hash '{hash_algo}' não suportado por este peer.", "ERROR")
+        if stream:
+            stream.finish()
+        return False
     prioritized_peers = [p['peer'] for p in file_info['peers']]
-    
-    if not prioritized_peers:
+
+    # Um pedido por conteudo distinto: chunks repetidos no arquivo sao baixados uma vez
+    indexes = {}
+    for i, chash in enumerate(chunk_hashes):
+        indexes.setdefault(chash, []).append(i)
+    pending = {}
+    reused = 0
+    for chash, same in indexes.items():
+        if chunk_store.has(chash):
+            chunk_store.touch(chash)
+            reused += len(same)
+            for i in same:
+                if on_chunk:
+                    on_chunk(i, 0)
+        else:
+            pending[chash] = same[0]
+    def _on_chunk_done(chunk_index, nbytes):
+        if stream:
+            stream.advance()
+        # O progresso conta todas as posicoes do arquivo com o mesmo conteudo
+        for i in indexes[chunk_hashes[chunk_index]] if on_chunk else ():
+            on_chunk(i, nbytes if i == chunk_index else 0)
+    chunk_done = _on_chunk_done if (on_chunk or stream) else None
+    if reused:
+        log(f"{reused} de {len(chunk_hashes)} chunk(s) reaproveitado(s) do repositório local", "INFO")
+
+    chunk_holders = {}
+    extra = set()
+    if pending and locate:
+        located = locate(list(pending)) or {}
+        chunk_holders = {h: [p for p in peers if p not in prioritized_peers] for h, peers in located.items()}
+        extra = {p for peers in chunk_holders.values() for p in peers}
+        if extra:
+            log(f"{len(extra)} peer(s) com parte do conteúdo em outros arquivos", "INFO")
+
+    if pending and not prioritized_peers and not any(chunk_holders.values()):
         log("Nenhum peer disponível para este arquivo.", "ERROR")
-        return
+        if stream:
+            stream.finish()
+        return False
 
-    log(f"Ordem de peers (baseado em pontuação): {prioritized_peers}", "INFO")
-    temp_dir = os.path.join(DOWNLOADS_FOLDER, f"temp_{file_hash}")
-    os.makedirs(temp_dir, exist_ok=True)
+    log(f"Peers escolhidos pelo tracker (pontuação e carga): {prioritized_peers}", "INFO")
+    sources = SourceSet(file_name, file_hash, prioritized_peers, lookup)
+    if sources.from_pex:
+        log(f"{sources.from_pex} fonte(s) a mais já conhecida(s) por PEX", "INFO")
     
-    chunk_queue = Queue()
+    if stream:
+        # O comeco que ja estiver no repositorio fica legivel antes de qualquer transferencia
+        stream.start(chunk_hashes, chunk_store, hash_algo)
+        chunk_queue = ReadaheadQueue(readahead, set(range(len(chunk_hashes))) - set(pending.values()))
+    else:
+        chunk_queue = Queue()
     attempts = {}
+    busy_rounds = {}
     lock = Lock()
-    for i, chash in enumerate(chunk_hashes):
+    for chash, i in pending.items():
         chunk_queue.put((i, chash))
+
+    recorder = get_recorder()
+    download_id = uuid.uuid4().hex[:12]
+    peer_scores = {p['peer']: p.get('score') for p in file_info['peers']}
+    thread_count = min(num_threads, len(pending), max(1, len(sources) + len(extra)))
+    started = time.perf_counter()
+
+    def finish(ok):
+        elapsed = time.perf_counter() - started
+        # Primeiro byte legivel: no modo normal o arquivo so aparece no fim
+        if stream:
+            first_byte = stream.time_to_first_byte()
+        else:
+            first_byte = elapsed if ok else None
+        recorder.record(
+            "download", download_id=download_id, file=file_name, size=file_info.get('size'),
+            chunks=len(chunk_hashes), threads=thread_count, peers=len(sources),
+            pex_peers=sources.from_pex, tracker_lookups=sources.tracker_lookups, reused_chunks=reused,
+            sequential=bool(stream), first_byte=round(first_byte, 6) if first_byte is not None else None,
+            elapsed=round(elapsed, 6), ok=ok)
+        return ok
         
     threads = []
-    for _ in range(min(NUM_DOWNLOAD_THREADS, len(prioritized_peers))):
-        thread = DownloaderThread(file_name, chunk_queue, prioritized_peers, temp_dir, username, attempts, lock)
+    for i in range(thread_count):
+        thread = DownloaderThread(file_name, chunk_queue, sources, chunk_store, username, attempts, lock,
+                                  connection_slots, rate_limiter, chunk_done,
+                                  recorder, download_id, peer_scores, thread_count, file_info.get('size'),
+                                  peer_offset=i, busy_rounds=busy_rounds, chunk_holders=chunk_holders,
+                                  hash_algo=hash_algo)
         thread.start()
         threads.append(thread)
         
     chunk_queue.join()
 
-    missing = [i for i in range(len(chunk_hashes)) if not os.path.exists(os.path.join(temp_dir, f"chunk_{i}"))]
+    missing = [i for i, chash in enumerate(chunk_hashes) if not chunk_store.has(chash)]
     if missing:
         log(f"Falha no download dos chunks: {missing}", "ERROR")
-        return
+        if stream:
+            stream.finish()
+        return finish(False)
+
+    if stream:
+        # O .part ja tem tudo, com o hash calculado durante a escrita
+        stream.advance()
+        if stream.finish(file_hash):
+            log(f"Arquivo '{file_name}' baixado e verificado com sucesso!", "SUCCESS")
+            return finish(True)
+        log(f"Falha na verificação do arquivo final '{file_name}'!", "ERROR")
+        return finish(False)
 
     log("Todos os chunks foram baixados. Reconstruindo arquivo...", "INFO")
     
     final_path = os.path.join(DOWNLOADS_FOLDER, file_name)
-    reassemble_chunks(temp_dir, final_path, len(chunk_hashes))
+    assemble_from_store(chunk_store, chunk_hashes, final_path)
     
-    with open(final_path, 'rb') as f:
-        final_hash = hashlib.sha256(f.read()).hexdigest()
+    # Verificacao em blocos, com um buffer do pool: nao carrega o arquivo inteiro na memoria
+    final_hasher = new_hasher(hash_algo)
+    with open(final_path, 'rb') as f, recv_pool.buffer() as buf:
+        view = memoryview(buf)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            final_hasher.update(view[:n])
+    final_hash = final_hasher.hexdigest()
 
     if final_hash == file_hash:
+        # Os chunks continuam no repositorio (servem outros peers e downloads futuros)
+        # ate o limite de tamanho descartar os menos usados
         log(f"Arquivo '{file_name}' baixado e verificado com sucesso!", "SUCCESS")
-        for f in os.listdir(temp_dir):
-            os.remove(os.path.join(temp_dir, f))
-        os.rmdir(temp_dir)
-    else:
-        log(f"Falha na verificação do arquivo final! Hash esperado: {file_hash}, obtido: {final_hash}", "ERROR")
+        return finish(True)
+    log(f"Falha na verificação do arquivo final! Hash esperado: {file_hash}, obtido: {final_hash}", "ERROR")
+    return finish(False)
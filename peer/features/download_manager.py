@@ -0,0 +1,193 @@
+# peer/features/download_manager.py
+import itertools
+import os
+import threading
+import time
+from queue import PriorityQueue, Empty
+
+from utils.logger import log
+from utils.rate_limiter import TokenBucket
+from common.protocol import MAX_LOCATE_HASHES
+from . import download
+from .network import send_to_tracker
+from .streaming import StreamingFile
+
+# Quantos arquivos podem ser baixados ao mesmo tempo
+MAX_ACTIVE_DOWNLOADS = 3
+# Orcamento global de conexoes TCP abertas com outros peers (somando todos os arquivos)
+MAX_DOWNLOAD_CONNECTIONS = 8
+# Limite global de banda em bytes/s (0 = sem limite)
+MAX_DOWNLOAD_BYTES_PER_SECOND = 0
+
+
+class DownloadJob:
+    """Estado de um arquivo na fila de downloads."""
+
+    def __init__(self, file_name, file_info, priority, sequential=False):
+        self.file_name = file_name
+        self.file_info = file_info
+        self.priority = priority
+        # Download sequencial: o arquivo pode ser lido (open_stream) enquanto chega
+        self.stream = StreamingFile(os.path.join(download.DOWNLOADS_FOLDER, file_name)) if sequential else None
+        self.status = "na fila"
+        self.total_chunks = len(file_info.get('chunk_hashes', []))
+        self.done_chunks = 0
+        self.bytes_done = 0
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def _on_chunk(self, chunk_index, nbytes):
+        with self._lock:
+            self.done_chunks += 1
+            self.bytes_done += nbytes
+
+    def open_stream(self):
+        """Leitor dos bytes ja verificados, em ordem (so para downloads sequenciais)."""
+        if self.stream is None:
+            raise ValueError(f"'{self.file_name}' não está em modo sequencial")
+        return self.stream.open_reader()
+
+    def snapshot(self):
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0
+        if self.stream:
+            readable = self.stream.readable_bytes
+        else:
+            readable = self.file_info.get('size', 0) if self.status == "concluido" else 0
+        return {
+            "file_name": self.file_name,
+            "priority": self.priority,
+            "status": self.status,
+            "sequential": self.stream is not None,
+            "done_chunks": self.done_chunks,
+            "total_chunks": self.total_chunks,
+            "bytes_done": self.bytes_done,
+            "readable_bytes": readable,
+            "size": self.file_info.get('size', 0),
+            "elapsed": round(elapsed, 2),
+        }
+
+
+class DownloadManager:
+    """Fila de downloads concorrentes com prioridade e orcamento global de conexoes/banda."""
+
+    def __init__(self, username, max_active=MAX_ACTIVE_DOWNLOADS, max_connections=MAX_DOWNLOAD_CONNECTIONS,
+                 max_bytes_per_second=MAX_DOWNLOAD_BYTES_PER_SECOND, threads_per_file=download.NUM_DOWNLOAD_THREADS):
+        self.username = username
+        self.threads_per_file = threads_per_file
+        self.connection_slots = threading.BoundedSemaphore(max_connections)
+        self.rate_limiter = TokenBucket(max_bytes_per_second) if max_bytes_per_second else None
+        self.jobs = []
+        self._queue = PriorityQueue()
+        self._counter = itertools.count()  # desempate FIFO entre prioridades iguais
+        self._lock = threading.Lock()
+        self.max_active = max_active
+        for _ in range(max_active):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def enqueue(self, file_name, file_info, priority=0, sequential=False):
+        """Coloca um arquivo na fila. Prioridades maiores sao baixadas primeiro.
+
+        Com sequential, os chunks chegam em ordem e job.open_stream() le o
+        arquivo enquanto ele e baixado (ver features/streaming.py).
+        """
+        job = DownloadJob(file_name, file_info, priority, sequential)
+        with self._lock:
+            self.jobs.append(job)
+        self._queue.put((-priority, next(self._counter), job))
+        log(f"'{file_name}' adicionado a fila de downloads (prioridade {priority}).", "INFO")
+        return job
+
+    def _tracker_lookup(self, job):
+        """Peers atuais do arquivo no tracker (ultimo recurso quando o PEX nao acha fontes)."""
+        res = send_to_tracker({"action": "search", "query": job.file_name, "username": self.username})
+        meta = (res.get("files") or {}).get(job.file_name)
+        if not meta or meta.get("hash") != job.file_info.get("hash"):
+            return []
+        return [p['peer'] for p in meta.get("peers", [])]
+
+    def _locate_chunks(self, job, chunk_hashes):
+        """Peers que tem estes chunks em outros arquivos (indice por hash do tracker).
+
+        O tracker atende no maximo MAX_LOCATE_HASHES hashes por pedido: arquivos
+        maiores perguntam em partes.
+        """
+        holders = {}
+        for start in range(0, len(chunk_hashes), MAX_LOCATE_HASHES):
+            res = send_to_tracker({"action": "locate_chunks", "hashes": chunk_hashes[start:start + MAX_LOCATE_HASHES],
+                                   "exclude_file": job.file_name, "username": self.username})
+            holders.update(res.get("holders") or {})
+        return holders
+
+    def _worker(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            try:
+                job.status = "baixando"
+                job.started_at = time.time()
+                ok = download.download_file(
+                    job.file_name, job.file_info, self.username,
+                    num_threads=self.threads_per_file,
+                    connection_slots=self.connection_slots,
+                    rate_limiter=self.rate_limiter,
+                    on_chunk=job._on_chunk,
+                    lookup=lambda: self._tracker_lookup(job),
+                    locate=lambda hashes: self._locate_chunks(job, hashes),
+                    stream=job.stream,
+                )
+                job.status = "concluido" if ok else "falhou"
+            except Exception as e:
+                log(f"Erro no download de '{job.file_name}': {e}", "ERROR")
+                job.status = "falhou"
+                if job.stream and not job.stream.done:
+                    job.stream.finish()
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+    def progress(self):
+        """Retorna o estado de todos os downloads desta sessao."""
+        with self._lock:
+            return [job.snapshot() for job in self.jobs]
+
+    def wait(self):
+        """Bloqueia ate que a fila esteja vazia e todos os downloads terminem."""
+        self._queue.join()
+
+    def stop(self):
+        """Fim da sessao: cancela os downloads na fila e encerra as threads.
+
+        Os que ja estao baixando terminam; depois disso cada thread pega o seu
+        sinal de parada (prioridade acima de qualquer download).
+        """
+        while True:
+            try:
+                _, _, job = self._queue.get_nowait()
+            except Empty:
+                break
+            if job is not None:
+                job.status = "cancelado"
+                if job.stream:
+                    job.stream.finish()
+            self._queue.task_done()
+        for _ in range(self.max_active):
+            self._queue.put((float('-inf'), next(self._counter), None))
+
+
+def show_progress(manager):
+    """Exibe o progresso dos downloads no terminal."""
+    jobs = manager.progress() if manager else []
+    print("\n--- Downloads ---")
+    if not jobs:
+        print("Nenhum download nesta sessao.")
+    for job in jobs:
+        total = job['total_chunks'] or 1
+        pct = 100.0 * job['done_chunks'] / total
+        streamed = f", {job['readable_bytes']} B legíveis" if job['sequential'] else ""
+        print(f"- {job['file_name']} [{job['status']}] {job['done_chunks']}/{job['total_chunks']} chunks "
+              f"({pct:.0f}%, {job['bytes_done']} B em {job['elapsed']}s, prioridade {job['priority']}{streamed})")
+    print("-----------------")
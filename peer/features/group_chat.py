@@ -1,33 +1,139 @@
 import os
 import json
+import math
+import queue
 import socket
 import threading
 from datetime import datetime
 from utils.logger import log
 from .network import send_to_tracker
+from .chat_history import RoomHistory
 
 rooms = {}
+rooms_lock = threading.RLock()  # protege rooms[...]['members'] entre as sessoes dos membros
 LOG_DIR = 'group_logs'
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# Mensagens pendentes por membro antes de aplicar a politica de consumidor lento
+OUTBOX_SIZE = 256
+# 'disconnect' expulsa o membro lento; 'drop' descarta a mensagem mais antiga da fila dele
+SLOW_CONSUMER_POLICY = 'disconnect'
+# Mensagens do historico enviadas a quem entra, se o pedido nao disser outra coisa
+HISTORY_REPLAY_DEFAULT = 100
+HISTORY_REPLAY_MAX = 5000
+
+
+class MemberWriter:
+    """Fila de saida limitada de um membro, esvaziada por uma thread propria.
+
+    Assim um socket lento ou travado atrasa apenas o proprio membro, nunca o broadcast.
+    """
+
+    def __init__(self, conn, username):
+        self.conn = conn
+        self.username = username
+        self.dropped = 0
+        self.closed = False
+        self._queue = queue.Queue(maxsize=OUTBOX_SIZE)
+        threading.Thread(target=self._drain, daemon=True).start()
+
+    def send(self, data):
+        """Enfileira bytes sem bloquear. Retorna False se o membro foi desconectado."""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(data)
+            return True
+        except queue.Full:
+            pass
+        if self.closed:
+            return False
+        if SLOW_CONSUMER_POLICY == 'disconnect':
+            log(f"Membro '{self.username}' nao acompanha as mensagens; desconectando.", "WARNING")
+            self.close()
+            return False
+        try:
+            self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.dropped += 1
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            pass
+        return True
+
+    def _drain(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            try:
+                self.conn.sendall(data)
+            except Exception:
+                break
+        self.closed = True
+        self._close_conn()
+
+    def close(self, flush=False):
+        """Encerra o membro; com flush=True envia antes o que ja esta na fila.
+
+        A thread de envio sempre recebe o aviso de fim (None), mesmo parada na fila vazia.
+        """
+        self.closed = True
+        if not flush:
+            self._discard_pending()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # Sem espaco nem para o aviso: o que faltava enviar e descartado
+            flush = False
+            self._discard_pending()
+            self._queue.put_nowait(None)
+        if not flush:
+            self._close_conn()
+
+    def _discard_pending(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _close_conn(self):
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.conn.close()
+
 
 def _log_message(room, message):
-    path = os.path.join(LOG_DIR, f"{room}.log")
-    with open(path, 'a') as f:
-        f.write(message + '\n')
+    info = rooms.get(room)
+    if info:
+        info['history'].append(message)
 
 
 def start_moderator_room(room_name, moderator):
     """Inicializa a estrutura de uma nova sala."""
+    close_room(room_name)
     rooms[room_name] = {
         'members': {},
         'banned': set(),
         'pending': {},  # usuarios aguardando aprovacao
         'moderator': moderator,
-        'log_file': os.path.join(LOG_DIR, f"{room_name}.log")
+        'log_file': os.path.join(LOG_DIR, f"{room_name}.log"),
+        'history': RoomHistory(room_name, LOG_DIR)
     }
 
 
+def close_room(room_name):
+    """Remove a sala local e grava o que restar do historico."""
+    info = rooms.pop(room_name, None)
+    if info:
+        info['history'].close()
+
+
 def _finalize_join(room_name, member_username):
     """Move o usuario pendente para a lista de membros e inicia a sessao."""
     info = rooms.get(room_name)
@@ -49,13 +155,13 @@ def _finalize_join(room_name, member_username):
         conn.close()
         return
 
-    info['members'][member_username] = conn
-    try:
-        with open(info['log_file'], 'r') as f:
-            for line in f:
-                conn.sendall(line.encode())
-    except FileNotFoundError:
-        pass
+    writer = MemberWriter(conn, member_username)
+    # Historico vai num unico envio pela fila do membro, antes de qualquer mensagem nova
+    history = info['history'].replay(last=entry['history_last'], since=entry['history_since'])
+    if history:
+        writer.send(history)
+    with rooms_lock:
+        info['members'][member_username] = writer
     send_to_tracker({
         'action': 'room_member_update',
         'room_name': room_name,
@@ -63,7 +169,7 @@ def _finalize_join(room_name, member_username):
         'event': 'join'
     })
     broadcast(room_name, f'{member_username} entrou na sala.')
-    threading.Thread(target=_member_session, args=(conn, room_name, member_username), daemon=True).start()
+    threading.Thread(target=_member_session, args=(writer, room_name, member_username), daemon=True).start()
 
 
 def approve_member(room_name, member_username):
@@ -86,7 +192,26 @@ def deny_member(room_name, member_username):
         _finalize_join(room_name, member_username)
 
 
-def accept_member(conn, room_name, member_username):
+def _history_request(history_last, history_since):
+    """Valida o historico pedido no join_room (vem de outro peer): (ultimas N, desde o timestamp).
+
+    N fica entre 0 e HISTORY_REPLAY_MAX; valores invalidos viram o padrao.
+    """
+    try:
+        last = HISTORY_REPLAY_DEFAULT if history_last is None else int(history_last)
+    except (TypeError, ValueError, OverflowError):
+        last = HISTORY_REPLAY_DEFAULT
+    try:
+        since = None if history_since is None else float(history_since)
+    except (TypeError, ValueError):
+        since = None
+    if since is not None and not math.isfinite(since):
+        since = None
+    return min(max(last, 0), HISTORY_REPLAY_MAX), since
+
+
+def accept_member(conn, room_name, member_username, history_last=None, history_since=None):
+    """Recebe um pedido de ingresso; o historico pode ser limitado as ultimas N mensagens ou desde um timestamp."""
     info = rooms.get(room_name)
     if not info:
         conn.close()
@@ -101,25 +226,27 @@ def accept_member(conn, room_name, member_username):
 
     # Moderador entra automaticamente
     if member_username == info.get('moderator'):
-        info['members'][member_username] = conn
+        writer = MemberWriter(conn, member_username)
+        with rooms_lock:
+            info['members'][member_username] = writer
         send_to_tracker({
             'action': 'room_member_update',
             'room_name': room_name,
             'username': member_username,
             'event': 'join'
         })
-        threading.Thread(target=_member_session, args=(conn, room_name, member_username), daemon=True).start()
+        threading.Thread(target=_member_session, args=(writer, room_name, member_username), daemon=True).start()
         return
 
     # Solicita aprovacao do moderador
-    entry = {'conn': conn, 'approved': False, 'event': threading.Event()}
+    history_last, history_since = _history_request(history_last, history_since)
+    entry = {'conn': conn, 'approved': False, 'event': threading.Event(),
+             'history_last': history_last, 'history_since': history_since}
     info.setdefault('pending', {})[member_username] = entry
-    mod_conn = info['members'].get(info['moderator'])
-    if mod_conn:
-        try:
-            mod_conn.sendall(f"[SOLICITACAO] {member_username} deseja entrar. Use /sim {member_username} ou /nao {member_username}\n".encode())
-        except Exception:
-            pass
+    with rooms_lock:
+        mod_writer = info['members'].get(info['moderator'])
+    if mod_writer:
+        mod_writer.send(f"[SOLICITACAO] {member_username} deseja entrar. Use /sim {member_username} ou /nao {member_username}\n".encode())
     try:
         conn.sendall(b'Aguardando aprovacao do moderador...\n')
     except Exception:
@@ -129,7 +256,8 @@ def accept_member(conn, room_name, member_username):
     return
 
 
-def _member_session(conn, room_name, member_username):
+def _member_session(writer, room_name, member_username):
+    conn = writer.conn
     while True:
         try:
             data = conn.recv(1024)
@@ -142,8 +270,13 @@ def _member_session(conn, room_name, member_username):
             broadcast(room_name, formatted, exclude=member_username)
         except Exception:
             break
-    conn.close()
-    rooms[room_name]['members'].pop(member_username, None)
+    writer.close()
+    with rooms_lock:
+        members = rooms.get(room_name, {}).get('members', {})
+        # Um novo ingresso do mesmo usuario pode ter substituido esta sessao
+        if members.get(member_username) is not writer:
+            return
+        del members[member_username]
     send_to_tracker({
         'action': 'room_member_update',
         'room_name': room_name,
@@ -153,13 +286,12 @@ def _member_session(conn, room_name, member_username):
 
 
 def broadcast(room_name, message, exclude=None):
-    for uname, c in list(rooms.get(room_name, {}).get('members', {}).items()):
-        if uname == exclude:
-            continue
-        try:
-            c.sendall((message + '\n').encode())
-        except Exception:
-            pass
+    """Enfileira a mensagem para cada membro; nunca bloqueia em sockets lentos."""
+    data = (message + '\n').encode()
+    with rooms_lock:
+        writers = [w for uname, w in rooms.get(room_name, {}).get('members', {}).items() if uname != exclude]
+    for writer in writers:
+        writer.send(data)
 
 
 def show_menu(peer_port, username):
@@ -198,14 +330,16 @@ def show_menu(peer_port, username):
             addr_ip, addr_port = info['address'].split(':')
             s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             s.connect((addr_ip, int(addr_port)))
-            req = {'action': 'join_room', 'room_name': room, 'username': username}
+            n = input(f'Mensagens do histórico a receber [{HISTORY_REPLAY_DEFAULT}]: ').strip()
+            req = {'action': 'join_room', 'room_name': room, 'username': username,
+                   'history_last': int(n) if n.isdigit() else HISTORY_REPLAY_DEFAULT}
             s.sendall(json.dumps(req).encode())
             _group_session(s, room, username, username == info.get('moderator'))
         elif choice == '4':
             room = input('Sala para remover: ')
             res = send_to_tracker({'action': 'delete_room', 'room_name': room, 'port': peer_port, 'username': username})
             if res and res.get('status'):
-                rooms.pop(room, None)
+                close_room(room)
                 print('Sala removida.')
             else:
                 log(res.get('message', 'Falha ao remover sala'), 'ERROR')
@@ -238,14 +372,12 @@ def _group_session(conn, room_name, username, is_moderator=False):
                     if info and target == info.get('moderator'):
                         print('Nao e possivel banir o moderador.')
                         continue
-                    if info and target in info.get('members', {}):
-                        ban_conn = info['members'].pop(target)
+                    with rooms_lock:
+                        ban_writer = info['members'].pop(target, None) if info else None
+                    if ban_writer:
                         info['banned'].add(target)
-                        try:
-                            ban_conn.sendall(b'Voce foi expulso pelo moderador.\n')
-                        except Exception:
-                            pass
-                        ban_conn.close()
+                        ban_writer.send(b'Voce foi expulso pelo moderador.\n')
+                        ban_writer.close(flush=True)
                         broadcast(room_name, f'{target} foi expulso da sala.')
                         send_to_tracker({'action': 'room_member_update', 'room_name': room_name, 'username': target, 'event': 'leave'})
                     continue
@@ -0,0 +1,56 @@
+# peer/features/heartbeat.py
+import threading
+from utils.logger import log
+from .network import send_to_tracker
+
+DEFAULT_LEASE_SECONDS = 30
+# Renova o lease algumas vezes por periodo para tolerar perdas pontuais
+HEARTBEATS_PER_LEASE = 3
+
+
+class HeartbeatThread(threading.Thread):
+    """Envia heartbeats periodicos ao tracker para manter a sessao do peer viva."""
+
+    def __init__(self, peer_port, username, lease_seconds=DEFAULT_LEASE_SECONDS, boot_id=None, on_restart=None,
+                 load_fn=None, on_expired=None):
+        super().__init__(daemon=True)
+        self.peer_port = peer_port
+        self.username = username
+        # O tracker muda de boot_id a cada execucao; on_restart() roda quando isso acontece
+        self.boot_id = boot_id
+        self.on_restart = on_restart
+        # Sessao descartada pelo tracker (lease vencido, reinicio sem catalogo): on_expired()
+        # refaz o login e o anuncio e retorna o boot_id novo (None se falhou)
+        self.on_expired = on_expired
+        # Resumo da carga de upload enviado junto (ver upload_load.py)
+        self.load_fn = load_fn
+        self.interval = max(1.0, lease_seconds / HEARTBEATS_PER_LEASE)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            request = {"action": "heartbeat", "port": self.peer_port, "username": self.username}
+            if self.load_fn:
+                request["load"] = self.load_fn()
+            res = send_to_tracker(request)
+            if not res.get('status'):
+                if res.get('expired') and self.on_expired:
+                    log("Sessão expirada no tracker; refazendo o login.", "WARNING")
+                    try:
+                        self.boot_id = self.on_expired() or self.boot_id
+                    except Exception as e:
+                        log(f"Erro ao renovar a sessão no tracker: {e}", "ERROR")
+                else:
+                    log(f"Heartbeat recusado pelo tracker: {res.get('message')}", "WARNING")
+                continue
+            boot_id = res.get('boot_id')
+            if boot_id and self.boot_id and boot_id != self.boot_id and self.on_restart:
+                log("Tracker reiniciou; reconciliando o catálogo.", "INFO")
+                try:
+                    self.on_restart()
+                except Exception as e:
+                    log(f"Erro ao reconciliar com o tracker: {e}", "ERROR")
+            self.boot_id = boot_id or self.boot_id
+
+    def stop(self):
+        self._stop_event.set()
@@ -16,9 +16,9 @@ def list_network_files(peer_port, username):
             return {}
 
         for name, meta in network_files_db.items():
-            peer_count = len(meta['peers'])
-            # A lista de peers já vem ordenada pelo tracker
-            best_score = meta['peers'][0]['score'] if peer_count > 0 else 0
+            # O tracker devolve só alguns peers por arquivo; peer_count é o total
+            peer_count = meta.get('peer_count', len(meta['peers']))
+            best_score = max((p['score'] for p in meta['peers']), default=0)
             print(f"- {name} (Tamanho: {meta['size']} B, Peers: {peer_count}, Melhor Pontuação: {best_score})")
         return network_files_db
     else:
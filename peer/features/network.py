@@ -1,17 +1,52 @@
 # peer/features/network.py
 import socket
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from utils.logger import log
+from common.connection import recv_all
+from common.hash_ring import HashRing
 import utils.config as config
 
-def send_to_tracker(data):
-    """Envia uma mensagem TCP ao tracker e retorna a resposta como dict."""
+# Roteamento no modo cluster (config.TRACKER_SHARDS nao vazio):
+# - acoes enviadas a todos os shards (cada um precisa conhecer a sessao do peer)
+SHARD_BROADCAST_ACTIONS = {"login", "logout", "heartbeat"}
+# - consultas sobre o catalogo inteiro, respondidas por todos e combinadas
+SHARD_FANOUT_ACTIONS = {"list_files", "search", "locate_chunks"}
+# - acoes com arquivos, divididas pelo dono de cada nome no anel
+SHARD_KEYED_ACTIONS = {"announce", "unannounce"}
+# Todo o resto (registro, pontuacoes, salas) vai para o shard primario.
+
+# Recusas do controle de admissao do tracker ("retry_after"): quantas vezes
+# repetir o pedido e a maior espera aceita antes de desistir
+ADMISSION_RETRIES = 2
+MAX_RETRY_AFTER = 5.0
+
+_ring = None
+
+
+def _request(host, port, data):
+    """Envia uma mensagem TCP a um tracker e retorna a resposta como dict.
+
+    Se o tracker recusar por excesso de requisicoes, espera o "retry_after"
+    indicado e tenta de novo (ate ADMISSION_RETRIES vezes).
+    """
+    for _ in range(ADMISSION_RETRIES):
+        res = _request_once(host, port, data)
+        retry_after = res.get("retry_after")
+        if res.get("status", True) or not retry_after or retry_after > MAX_RETRY_AFTER:
+            return res
+        time.sleep(retry_after)
+    return _request_once(host, port, data)
+
+
+def _request_once(host, port, data):
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.settimeout(10)
-            s.connect((config.TRACKER_HOST, config.TRACKER_PORT))
+            s.connect((host, port))
             s.sendall(json.dumps(data).encode())
-            response = s.recv(8192).decode()
+            response = recv_all(s, 8192).decode()
             return json.loads(response)
     except socket.timeout:
         log("Timeout na comunicação com o tracker.", "ERROR")
@@ -22,3 +57,88 @@ def send_to_tracker(data):
     except Exception as e:
         log(f"Erro de comunicação com o tracker: {e}", "ERROR")
         return {"status": False, "message": str(e)}
+
+
+def _split_addr(addr):
+    host, port = addr.split(':')
+    return host, int(port)
+
+
+def _get_ring():
+    global _ring
+    if _ring is None or _ring.nodes != config.TRACKER_SHARDS:
+        _ring = HashRing(config.TRACKER_SHARDS)
+    return _ring
+
+
+def shard_for(file_name):
+    """Retorna o endereco "ip:porta" do shard dono do arquivo."""
+    return _get_ring().get_node(file_name)
+
+
+def _send_many(requests):
+    """Envia [(addr, data)] em paralelo e retorna as respostas na mesma ordem."""
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        futures = [pool.submit(_request, *_split_addr(addr), data) for addr, data in requests]
+        return [f.result() for f in futures]
+
+
+def _send_to_cluster(data):
+    shards = config.TRACKER_SHARDS
+    action = data.get("action")
+
+    if action in SHARD_BROADCAST_ACTIONS:
+        responses = _send_many([(addr, data) for addr in shards])
+        for addr, res in zip(shards[1:], responses[1:]):
+            if not res.get("status"):
+                log(f"Shard {addr} recusou '{action}': {res.get('message')}", "WARNING")
+        return responses[0]
+
+    if action in SHARD_FANOUT_ACTIONS:
+        responses = _send_many([(addr, data) for addr in shards])
+        if action == "locate_chunks":
+            # O mesmo chunk pode estar em arquivos de shards diferentes: junta os peers
+            holders = {}
+            for res in responses:
+                for chunk_hash, peers in res.get("holders", {}).items():
+                    merged = holders.setdefault(chunk_hash, [])
+                    merged.extend(p for p in peers if p not in merged)
+            return {"status": True, "holders": holders}
+        merged = {}
+        for res in responses:
+            merged.update(res.get("files", {}))
+        return {"status": True, "files": merged}
+
+    if action in SHARD_KEYED_ACTIONS:
+        by_shard = {}
+        for f in data.get("files", []):
+            # announce manda metadados; unannounce, so os nomes
+            name = f['name'] if isinstance(f, dict) else f
+            by_shard.setdefault(shard_for(name), []).append(f)
+        if not by_shard:
+            return {"status": True, "message": "Nada a registrar."}
+        requests = [(addr, {**data, "files": files}) for addr, files in by_shard.items()]
+        merged = {"status": True, "message": "Arquivos registrados."}
+        failed = []
+        for (addr, files), res in zip(requests, _send_many(requests)):
+            # Conflitos e algoritmos recusados vem por shard: o peer precisa da lista inteira
+            for key in ("conflicts", "rejected"):
+                if res.get(key):
+                    merged.setdefault(key, []).extend(res[key])
+            if not res.get("status"):
+                names = [f['name'] if isinstance(f, dict) else f for f in files["files"]]
+                failed.extend(names)
+                log(f"Shard {addr} recusou '{action}' de {len(names)} arquivo(s): {res.get('message')}", "WARNING")
+        if failed:
+            merged.update(status=False, failed=failed,
+                          message=f"Falha ao registrar {len(failed)} arquivo(s): {', '.join(failed)}")
+        return merged
+
+    return _request(*_split_addr(shards[0]), data)
+
+
+def send_to_tracker(data):
+    """Envia uma mensagem TCP ao tracker (ou ao cluster de shards) e retorna a resposta como dict."""
+    if config.TRACKER_SHARDS:
+        return _send_to_cluster(data)
+    return _request(config.TRACKER_HOST, config.TRACKER_PORT, data)
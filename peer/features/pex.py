@@ -0,0 +1,202 @@
+# peer/features/pex.py
+import json
+import random
+import socket
+import threading
+import time
+
+from utils import profiling
+from utils.logger import log
+from utils.config import PEX_ENABLED
+from common.connection import recv_all
+
+# Peer exchange (PEX): peers que trocam chunks tambem trocam listas compactas
+# ("ip:porta") de outras fontes do mesmo arquivo, identificado pelo hash.
+# Assim o downloader acha novas fontes sem voltar ao tracker.
+
+# Enderecos enviados ou devolvidos em uma troca
+PEX_MAX_PEERS = 30
+# Fontes sem noticia ha mais que isto (s) saem do registro
+PEX_TTL = 600.0
+# Arquivos distintos lembrados pelo registro (os menos recentes saem primeiro)
+PEX_MAX_FILES = 256
+PEX_TIMEOUT = 3
+# Peers consultados quando um download fica sem fontes que respondam
+PEX_FANOUT = 3
+# Intervalo minimo (s) entre duas buscas por novas fontes do mesmo download
+REFRESH_INTERVAL = 2.0
+
+
+def _valid_peers(peers):
+    """Filtra a lista recebida: so strings "ip:porta" com porta numerica, sem repetir."""
+    valid = []
+    if not isinstance(peers, list):
+        return valid
+    for peer in peers:
+        if not isinstance(peer, str) or peer.count(':') != 1:
+            continue
+        host, port = peer.split(':')
+        if host and port.isdigit() and 0 < int(port) < 65536 and peer not in valid:
+            valid.append(peer)
+        if len(valid) >= PEX_MAX_PEERS:
+            break
+    return valid
+
+
+class PeerRegistry:
+    """Fontes conhecidas de cada arquivo: {hash do arquivo: {"ip:porta": visto_em}}."""
+
+    def __init__(self, ttl=PEX_TTL, max_files=PEX_MAX_FILES):
+        self.ttl = ttl
+        self.max_files = max_files
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def add(self, file_hash, peers, now=None):
+        if not file_hash or not peers:
+            return
+        now = now if now is not None else time.time()
+        with self._lock:
+            known = self._files.pop(file_hash, {})
+            for peer in peers:
+                known[peer] = now
+            if len(known) > PEX_MAX_PEERS * 2:
+                # Mantem os mais recentes
+                known = dict(sorted(known.items(), key=lambda item: item[1])[-PEX_MAX_PEERS * 2:])
+            self._files[file_hash] = known  # reinserido no fim: o mais recente
+            while len(self._files) > self.max_files:
+                self._files.pop(next(iter(self._files)))
+
+    def sources(self, file_hash, exclude=(), limit=PEX_MAX_PEERS, now=None):
+        """Fontes ainda validas de um arquivo, das vistas mais recentemente para as mais antigas."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            known = self._files.get(file_hash)
+            if not known:
+                return []
+            for peer in [p for p, seen in known.items() if now - seen > self.ttl]:
+                del known[peer]
+            ranked = sorted(known.items(), key=lambda item: item[1], reverse=True)
+        return [peer for peer, _ in ranked if peer not in exclude][:limit]
+
+
+registry = PeerRegistry()
+
+
+def handle_pex(request):
+    """Responde a uma troca: guarda as fontes que o outro peer conhece e devolve as nossas."""
+    file_hash = request.get("file_hash")
+    theirs = _valid_peers(request.get("peers"))
+    ours = registry.sources(file_hash, exclude=set(theirs))
+    registry.add(file_hash, theirs)
+    return {"status": True, "peers": ours}
+
+
+def exchange(peer_addr, file_name, file_hash, known):
+    """Envia nossa lista a um peer e retorna as fontes que ele conhece (vazia em caso de erro)."""
+    request = {"action": "pex", "file_name": file_name, "file_hash": file_hash,
+               "peers": list(known)[:PEX_MAX_PEERS]}
+    try:
+        host, port = peer_addr.split(':')
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.settimeout(PEX_TIMEOUT)
+            s.connect((host, int(port)))
+            s.sendall(json.dumps(request).encode())
+            response = json.loads(recv_all(s).decode() or "{}")
+    except Exception as e:
+        # Resposta de outro peer: qualquer falha so significa nenhuma fonte nova
+        log(f"Troca de fontes (PEX) com {peer_addr} falhou: {e}", "DEBUG")
+        return []
+    if not isinstance(response, dict):
+        log(f"Troca de fontes (PEX) com {peer_addr}: resposta inválida", "DEBUG")
+        return []
+    peers = _valid_peers(response.get("peers"))
+    registry.add(file_hash, peers)
+    return peers
+
+
+class SourceSet:
+    """Fontes de um download, compartilhadas pelas threads e ampliadas durante o download.
+
+    Comeca com os peers escolhidos pelo tracker (mais os que o registro PEX ja
+    conhece). Cada peer que entrega um chunk recebe uma troca de listas, uma
+    vez por download. Quando todas as fontes falham ou estao ocupadas,
+    refresh() consulta o registro e alguns peers por PEX; o tracker (lookup)
+    so e consultado se isso nao trouxer nenhuma fonte nova e nenhuma das
+    conhecidas responder. Com PEX desligado, o tracker e a unica saida.
+    """
+
+    def __init__(self, file_name, file_hash, peers, lookup=None, pex_enabled=PEX_ENABLED):
+        self.file_name = file_name
+        self.file_hash = file_hash
+        self.lookup = lookup  # lookup() -> ["ip:porta", ...] direto do tracker
+        self.pex_enabled = pex_enabled
+        self._peers = list(dict.fromkeys(peers))
+        self._exchanged = set()
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self.from_pex = 0
+        self.tracker_lookups = 0
+        if pex_enabled:
+            registry.add(file_hash, self._peers)
+            self.from_pex = self.add(registry.sources(file_hash))
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._peers)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._peers)
+
+    def add(self, peers):
+        """Acrescenta fontes ao fim da lista (as do tracker continuam na frente). Retorna quantas eram novas."""
+        with self._lock:
+            new = [p for p in dict.fromkeys(peers) if p not in self._peers]
+            self._peers.extend(new)
+        return len(new)
+
+    def _gossip(self, peer):
+        found = self.add(exchange(peer, self.file_name, self.file_hash, self.snapshot()))
+        if found:
+            self.from_pex += found
+            log(f"PEX: {found} fonte(s) nova(s) de '{self.file_name}' via {peer}", "INFO")
+        return found
+
+    def gossip_with(self, peer):
+        """Troca listas com um peer que acabou de entregar um chunk (uma vez por download)."""
+        if not self.pex_enabled:
+            return 0
+        with self._lock:
+            if peer in self._exchanged:
+                return 0
+            self._exchanged.add(peer)
+        return self._gossip(peer)
+
+    def refresh(self, some_alive=False):
+        """Busca novas fontes quando as atuais nao bastam. Retorna quantas foram acrescentadas.
+
+        'some_alive' indica que alguma fonte respondeu (ocupada, por exemplo):
+        com PEX ligado o tracker so e consultado quando nenhuma respondeu.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_refresh < REFRESH_INTERVAL:
+                return 0
+            self._last_refresh = now
+        found = 0
+        if self.pex_enabled:
+            found = self.add(registry.sources(self.file_hash))
+            self.from_pex += found
+            candidates = self.snapshot()
+            for peer in random.sample(candidates, min(PEX_FANOUT, len(candidates))):
+                if found:
+                    break
+                found += self._gossip(peer)
+        if not found and self.lookup and not (self.pex_enabled and some_alive):
+            self.tracker_lookups += 1
+            with profiling.span("download.tracker_lookup"):
+                found = self.add(self.lookup())
+            if found:
+                log(f"{found} fonte(s) nova(s) de '{self.file_name}' obtidas do tracker", "INFO")
+        return found
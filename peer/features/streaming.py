@@ -0,0 +1,197 @@
+# peer/features/streaming.py
+import heapq
+import io
+import os
+import threading
+import time
+from queue import Empty
+
+from utils.hashing import new_hasher
+
+# Download sequencial: os chunks sao pedidos em ordem e o arquivo cresce em
+# <nome>.part com os bytes ja verificados, para ser consumido (video, logs)
+# antes do fim. A janela limita quantos chunks a frente do primeiro que falta
+# podem estar em transito: uma fonte lenta nao deixa as outras threads correrem
+# para o fim do arquivo enquanto o consumidor espera pelo comeco.
+READAHEAD_CHUNKS = 8
+PART_SUFFIX = '.part'
+
+
+class ReadaheadQueue:
+    """Fila de chunks do download sequencial, com a interface da Queue usada pelos DownloaderThread.
+
+    Itens (indice, hash) saem em ordem de indice, inclusive os recolocados apos
+    uma falha. Um chunk so sai se estiver a menos de 'window' posicoes da
+    primeira ainda nao resolvida (baixada ou abandonada).
+    """
+
+    def __init__(self, window=READAHEAD_CHUNKS, resolved=()):
+        self.window = max(1, window)
+        self._heap = []
+        self._cond = threading.Condition()
+        self._unfinished = 0
+        # Posicoes que nao seguram a janela: chunks ja no repositorio e repeticoes no arquivo
+        self._resolved = set(resolved)
+        self._base = 0
+        self._local = threading.local()
+        self._advance()
+
+    def _advance(self):
+        while self._base in self._resolved:
+            self._resolved.discard(self._base)
+            self._base += 1
+
+    def put(self, item):
+        with self._cond:
+            heapq.heappush(self._heap, item)
+            self._unfinished += 1
+            if getattr(self._local, "current", None) == item[0]:
+                self._local.requeued = True
+            self._cond.notify_all()
+
+    def get_nowait(self):
+        """Proximo chunk em ordem. Nao espera por itens novos (Empty se nao ha nenhum),
+        mas espera a janela andar ate alcancar o primeiro da fila."""
+        with self._cond:
+            while True:
+                if not self._heap:
+                    raise Empty
+                if self._heap[0][0] < self._base + self.window:
+                    item = heapq.heappop(self._heap)
+                    self._local.current = item[0]
+                    self._local.requeued = False
+                    return item
+                self._cond.wait()
+
+    def task_done(self):
+        with self._cond:
+            # Recolocado na fila: a posicao continua segurando a janela
+            if not self._local.requeued:
+                self._resolved.add(self._local.current)
+                self._advance()
+            self._local.current = None
+            self._unfinished -= 1
+            self._cond.notify_all()
+
+    def join(self):
+        with self._cond:
+            while self._unfinished:
+                self._cond.wait()
+
+
+class StreamingFile:
+    """Arquivo de destino escrito em ordem enquanto os chunks verificados chegam.
+
+    Os primeiros 'readable_bytes' de <caminho>.part sao definitivos e podem ser
+    lidos por outro processo ou por open_reader(). O hash do arquivo inteiro e
+    calculado na propria escrita; verificado, o .part vira o arquivo final.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.part_path = path + PART_SUFFIX
+        self.readable_bytes = 0
+        self.done = False
+        self.ok = None
+        self.started_at = None
+        self.first_byte_at = None
+        self._cond = threading.Condition()
+        self._file = None
+        self._hasher = None
+        self._chunk_hashes = []
+        self._store = None
+        self._next = 0
+
+    def start(self, chunk_hashes, store, hash_algo):
+        """Abre o .part e ja escreve o comeco que estiver no repositorio local."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._cond:
+            self._chunk_hashes = chunk_hashes
+            self._store = store
+            self._hasher = new_hasher(hash_algo)
+            self._file = open(self.part_path, 'wb')
+            self.started_at = time.perf_counter()
+        self.advance()
+
+    def advance(self):
+        """Acrescenta os chunks contiguos que ja estao no repositorio (chamado a cada chunk baixado)."""
+        with self._cond:
+            if self._file is None:
+                return
+            wrote = False
+            while self._next < len(self._chunk_hashes) and self._store.has(self._chunk_hashes[self._next]):
+                data = self._store.read(self._chunk_hashes[self._next])
+                self._file.write(data)
+                self._hasher.update(data)
+                self._next += 1
+                self.readable_bytes += len(data)
+                wrote = True
+            if wrote:
+                self._file.flush()
+                if self.first_byte_at is None and self.readable_bytes:
+                    self.first_byte_at = time.perf_counter()
+                self._cond.notify_all()
+
+    def finish(self, expected_hash=None):
+        """Fecha o arquivo. Com expected_hash, verifica e renomeia; retorna True se o arquivo ficou completo."""
+        with self._cond:
+            ok = False
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                ok = (expected_hash is not None and self._next == len(self._chunk_hashes)
+                      and self._hasher.hexdigest() == expected_hash)
+                if ok:
+                    os.replace(self.part_path, self.path)
+                else:
+                    os.remove(self.part_path)
+            self.ok = ok
+            self.done = True
+            self._cond.notify_all()
+            return ok
+
+    def time_to_first_byte(self):
+        if self.first_byte_at is None or self.started_at is None:
+            return None
+        return self.first_byte_at - self.started_at
+
+    def open_reader(self):
+        """Leitor que bloqueia ate haver bytes verificados (EOF ao fim; IOError se o download falhar)."""
+        return StreamReader(self)
+
+
+class StreamReader(io.RawIOBase):
+    """Leitura em ordem de um StreamingFile; read(n) devolve o que ja estiver disponivel."""
+
+    def __init__(self, stream):
+        super().__init__()
+        self._stream = stream
+        self._file = None
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        stream = self._stream
+        with stream._cond:
+            while self._pos >= stream.readable_bytes and not stream.done:
+                stream._cond.wait()
+            available = stream.readable_bytes - self._pos
+            failed = stream.done and not stream.ok
+            if available <= 0 or (failed and self._file is None):
+                if failed:
+                    raise IOError(f"Download de '{os.path.basename(stream.path)}' falhou")
+                return 0
+            if self._file is None:
+                # Aberto com o lock: o .part nao e renomeado nem removido no meio
+                self._file = open(stream.path if stream.done else stream.part_path, 'rb')
+        n = self._file.readinto(memoryview(b)[:available])
+        self._pos += n
+        return n
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
@@ -0,0 +1,53 @@
+# peer/features/telemetry.py
+import json
+import os
+import threading
+import time
+
+# Registros de transferencia (um JSON por linha), lidos por benchmarks/transfer_report.py.
+# Desligado por padrao (o arquivo so cresce): PEER_TELEMETRY=1 ou um PEER_TELEMETRY_FILE liga
+TELEMETRY_FILE = os.environ.get('PEER_TELEMETRY_FILE', os.path.join('telemetry', 'transfers.jsonl'))
+TELEMETRY_ENABLED = os.environ.get('PEER_TELEMETRY', '1' if 'PEER_TELEMETRY_FILE' in os.environ else '0') != '0'
+
+
+class TransferRecorder:
+    """Grava registros estruturados de cada tentativa de chunk e de cada download."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._f = open(path, 'a', buffering=1)  # uma linha por registro, sem segurar em buffer
+
+    def record(self, event, **fields):
+        fields["event"] = event
+        fields["ts"] = round(time.time(), 3)
+        line = json.dumps(fields)
+        with self._lock:
+            self._f.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+
+class _NullRecorder:
+    """Usado quando a telemetria esta desligada."""
+
+    def record(self, event, **fields):
+        pass
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    """Retorna o gravador compartilhado pelo processo (criado no primeiro uso)."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = TransferRecorder(TELEMETRY_FILE) if TELEMETRY_ENABLED else _NullRecorder()
+        return _recorder
@@ -0,0 +1,48 @@
+# peer/features/upload_load.py
+import threading
+import time
+from collections import deque
+
+# Uploads simultaneos que o peer anuncia como capacidade ao tracker
+MAX_UPLOAD_SLOTS = 8
+# Janela (s) da vazao de upload recente informada nos heartbeats
+THROUGHPUT_WINDOW = 10.0
+
+
+class UploadLoad:
+    """Conta os uploads em andamento e os bytes enviados recentemente.
+
+    O resumo (snapshot) vai em cada heartbeat para o tracker escolher peers
+    com folga em vez de mandar todo mundo para o de maior pontuacao.
+    """
+
+    def __init__(self, slots=MAX_UPLOAD_SLOTS, window=THROUGHPUT_WINDOW):
+        self.slots = slots
+        self.window = window
+        self.active = 0
+        self._sent = deque()  # (instante, bytes) dos uploads concluidos na janela
+        self._sent_bytes = 0
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.active += 1
+
+    def finished(self, nbytes):
+        now = time.monotonic()
+        with self._lock:
+            self.active -= 1
+            if nbytes:
+                self._sent.append((now, nbytes))
+                self._sent_bytes += nbytes
+            self._expire(now)
+
+    def _expire(self, now):
+        while self._sent and now - self._sent[0][0] > self.window:
+            self._sent_bytes -= self._sent.popleft()[1]
+
+    def snapshot(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return {"active_uploads": self.active, "free_slots": max(0, self.slots - self.active),
+                    "throughput": round(self._sent_bytes / self.window)}
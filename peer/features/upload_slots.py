@@ -0,0 +1,155 @@
+# peer/features/upload_slots.py
+import heapq
+import itertools
+import threading
+import time
+
+from utils import profiling
+from utils.logger import log
+from utils.config import UPLOAD_SLOTS
+from common.protocol import BUSY_RESPONSE
+
+# Uploads atendidos ao mesmo tempo: chave "upload_slots" do config.json ou
+# variavel UPLOAD_SLOTS (ver utils/config.py). Pedidos alem disso esperam na fila.
+UPLOAD_QUEUE_LIMIT = 32
+# Pedido que esperou mais que isto (s) recebe "ocupado" em vez de ser atendido:
+# o downloader provavelmente ja desistiu ou vai tentar outro peer
+MAX_QUEUE_WAIT = 5.0
+# Por quanto tempo (s) a pontuacao de um requisitante consultada no tracker e reaproveitada
+SCORE_CACHE_TTL = 10.0
+
+
+class ScoreCache:
+    """Pontuacoes de requisitantes, consultadas no tracker no maximo uma vez por TTL.
+
+    get() nunca espera o tracker: devolve a ultima pontuacao conhecida (ou
+    'default' para quem ainda nao foi consultado) e, se ela venceu, a atualiza
+    numa thread propria. Um tracker lento nao segura as threads de leitura.
+    """
+
+    def __init__(self, fetch, ttl=SCORE_CACHE_TTL, default=0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.default = default
+        self._scores = {}  # username -> (pontuacao, consultado_em)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, username):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._scores.get(username)
+            if (not cached or now - cached[1] >= self.ttl) and username not in self._refreshing:
+                self._refreshing.add(username)
+                threading.Thread(target=self._refresh, args=(username,), daemon=True).start()
+        return cached[0] if cached else self.default
+
+    def _refresh(self, username):
+        score = None
+        try:
+            score = self.fetch(username)
+        except Exception as e:
+            log(f"Falha ao consultar a pontuação de '{username}': {e}", "WARNING")
+        with self._lock:
+            self._refreshing.discard(username)
+            if score is not None:
+                self._scores[username] = (score, time.monotonic())
+
+
+def send_busy(conn):
+    try:
+        conn.sendall(BUSY_RESPONSE)
+    except OSError:
+        pass
+    conn.close()
+
+
+class UploadSlots:
+    """Pool fixo de threads de upload com fila de prioridade pela pontuacao do requisitante.
+
+    submit() nunca bloqueia: com os slots ocupados o pedido espera na fila,
+    onde quem tem pontuacao maior e atendido primeiro. Com a fila cheia, o
+    pedido de menor pontuacao (o novo ou o pior da fila) recebe BUSY_RESPONSE
+    na hora, para o downloader seguir para outro peer.
+    """
+
+    def __init__(self, serve, score_of, slots=UPLOAD_SLOTS, queue_limit=UPLOAD_QUEUE_LIMIT,
+                 max_wait=MAX_QUEUE_WAIT):
+        self.serve = serve          # serve(conn, request, score): envia o chunk e fecha a conexao
+        self.score_of = score_of    # score_of(username) -> pontuacao
+        self.slots = slots
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+        self._heap = []  # (-pontuacao, ordem de chegada, chegada, conn, request, pontuacao)
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._busy_slots = 0
+        self.served = 0
+        self.rejected = 0
+        self.expired = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        for i in range(slots):
+            threading.Thread(target=self._worker, name=f"upload-{i}", daemon=True).start()
+
+    def submit(self, conn, request):
+        score = self.score_of(request.get("username"))
+        entry = (-score, next(self._order), time.monotonic(), conn, request, score)
+        rejected = None
+        with self._cond:
+            if len(self._heap) >= self.queue_limit:
+                worst = max(self._heap)
+                if worst[:2] > entry[:2]:
+                    # O novo pedido tem prioridade maior: quem sai e o pior da fila
+                    self._heap.remove(worst)
+                    heapq.heapify(self._heap)
+                    rejected = worst[3]
+                else:
+                    rejected = conn
+                self.rejected += 1
+            if rejected is not conn:
+                heapq.heappush(self._heap, entry)
+                self.max_queue_depth = max(self.max_queue_depth, len(self._heap))
+                self._cond.notify()
+        if rejected is not None:
+            send_busy(rejected)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, queued_at, conn, request, score = heapq.heappop(self._heap)
+                waited = time.monotonic() - queued_at
+                self.total_wait += waited
+                if waited > self.max_wait:
+                    self.expired += 1
+                else:
+                    self._busy_slots += 1
+            if waited > self.max_wait:
+                send_busy(conn)
+                continue
+            try:
+                with profiling.span("peer.upload"):
+                    self.serve(conn, request, score)
+            except Exception as e:
+                log(f"Erro ao enviar chunk: {e}", "ERROR")
+                conn.close()
+            finally:
+                with self._cond:
+                    self._busy_slots -= 1
+                    self.served += 1
+
+    def stats(self):
+        with self._cond:
+            dequeued = self.served + self._busy_slots + self.expired
+            return {
+                "slots": self.slots,
+                "busy_slots": self._busy_slots,
+                "queue_depth": len(self._heap),
+                "max_queue_depth": self.max_queue_depth,
+                "served": self.served,
+                "busy_rejected": self.rejected,
+                "expired": self.expired,
+                "avg_wait_ms": round(self.total_wait / dequeued * 1000, 1) if dequeued else 0.0,
+            }
@@ -5,17 +5,27 @@ import threading
 import time
 import json
 import argparse
+import signal
 import sys
+from queue import Queue, Full
 
 # Garante que o diretório pai esteja no PYTHONPATH para permitir "import utils" e "features"
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Módulos de funcionalidades refatorados
-from features import announce, chat, download, list_files, ranking, group_chat
+from features import announce, chat, list_files, ranking, group_chat, download_manager, control, pex
+from features.heartbeat import HeartbeatThread
+from features.upload_load import UploadLoad
+from features.upload_slots import UploadSlots, ScoreCache, UPLOAD_SLOTS, send_busy
 from features.network import send_to_tracker
+from common.connection import recv_request
 
 # Módulos de utilidades
-from utils.logger import log
+from utils import logger, profiling
+from utils.logger import log, enabled as log_enabled
+from utils.chunk_cache import ChunkCache
+from utils.chunk_store import store as chunk_store
+from utils.config import CHUNK_CACHE_BYTES
 
 # --- CONFIGURAÇÕES E ESTADO GLOBAL ---
 SHARED_FOLDER = 'shared'
@@ -28,64 +38,68 @@ peer_tcp_server_socket = None # Socket TCP para outros peers
 logged_in = False
 username = ""
 network_files_db = {} # Cache local da lista de arquivos da rede
+chunk_cache = ChunkCache(CHUNK_CACHE_BYTES) # Chunks mais requisitados ficam em memoria
+upload_load = UploadLoad(UPLOAD_SLOTS) # Carga de upload informada ao tracker nos heartbeats
+# Conexoes aceitas esperando uma das REQUEST_READERS threads ler o pedido
+REQUEST_READERS = 4
+REQUEST_READ_TIMEOUT = 5
+pending_connections = Queue(maxsize=256)
+downloads = None # DownloadManager da sessao (criado no login)
+heartbeat_thread = None # Mantem o lease da sessao no tracker
+folder_watcher = None # Anuncia automaticamente mudancas na pasta shared
+headless_mode = False # Sem terminal interativo: chat e recusado
+_session_lock = threading.Lock() # login/logout vindos da API de controle
 
 # --- LÓGICA DO SERVIDOR DO PEER ---
 
 def handle_peer_request(conn, addr):
     """Lida com requisições TCP de outros peers (chunks ou chat)."""
     try:
-        # Aumentado o buffer para garantir que a requisição JSON seja recebida
-        request_data = conn.recv(1024).decode()
-        request = json.loads(request_data)
+        with profiling.span("peer.recv"):
+            request = recv_request(conn)
+        if request is None:
+            conn.close()
+            return
         action = request.get("action")
-        log(f"Requisição TCP '{action}' recebida de {addr}", "NETWORK")
+        if log_enabled("NETWORK"):
+            log(f"Requisição TCP '{action}' recebida de {addr}", "NETWORK")
 
         if action == "request_chunk":
-            file_name = request.get("file_name")
-            chunk_index = request.get("chunk_index")
-            requester_username = request.get("username")
-            chunk_file_path = os.path.join(SHARED_FOLDER, f"{file_name}_chunks", f"chunk_{chunk_index}")
-
-            if os.path.exists(chunk_file_path):
-                with open(chunk_file_path, 'rb') as f:
-                    chunk_data = f.read()
+            # Entra na fila de upload; a resposta (chunk ou "ocupado") sai por uma thread do pool
+            with profiling.span("peer.request_chunk"):
+                upload_slots.submit(conn, request)
 
-                score_res = send_to_tracker({
-                    "action": "get_peer_score",
-                    "target_username": requester_username
-                })
-                score = score_res.get("score", 0) if score_res else 0
-
-                THROTTLE_THRESHOLD = 5
-                BYTES_PER_SECOND_LIMIT = 512 * 1024
-                if score < THROTTLE_THRESHOLD:
-                    packet_size = 4096
-                    delay = packet_size / BYTES_PER_SECOND_LIMIT
-                    for i in range(0, len(chunk_data), packet_size):
-                        conn.sendall(chunk_data[i:i+packet_size])
-                        time.sleep(delay)
-                else:
-                    conn.sendall(chunk_data)
-
-                send_to_tracker({
-                    "action": "report_upload",
-                    "username": username,
-                    "port": peer_port
-                })
+        elif action == "pex":
+            # Troca de listas de fontes: resposta curta, direto na thread de leitura
+            with profiling.span("peer.pex"):
+                conn.sendall(json.dumps(pex.handle_pex(request)).encode())
             conn.close()
-        
+
         elif action == "initiate_chat":
             remote_username = request.get("from_user", "Desconhecido")
+            if headless_mode:
+                log(f"Chat de '{remote_username}' recusado (modo daemon).", "INFO")
+                conn.sendall("Peer em modo daemon: chat indisponível.\n".encode())
+                conn.close()
+                return
             print(f"\n\r[!] Requisição de chat recebida de '{remote_username}'.")
-            # Delega para a função de chat, que gerencia o ciclo de vida da conexão
-            chat.handle_chat_session(conn, remote_username)
+            # Sessões de chat são longas: thread própria, fora do pool de leitura
+            conn.settimeout(None)
+            threading.Thread(target=chat.handle_chat_session, args=(conn, remote_username), daemon=True).start()
 
         elif action == "join_room":
             room_name = request.get("room_name")
             member_user = request.get("username")
-            group_chat.accept_member(conn, room_name, member_user)
+            conn.settimeout(None)
+            # accept_member espera a aprovação do moderador: thread própria
+            threading.Thread(target=group_chat.accept_member,
+                             args=(conn, room_name, member_user, request.get("history_last"),
+                                   request.get("history_since")), daemon=True).start()
             return
 
+        else:
+            conn.close()
+
     except (json.JSONDecodeError, ConnectionResetError) as e:
         log(f"Conexão de {addr} encerrada ou inválida: {e}", "INFO")
         conn.close()
@@ -93,6 +107,91 @@ def handle_peer_request(conn, addr):
         log(f"Erro ao lidar com a requisição de {addr}: {e}", "ERROR")
         conn.close()
 
+def serve_chunk(conn, request, score):
+    """Envia um chunk (executado por um slot do pool de upload) e fecha a conexão.
+
+    Pedidos com "chunk_hash" são atendidos pelo repositório de chunks, seja qual
+    for o arquivo de origem; peers antigos mandam só nome e índice.
+    """
+    chunk_hash = request.get("chunk_hash") or announce.chunk_hash_of(request.get("file_name"),
+                                                                    request.get("chunk_index"))
+    try:
+        chunk_file_path = chunk_store.path(chunk_hash)
+    except ValueError:
+        conn.close()
+        return
+
+    # memoryview compartilhada: uploads simultaneos nao copiam o chunk
+    with profiling.span("peer.upload.read"):
+        chunk_data = chunk_cache.get(chunk_file_path)
+    if chunk_data is not None:
+        upload_load.started()
+        sent = 0
+        with profiling.span("peer.upload.send"):
+            try:
+                THROTTLE_THRESHOLD = 5
+                BYTES_PER_SECOND_LIMIT = 512 * 1024
+                if score < THROTTLE_THRESHOLD:
+                    packet_size = 4096
+                    delay = packet_size / BYTES_PER_SECOND_LIMIT
+                    requester = request.get("username")
+                    for i in range(0, len(chunk_data), packet_size):
+                        # A pontuação de quem ainda não foi consultado chega do tracker durante o envio
+                        if requester_scores.get(requester) >= THROTTLE_THRESHOLD:
+                            conn.sendall(chunk_data[i:])
+                            break
+                        conn.sendall(chunk_data[i:i+packet_size])
+                        time.sleep(delay)
+                else:
+                    conn.sendall(chunk_data)
+                sent = len(chunk_data)
+            finally:
+                upload_load.finished(sent)
+
+        with profiling.span("peer.upload.report"):
+            send_to_tracker({
+                "action": "report_upload",
+                "username": username,
+                "port": peer_port,
+                "bytes": len(chunk_data)
+            })
+    conn.close()
+
+def fetch_requester_score(requester_username):
+    score_res = send_to_tracker({
+        "action": "get_peer_score",
+        "username": username,
+        "target_username": requester_username
+    })
+    return score_res.get("score", 0) if score_res else 0
+
+requester_scores = ScoreCache(fetch_requester_score)
+upload_slots = UploadSlots(serve_chunk, requester_scores.get)
+
+def _request_reader():
+    """Thread fixa que lê o pedido de cada conexão aceita e o encaminha."""
+    while True:
+        conn, addr = pending_connections.get()
+        conn.settimeout(REQUEST_READ_TIMEOUT)
+        handle_peer_request(conn, addr)
+
+for _ in range(REQUEST_READERS):
+    threading.Thread(target=_request_reader, daemon=True).start()
+
+def _refuse_busy(conn):
+    """Fila de leitura cheia: responde "ocupado" na própria thread de accept."""
+    try:
+        # Descarta o pedido que já chegou: fechar com dados não lidos faria o cliente receber RST
+        conn.setblocking(False)
+        try:
+            conn.recv(65536)
+        except OSError:
+            pass
+        conn.settimeout(1)
+    except OSError:
+        pass
+    send_busy(conn)
+
 def peer_server_logic():
     """Cria e gerencia o servidor TCP que escuta outros peers."""
     global peer_tcp_server_socket
@@ -104,20 +203,20 @@ def peer_server_logic():
     while True:
         try:
             conn, addr = peer_tcp_server_socket.accept()
-            thread = threading.Thread(target=handle_peer_request, args=(conn, addr), daemon=True)
-            thread.start()
         except OSError:
              break # Socket foi fechado, encerrar o loop
+        try:
+            pending_connections.put_nowait((conn, addr))
+        except Full:
+            _refuse_busy(conn)
     log("Servidor TCP do peer foi encerrado.", "INFO")
 
 # --- FUNÇÕES DE CONTROLE ---
 
-def login_user():
-    """Lida com a lógica de login do usuário."""
-    global logged_in, username, peer_port, peer_tcp_server_socket, server_thread
-    u = input("Usuário: ")
-    p = input("Senha: ")
-
+def login(u, p):
+    """Autentica no tracker e inicia os serviços da sessão. Retorna True em caso de sucesso."""
+    global logged_in, username, peer_port, peer_tcp_server_socket, server_thread, downloads, heartbeat_thread
+    global folder_watcher
     peer_tcp_server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     peer_tcp_server_socket.bind((peer_host, 0))
     peer_port = peer_tcp_server_socket.getsockname()[1]
@@ -128,28 +227,75 @@ def login_user():
         logged_in = True
         username = u
         log(f"Login bem-sucedido como '{username}'", "SUCCESS")
+        announce.set_hash_algo(res.get('hash_algos'))
+        downloads = download_manager.DownloadManager(username)
+        heartbeat_thread = HeartbeatThread(peer_port, username, res.get('lease_seconds', 30), res.get('boot_id'),
+                                           on_restart=lambda: announce.reconcile(peer_port, u),
+                                           load_fn=upload_load.snapshot,
+                                           on_expired=lambda: renew_session(u, p))
+        heartbeat_thread.start()
+        folder_watcher = announce.SharedFolderWatcher(peer_port, username)
+        folder_watcher.start()
         # Inicia o servidor TCP do peer após o login
         server_thread = threading.Thread(target=peer_server_logic, daemon=True)
         server_thread.start()
-    else:
-        log(f"Falha no login: {res.get('message')}", "ERROR")
-        peer_tcp_server_socket.close()
+        return True
+    log(f"Falha no login: {res.get('message')}", "ERROR")
+    peer_tcp_server_socket.close()
+    return False
 
-def register_user():
-    """Lida com o registro de um novo usuário."""
+def renew_session(u, p):
+    """O tracker descartou a sessão: refaz o login na mesma porta e reanuncia os arquivos.
+
+    Retorna o boot_id do tracker, ou None se o login falhou (o heartbeat tenta de novo).
+    """
+    res = send_to_tracker({"action": "login", "port": peer_port, "username": u, "password": p})
+    if not res or not res.get('status'):
+        log(f"Falha ao renovar a sessão: {res.get('message')}", "ERROR")
+        return None
+    log(f"Sessão renovada no tracker como '{u}'", "SUCCESS")
+    announce.reannounce(peer_port, u)
+    return res.get('boot_id')
+
+def login_user():
+    """Lida com a lógica de login do usuário."""
     u = input("Usuário: ")
     p = input("Senha: ")
+    login(u, p)
+
+def register(u, p):
+    """Registra um novo usuário no tracker. Retorna True em caso de sucesso."""
     res = send_to_tracker({"action": "register", "username": u, "password": p})
     if res and res.get('status'):
         print(res.get('message'))
-    else:
-        log(res.get('message', 'Falha no registro'), 'ERROR')
+        return True
+    log(res.get('message', 'Falha no registro'), 'ERROR')
+    return False
+
+def register_user():
+    """Lida com o registro de um novo usuário."""
+    u = input("Usuário: ")
+    p = input("Senha: ")
+    register(u, p)
 
 def logout_user():
     """Lida com a lógica de logout."""
-    global logged_in, username, peer_tcp_server_socket
+    global logged_in, username, peer_tcp_server_socket, heartbeat_thread, folder_watcher, downloads
     log("Deslogando do tracker...", "INFO")
+    if downloads:
+        # Downloads ainda na fila não continuam com a sessão antiga
+        downloads.stop()
+        downloads = None
+    if heartbeat_thread:
+        heartbeat_thread.stop()
+        heartbeat_thread = None
+    if folder_watcher:
+        folder_watcher.stop()
+        folder_watcher = None
     send_to_tracker({"action": "logout", "port": peer_port, "username": username})
+    announce.forget_announced()
+    log(f"Cache de chunks: {chunk_cache.stats()}", "INFO")
+    log(f"Uploads: {upload_slots.stats()}", "INFO")
     logged_in = False
     username = ""
     
@@ -158,6 +304,124 @@ def logout_user():
         peer_tcp_server_socket.close()
         peer_tcp_server_socket = None
 
+# --- MODO DAEMON (API DE CONTROLE) ---
+
+def _not_logged_in():
+    return {"status": False, "message": "Faça login primeiro."}
+
+def ctl_status(request):
+    return {"status": True, "logged_in": logged_in, "username": username, "port": peer_port,
+            "uploads": upload_slots.stats()}
+
+def ctl_login(request):
+    with _session_lock:
+        if logged_in:
+            return {"status": False, "message": f"Já logado como '{username}'."}
+        u, p = request.get("username", ""), request.get("password", "")
+        if request.get("register"):
+            register(u, p)
+        if not login(u, p):
+            return {"status": False, "message": "Falha no login."}
+        return {"status": True, "port": peer_port}
+
+def ctl_logout(request):
+    with _session_lock:
+        if not logged_in:
+            return _not_logged_in()
+        logout_user()
+        return {"status": True}
+
+def ctl_announce(request):
+    if not logged_in:
+        return _not_logged_in()
+    files = announce.announce_files(peer_port, username)
+    return {"status": True, "files": sorted(files)}
+
+def ctl_search(request):
+    if not logged_in:
+        return _not_logged_in()
+    res = send_to_tracker({"action": "search", "query": request.get("query", ""),
+                           "port": peer_port, "username": username})
+    files = res.get("files") or {}
+    network_files_db.update(files)
+    return {"status": bool(res.get("status")),
+            "files": {name: {"size": meta["size"], "peers": meta.get("peer_count", len(meta["peers"]))}
+                      for name, meta in files.items()}}
+
+def ctl_download(request):
+    """Enfileira vários arquivos de uma vez: "files" = [nome, ...] ou [{"name": ..., "priority": ...}, ...].
+
+    "sequential" (no pedido ou em cada entrada) baixa em ordem, com o arquivo
+    crescendo em downloads/<nome>.part."""
+    if not logged_in:
+        return _not_logged_in()
+    res = send_to_tracker({"action": "list_files", "port": peer_port, "username": username})
+    listing = res.get("files") or {}
+    network_files_db.update(listing)
+    queued, missing = [], []
+    for entry in request.get("files", []):
+        sequential = request.get("sequential", False)
+        if isinstance(entry, dict):
+            name, priority = entry.get("name"), entry.get("priority", request.get("priority", 0))
+            sequential = entry.get("sequential", sequential)
+        else:
+            name, priority = entry, request.get("priority", 0)
+        if name in listing:
+            downloads.enqueue(name, listing[name], int(priority), bool(sequential))
+            queued.append(name)
+        else:
+            missing.append(name)
+    return {"status": bool(queued) or not missing, "queued": queued, "missing": missing}
+
+def ctl_progress(request):
+    return {"status": True, "downloads": downloads.progress() if downloads else []}
+
+def ctl_chat(request):
+    return {"status": False, "message": "Chat não disponível no modo daemon."}
+
+def ctl_profile(request):
+    """Spans e capturas de perfil deste peer (ver utils/profiling.py)."""
+    return profiling.handle_command(request, label=f"peer-{username or 'anonimo'}")
+
+CONTROL_HANDLERS = {
+    "status": ctl_status,
+    "login": ctl_login,
+    "logout": ctl_logout,
+    "announce": ctl_announce,
+    "search": ctl_search,
+    "download": ctl_download,
+    "progress": ctl_progress,
+    "chat": ctl_chat,
+    "join_room": ctl_chat,
+    "profile": ctl_profile,
+}
+
+def run_headless(u=None, p=None, create_account=False, control_port=None):
+    """Modo sem menu (serviço, automação e benchmarks). Com usuário, faz login e
+    anuncia a pasta 'shared'; com control_port, aceita comandos locais (ver
+    peer/peer_ctl.py). Fica servindo chunks até receber SIGTERM ou Ctrl+C."""
+    global headless_mode
+    headless_mode = True
+    os.makedirs(SHARED_FOLDER, exist_ok=True)
+    os.makedirs(DOWNLOADS_FOLDER, exist_ok=True)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if control_port is not None:
+        control.start_control_server(control_port, CONTROL_HANDLERS)
+    try:
+        if u:
+            if create_account:
+                register(u, p)
+            if not login(u, p):
+                sys.exit(1)
+            announce.announce_files(peer_port, username)
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if logged_in:
+            logout_user()
+
 # --- LOOP PRINCIPAL DA APLICAÇÃO ---
 
 def main():
@@ -181,11 +445,12 @@ def main():
                 print(f"\nLogado como: {username} | Porta: {peer_port}")
                 print("1. Anunciar meus arquivos")
                 print("2. Listar arquivos na rede")
-                print("3. Baixar arquivo")
-                print("4. Ver Ranking de Colaboração")
-                print("5. Chat com outro peer")
-                print("6. Salas de Chat (Grupo)")
-                print("7. Logout")
+                print("3. Baixar arquivo(s)")
+                print("4. Ver progresso dos downloads")
+                print("5. Ver Ranking de Colaboração")
+                print("6. Chat com outro peer")
+                print("7. Salas de Chat (Grupo)")
+                print("8. Logout")
                 choice = input("> ")
 
                 if choice == '1': announce.announce_files(peer_port, username)
@@ -194,15 +459,21 @@ def main():
                     if not network_files_db:
                         log("Liste os arquivos primeiro (opção 2).", "WARNING")
                         continue
-                    file_to_download = input("Digite o nome do arquivo para baixar: ")
-                    if file_to_download in network_files_db:
-                        download.download_file(file_to_download, network_files_db[file_to_download], username)
-                    else:
-                        log("Arquivo não encontrado na lista da rede.", "ERROR")
-                elif choice == '4': ranking.show_scores(peer_port, username)
-                elif choice == '5': chat.start_chat_client(peer_port, username)
-                elif choice == '6': group_chat.show_menu(peer_port, username)
-                elif choice == '7': logout_user()
+                    names = input("Digite o(s) nome(s) dos arquivos para baixar (separados por vírgula): ")
+                    prio = input("Prioridade (número, maior primeiro) [0]: ").strip()
+                    priority = int(prio) if prio.lstrip('-').isdigit() else 0
+                    sequential = input("Sequencial, para ler enquanto baixa? (s/N): ").strip().lower() == 's'
+                    for file_to_download in [n.strip() for n in names.split(',') if n.strip()]:
+                        if file_to_download in network_files_db:
+                            downloads.enqueue(file_to_download, network_files_db[file_to_download], priority,
+                                              sequential)
+                        else:
+                            log(f"Arquivo '{file_to_download}' não encontrado na lista da rede.", "ERROR")
+                elif choice == '4': download_manager.show_progress(downloads)
+                elif choice == '5': ranking.show_scores(peer_port, username)
+                elif choice == '6': chat.start_chat_client(peer_port, username)
+                elif choice == '7': group_chat.show_menu(peer_port, username)
+                elif choice == '8': logout_user()
 
     except KeyboardInterrupt:
         print("\nSaindo...")
@@ -213,14 +484,33 @@ def main():
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    from utils.config import detect_local_ip, set_tracker_address, TRACKER_HOST, TRACKER_PORT
+    from utils.config import detect_local_ip, set_tracker_address, set_tracker_shards, TRACKER_HOST, TRACKER_PORT
     peer_host = '0.0.0.0'
     parser.add_argument('--tracker', default=f'{TRACKER_HOST}:{TRACKER_PORT}', help='Endereco do tracker no formato IP:PORT')
+    parser.add_argument('--shards', default='', help='Cluster de trackers: IP:PORT,IP:PORT,... (o primeiro e o primario)')
+    parser.add_argument('--log-level', default=None, help='Nivel minimo de log (DEBUG, NETWORK, INFO, WARNING, ERROR)')
+    parser.add_argument('--headless', action='store_true', help='Sem menu: login, anuncia a pasta shared e serve chunks')
+    parser.add_argument('--user', help='Usuário (modo --headless)')
+    parser.add_argument('--password', help='Senha (modo --headless)')
+    parser.add_argument('--register', action='store_true', help='Registra o usuário antes do login (modo --headless)')
+    parser.add_argument('--control-port', type=int, default=None,
+                        help=f'Modo --headless: API de controle local nesta porta (ex.: {control.CONTROL_PORT})')
     args = parser.parse_args()
+    if args.headless and not (args.user and args.password) and args.control_port is None:
+        parser.error('--headless exige --user e --password ou --control-port')
     host_port = args.tracker
     if ':' in host_port:
         t_host, t_port = host_port.split(':', 1)
         set_tracker_address(t_host, int(t_port))
     else:
         set_tracker_address(host_port, TRACKER_PORT)
-    main()
+    if args.shards:
+        set_tracker_shards([a.strip() for a in args.shards.split(',') if a.strip()])
+    if args.log_level:
+        logger.configure(level=args.log_level)
+    if args.headless:
+        # Sem menu para intercalar com o log, entao ele pode sair por uma thread propria
+        logger.configure(async_writes=os.environ.get("LOG_ASYNC", "1") == "1")
+        run_headless(args.user, args.password, args.register, args.control_port)
+    else:
+        main()
@@ -0,0 +1,183 @@
+# peer/peer_ctl.py
+"""Cliente de linha de comando da API de controle de um peer em modo daemon.
+
+Inicie o daemon:
+    python3 peer/peer_client.py --headless --control-port 7070
+
+E controle-o:
+    python3 peer/peer_ctl.py login alice segredo
+    python3 peer/peer_ctl.py announce
+    python3 peer/peer_ctl.py search .iso
+    python3 peer/peer_ctl.py download --manifest lote.json --wait
+    python3 peer/peer_ctl.py progress
+    python3 peer/peer_ctl.py logout
+    python3 peer/peer_ctl.py profile capture --mode sample --seconds 10 --wait
+
+O manifesto pode ser JSON (lista de nomes, lista de {"name", "priority"} ou
+{"files": [...]}) ou texto com um arquivo por linha, opcionalmente seguido da
+prioridade.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from features.control import CONTROL_HOST, CONTROL_PORT
+from common.connection import send_message
+from utils.profiling import CAPTURE_MODES, DEFAULT_CAPTURE_SECONDS, SAMPLE_INTERVAL
+
+# Anunciar arquivos grandes inclui calcular os hashes de todos os chunks
+SLOW_TIMEOUT = 600
+FINISHED = ("concluido", "falhou")
+
+
+def load_manifest(path):
+    with open(path) as f:
+        text = f.read()
+    if path.endswith('.json'):
+        data = json.loads(text)
+        return data["files"] if isinstance(data, dict) else data
+    entries = []
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts or parts[0].startswith('#'):
+            continue
+        entries.append({"name": parts[0], "priority": int(parts[1]) if len(parts) > 1 else 0})
+    return entries
+
+
+def call(args, action, timeout=5, **data):
+    res = send_message(CONTROL_HOST, args.port, action, data, timeout=timeout)
+    if not res.get("status"):
+        print(res.get("message", "Falha"), file=sys.stderr)
+    return res
+
+
+def profile(args):
+    """Comando "profile" do daemon ou, com --tracker, a acao "profile" do tracker."""
+    host, port = CONTROL_HOST, args.port
+    if args.tracker:
+        host, port = args.tracker.split(':')
+    data = {"op": args.op.replace('-', '_'), "mode": args.mode, "seconds": args.seconds,
+            "interval": args.interval, "all_threads": args.all_threads}
+    res = send_message(host, int(port), "profile", data)
+    while args.wait and res.get("status") and res["capture"]["running"]:
+        time.sleep(min(1.0, res["capture"]["running"]["remaining"] + 0.2))
+        res = send_message(host, int(port), "profile", {"op": "status"})
+    if not res.get("status"):
+        print(res.get("message", "Falha"), file=sys.stderr)
+    return res
+
+
+def print_profile(res):
+    if not res.get("status"):
+        return
+    print(f"pid {res['pid']}, spans {'ligados' if res['spans_enabled'] else 'desligados'}")
+    for name, st in res["spans"].items():
+        print(f"- {name}: {st['count']}x, total {st['total_ms']} ms, média {st['mean_ms']} ms, máx {st['max_ms']} ms")
+    running, last = res["capture"]["running"], res["capture"]["last"]
+    if running:
+        print(f"Captura {running['mode']} em andamento, faltam {running['remaining']}s")
+    if last:
+        files = ', '.join(last["files"]) or last.get("error") or "nada capturado"
+        print(f"Última captura ({last['mode']}, {last['samples']} amostras): {files}")
+
+
+def wait_downloads(args, names):
+    """Acompanha os downloads pedidos ate todos terminarem. Retorna True se todos deram certo."""
+    pending = set(names)
+    while True:
+        jobs = call(args, "progress").get("downloads", [])
+        # O mesmo arquivo pode ter sido pedido antes: vale o pedido mais recente
+        latest = {job["file_name"]: job for job in jobs if job["file_name"] in pending}
+        done = sum(job["done_chunks"] for job in latest.values())
+        total = sum(job["total_chunks"] for job in latest.values())
+        finished = [job for job in latest.values() if job["status"] in FINISHED]
+        print(f"\r{len(finished)}/{len(pending)} arquivos, {done}/{total} chunks", end="", flush=True)
+        if len(finished) == len(pending):
+            print()
+            failed = [job["file_name"] for job in finished if job["status"] != "concluido"]
+            if failed:
+                print(f"Falharam: {', '.join(failed)}", file=sys.stderr)
+            return not failed
+        time.sleep(1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=CONTROL_PORT, help='Porta da API de controle do daemon')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status')
+    p = sub.add_parser('login')
+    p.add_argument('username')
+    p.add_argument('password')
+    p.add_argument('--register', action='store_true', help='Registra o usuário antes do login')
+    sub.add_parser('logout')
+    sub.add_parser('announce')
+    p = sub.add_parser('search')
+    p.add_argument('query', nargs='?', default='')
+    p = sub.add_parser('download')
+    p.add_argument('names', nargs='*')
+    p.add_argument('--manifest', help='Arquivo com a lista de downloads')
+    p.add_argument('--priority', type=int, default=0)
+    p.add_argument('--wait', action='store_true', help='Espera todos os downloads terminarem')
+    p.add_argument('--sequential', action='store_true',
+                   help='Baixa em ordem; o arquivo cresce em downloads/<nome>.part enquanto chega')
+    sub.add_parser('progress')
+    p = sub.add_parser('profile')
+    p.add_argument('op', nargs='?', default='status',
+                   choices=['status', 'spans-on', 'spans-off', 'reset', 'capture', 'stop'])
+    p.add_argument('--mode', choices=CAPTURE_MODES, default='sample', help='Tipo de captura')
+    p.add_argument('--seconds', type=float, default=DEFAULT_CAPTURE_SECONDS, help='Duração da captura')
+    p.add_argument('--interval', type=float, default=SAMPLE_INTERVAL, help='Segundos entre amostras (modo sample)')
+    p.add_argument('--all-threads', action='store_true', help='Amostra também threads fora de spans')
+    p.add_argument('--wait', action='store_true', help='Espera a captura terminar')
+    p.add_argument('--tracker', help='Envia ao tracker (IP:PORTA, a partir do host dele) em vez do daemon')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        res = call(args, "status")
+        print(json.dumps(res, indent=2))
+    elif args.command == 'login':
+        res = call(args, "login", username=args.username, password=args.password, register=args.register)
+        if res.get("status"):
+            print(f"Logado; servindo chunks na porta {res['port']}")
+    elif args.command == 'logout':
+        res = call(args, "logout")
+    elif args.command == 'announce':
+        res = call(args, "announce", timeout=SLOW_TIMEOUT)
+        if res.get("status"):
+            print(f"{len(res['files'])} arquivo(s) anunciado(s)")
+    elif args.command == 'search':
+        res = call(args, "search", query=args.query)
+        for name, meta in sorted(res.get("files", {}).items()):
+            print(f"- {name} ({meta['size']} B, {meta['peers']} peers)")
+    elif args.command == 'download':
+        entries = [{"name": n, "priority": args.priority} for n in args.names]
+        if args.manifest:
+            entries += load_manifest(args.manifest)
+        if not entries:
+            parser.error('informe nomes de arquivos ou --manifest')
+        res = call(args, "download", timeout=30, files=entries, priority=args.priority, sequential=args.sequential)
+        print(f"{len(res.get('queued', []))} arquivo(s) na fila")
+        if res.get("missing"):
+            print(f"Não encontrados na rede: {', '.join(res['missing'])}", file=sys.stderr)
+        if args.wait and res.get("queued"):
+            sys.exit(0 if wait_downloads(args, res["queued"]) and not res.get("missing") else 1)
+    elif args.command == 'progress':
+        res = call(args, "progress")
+        for job in res.get("downloads", []):
+            streamed = f", {job['readable_bytes']} B legíveis" if job.get('sequential') else ""
+            print(f"- {job['file_name']} [{job['status']}] {job['done_chunks']}/{job['total_chunks']} chunks "
+                  f"({job['bytes_done']} B em {job['elapsed']}s{streamed})")
+    elif args.command == 'profile':
+        res = profile(args)
+        print_profile(res)
+    sys.exit(0 if res.get("status") else 1)
+
+
+if __name__ == "__main__":
+    main()
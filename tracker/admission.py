@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+
+from utils.rate_limiter import TokenBucket
+
+# Classes de acao com limites proprios. O que nao esta listado conta como "write".
+# list_files serializa o catalogo inteiro e so e pedido pelo usuario: limite proprio, bem menor
+ACTION_CLASSES = {
+    "list_files": "catalog", "search": "read", "locate_chunks": "read", "get_peer_score": "read",
+    "get_scores": "read", "get_active_peers": "read", "list_rooms": "read",
+    "login": "session", "logout": "session", "heartbeat": "session", "reconcile": "session",
+    "verify_credentials": "session", "get_metrics": "read", "profile": "read",
+}
+DEFAULT_CLASS = "write"
+# Pedidos dos shards secundarios ao primario: isentos so quando vem do endereco de
+# um shard (ver is_tracker_request). Workers falam com a autoridade pelo canal interno, sem limite
+TRACKER_ACTIONS = {"verify_credentials", "get_scores"}
+# classe -> (requisicoes por segundo, rajada) para cada cliente. "write" inclui
+# report_upload, enviado a cada chunk servido: um semeador rapido manda dezenas por segundo
+DEFAULT_LIMITS = {"catalog": (2.0, 10.0), "read": (20.0, 40.0), "write": (50.0, 100.0), "session": (5.0, 10.0)}
+# Clientes com balde guardado; os ociosos ha mais tempo saem primeiro
+MAX_CLIENTS = 10000
+# Threads que atendem requisicoes e conexoes aceitas esperando por uma delas
+MAX_HANDLERS = 64
+ADMISSION_QUEUE = 256
+# Sugestao de espera (s) quando a fila de conexoes esta cheia
+OVERLOAD_RETRY_AFTER = 0.5
+
+
+def parse_limits(text, workers=1):
+    """Le "read=20:40,write=50:100,..." (taxa:rajada por classe). "off" desliga os limites.
+
+    Com 'workers' processos (SO_REUSEPORT), cada um tem os seus baldes e as
+    conexoes de um cliente caem em qualquer deles: cada worker fica com a sua
+    fracao do limite, para o total do tracker continuar o configurado.
+    """
+    if not text or text.strip().lower() == "off":
+        return {}
+    limits = dict(DEFAULT_LIMITS)
+    for item in text.split(','):
+        name, _, spec = item.partition('=')
+        rate, _, burst = spec.partition(':')
+        limits[name.strip()] = (float(rate), float(burst or rate))
+    workers = max(1, workers)
+    return {name: (rate / workers, max(1.0, burst / workers)) for name, (rate, burst) in limits.items()}
+
+
+def client_key(addr, request, sessions):
+    """Identifica o cliente pelo IP; um peer logado tem balde proprio, pela porta da sessao.
+
+    O usuario declarado sozinho nao serve: um nome novo a cada pedido ganharia
+    um balde novo. So conta a porta cuja sessao em 'sessions' e desse usuario.
+    """
+    ip = addr[0]
+    port = request.get("port")
+    session = sessions.get((ip, port)) if isinstance(port, int) else None
+    if session and session.get("username") == request.get("username"):
+        return (ip, port)
+    return (ip, None)
+
+
+def is_tracker_request(addr, request, shards):
+    """True para pedidos entre trackers vindos do IP de um shard do cluster ("ip:porta")."""
+    if request.get("action") not in TRACKER_ACTIONS:
+        return False
+    return any(shard.rpartition(':')[0] == addr[0] for shard in shards)
+
+
+class RateLimiter:
+    """Um balde de fichas por cliente e por classe de acao (utils/rate_limiter.TokenBucket)."""
+
+    def __init__(self, limits=None, max_clients=MAX_CLIENTS):
+        self.limits = DEFAULT_LIMITS if limits is None else limits
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client, action):
+        """Retorna 0 se a requisicao pode seguir, ou os segundos que o cliente deve esperar."""
+        action_class = ACTION_CLASSES.get(action, DEFAULT_CLASS)
+        limit = self.limits.get(action_class)
+        if not limit:
+            return 0.0
+        key = (client, action_class)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(*limit)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+        return bucket.try_consume()
+
+    def __len__(self):
+        return len(self._buckets)
@@ -1,5 +1,4 @@
 import hashlib
-import datetime
 
 users_db = {}  # username -> hashed_password
 
@@ -22,16 +21,3 @@ def authenticate_user(username, password):
 
 def get_all_users():
     return users_db
-
-
-def log(msg, level="INFO"):
-    now = datetime.datetime.now().strftime("%H:%M:%S")
-    color_map = {
-        "INFO": "\033[94m",     # Azul
-        "SUCCESS": "\033[92m",  # Verde
-        "WARNING": "\033[93m",  # Amarelo
-        "ERROR": "\033[91m",    # Vermelho
-    }
-    end_color = "\033[0m"
-    color = color_map.get(level.upper(), "")
-    print(f"{color}[{now}] [{level.upper()}] {msg}{end_color}")
@@ -0,0 +1,37 @@
+from collections import OrderedDict
+
+# Chaves lembradas por estrutura; alem disso as mais antigas sao esquecidas e
+# uma replica atrasada demais recebe a estrutura inteira
+MAX_CHANGES = 200000
+
+
+class ChangeLog:
+    """Versao da ultima mudanca de cada chave de uma estrutura replicada.
+
+    A autoridade marca cada chave alterada ou removida; uma replica na versao v
+    pede so as chaves marcadas depois de v. Sem lock proprio: o tracker o usa
+    sob _version_lock, junto com o contador de versoes.
+    """
+
+    def __init__(self, max_keys=MAX_CHANGES):
+        self.max_keys = max_keys
+        self.floor = 0  # mudancas ate esta versao podem ter sido esquecidas
+        self._versions = OrderedDict()
+
+    def mark(self, key, version):
+        self._versions[key] = version
+        self._versions.move_to_end(key)
+        while len(self._versions) > self.max_keys:
+            _, dropped = self._versions.popitem(last=False)
+            self.floor = dropped
+
+    def since(self, version):
+        """Chaves alteradas depois de 'version', ou None se o historico ja nao alcanca essa versao."""
+        if version < self.floor:
+            return None
+        keys = []
+        for key, changed in reversed(self._versions.items()):
+            if changed <= version:
+                break
+            keys.append(key)
+        return keys
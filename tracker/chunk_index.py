@@ -0,0 +1,43 @@
+import threading
+
+
+class ChunkIndex:
+    """Indice reverso do catalogo: hash de chunk -> nomes dos arquivos que o contem.
+
+    Arquivos com nomes diferentes e conteudo igual (ou parcialmente igual)
+    compartilham entradas, entao quem tem um chunk em qualquer arquivo pode
+    servi-lo. Derivado de files_db: nao vai para o disco e e reconstruido ao
+    restaurar o catalogo ou sincronizar uma replica.
+    """
+
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, files):
+        index = cls()
+        for name, meta in files.items():
+            index.add(name, meta.get("chunk_hashes", ()))
+        return index
+
+    def add(self, name, chunk_hashes):
+        with self._lock:
+            for chunk_hash in chunk_hashes:
+                self._files.setdefault(chunk_hash, set()).add(name)
+
+    def remove(self, name, chunk_hashes):
+        with self._lock:
+            for chunk_hash in chunk_hashes:
+                names = self._files.get(chunk_hash)
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self._files[chunk_hash]
+
+    def files_with(self, chunk_hash):
+        with self._lock:
+            return set(self._files.get(chunk_hash, ()))
+
+    def __len__(self):
+        return len(self._files)
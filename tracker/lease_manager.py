@@ -0,0 +1,51 @@
+import heapq
+import threading
+import time
+
+
+class LeaseManager:
+    """Leases de presenca com expiracao por heap de prazos.
+
+    Cada renovacao empilha um novo prazo; prazos antigos ficam no heap e sao
+    descartados quando chegam ao topo (remocao preguicosa). Verificar quem
+    expirou custa O(k log n) para k entradas vencidas, sem varrer todos os peers.
+    """
+
+    def __init__(self, duration):
+        self.duration = duration
+        self._heap = []       # (prazo, chave)
+        self._deadlines = {}  # chave -> prazo vigente
+        self._lock = threading.Lock()
+
+    def renew(self, key, now=None):
+        """Cria ou estende o lease da chave e retorna o novo prazo."""
+        deadline = (now if now is not None else time.monotonic()) + self.duration
+        with self._lock:
+            self._deadlines[key] = deadline
+            heapq.heappush(self._heap, (deadline, key))
+        return deadline
+
+    def revoke(self, key):
+        with self._lock:
+            self._deadlines.pop(key, None)
+
+    def is_active(self, key):
+        with self._lock:
+            return key in self._deadlines
+
+    def pop_expired(self, now=None):
+        """Remove e retorna as chaves cujo lease venceu."""
+        now = now if now is not None else time.monotonic()
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, key = heapq.heappop(self._heap)
+                # Ignora prazos substituidos por uma renovacao posterior
+                if self._deadlines.get(key) == deadline:
+                    del self._deadlines[key]
+                    expired.append(key)
+        return expired
+
+    def __len__(self):
+        with self._lock:
+            return len(self._deadlines)
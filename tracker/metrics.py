@@ -0,0 +1,183 @@
+import bisect
+import threading
+
+# Limites (segundos) dos baldes do histograma de latencia
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Evita que acoes inventadas por clientes criem series sem limite
+MAX_ACTIONS = 64
+OTHER_ACTION = "other"
+
+
+class Histogram:
+    """Histograma de baldes fixos (contagem por balde, soma e total)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # ultimo balde = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {"buckets": list(self.buckets), "counts": list(self.counts),
+                "sum": round(self.sum, 6), "count": self.count}
+
+
+def _merge_histograms(snapshots):
+    merged = {"buckets": snapshots[0]["buckets"], "counts": [0] * len(snapshots[0]["counts"]), "sum": 0.0, "count": 0}
+    for hist in snapshots:
+        merged["counts"] = [a + b for a, b in zip(merged["counts"], hist["counts"])]
+        merged["sum"] += hist["sum"]
+        merged["count"] += hist["count"]
+    merged["sum"] = round(merged["sum"], 6)
+    return merged
+
+
+def merge_snapshots(snapshots, gauges=None):
+    """Soma snapshots de varios processos (autoridade e workers do modo multiprocesso).
+
+    Os contadores sao acumulados desde o inicio de cada processo, entao a soma
+    dos ultimos snapshots de cada um e o total. Gauges nao sao somados: valem
+    os do processo que guarda o estado.
+    """
+    merged = {"requests": {}, "errors": {}, "in_flight": {}, "rejected": {}, "latency_seconds": {},
+              "state_writes": 0, "state_write_bytes_total": 0, "state_last_write_bytes": 0,
+              "gauges": dict(gauges or {})}
+    for snap in snapshots:
+        for key in ("requests", "errors", "in_flight", "rejected"):
+            for label, n in snap[key].items():
+                merged[key][label] = merged[key].get(label, 0) + n
+        for key in ("state_writes", "state_write_bytes_total"):
+            merged[key] += snap[key]
+        merged["state_last_write_bytes"] = max(merged["state_last_write_bytes"], snap["state_last_write_bytes"])
+    actions = {action for snap in snapshots for action in snap["latency_seconds"]}
+    for action in actions:
+        merged["latency_seconds"][action] = _merge_histograms(
+            [snap["latency_seconds"][action] for snap in snapshots if action in snap["latency_seconds"]])
+    merged["state_write_seconds"] = _merge_histograms([snap["state_write_seconds"] for snap in snapshots])
+    return merged
+
+
+class TrackerMetrics:
+    """Contadores, histogramas de latencia e gauges por acao do tracker.
+
+    Cada requisicao custa duas aquisicoes de lock e um bisect, entao a
+    instrumentacao pode ficar sempre ligada.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.errors = {}
+        self.in_flight = {}
+        self.latency = {}
+        self.rejected = {}  # motivo ("rate_limit", "overload") -> conexoes recusadas
+        self.state_writes = 0
+        self.state_write_bytes_total = 0
+        self.state_last_write_bytes = 0
+        self.state_write_latency = Histogram()
+
+    def _label(self, action):
+        action = str(action)
+        if not action.replace('_', '').isalnum():
+            return OTHER_ACTION
+        if action in self.requests or len(self.requests) < MAX_ACTIONS:
+            return action
+        return OTHER_ACTION
+
+    def begin(self, action):
+        with self._lock:
+            action = self._label(action)
+            self.in_flight[action] = self.in_flight.get(action, 0) + 1
+            self.requests.setdefault(action, 0)
+        return action
+
+    def end(self, action, seconds, error=False):
+        """Fecha uma requisicao aberta com begin() (use o rotulo retornado por ele)."""
+        with self._lock:
+            self.in_flight[action] -= 1
+            self.requests[action] += 1
+            if error:
+                self.errors[action] = self.errors.get(action, 0) + 1
+            hist = self.latency.get(action)
+            if hist is None:
+                hist = self.latency[action] = Histogram()
+            hist.observe(seconds)
+
+    def reject(self, reason):
+        """Conta uma requisicao recusada pelo controle de admissao (ver admission.py)."""
+        with self._lock:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def observe_state_write(self, nbytes, seconds):
+        with self._lock:
+            self.state_writes += 1
+            self.state_write_bytes_total += nbytes
+            self.state_last_write_bytes = nbytes
+            self.state_write_latency.observe(seconds)
+
+    def snapshot(self, gauges=None):
+        """Retorna todas as metricas como dict serializavel em JSON."""
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "errors": dict(self.errors),
+                "in_flight": dict(self.in_flight),
+                "latency_seconds": {a: h.snapshot() for a, h in self.latency.items()},
+                "rejected": dict(self.rejected),
+                "state_writes": self.state_writes,
+                "state_write_bytes_total": self.state_write_bytes_total,
+                "state_last_write_bytes": self.state_last_write_bytes,
+                "state_write_seconds": self.state_write_latency.snapshot(),
+                "gauges": dict(gauges or {}),
+            }
+
+    def render_text(self, gauges=None):
+        """Formato de exposicao em texto (compativel com o do Prometheus)."""
+        return render_snapshot(self.snapshot(gauges))
+
+
+def render_snapshot(snap):
+    """Texto de exposicao de um snapshot (de um processo ou somado por merge_snapshots)."""
+    lines = []
+
+    def histogram(name, label, hist):
+        cumulative = 0
+        for bound, count in zip(hist["buckets"] + ["+Inf"], hist["counts"]):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label}le="{bound}"}} {cumulative}')
+        selector = f'{{{label.rstrip(",")}}}' if label else ''
+        lines.append(f'{name}_sum{selector} {hist["sum"]}')
+        lines.append(f'{name}_count{selector} {hist["count"]}')
+
+    lines.append("# TYPE tracker_requests_total counter")
+    for action, n in sorted(snap["requests"].items()):
+        lines.append(f'tracker_requests_total{{action="{action}"}} {n}')
+    lines.append("# TYPE tracker_request_errors_total counter")
+    for action, n in sorted(snap["errors"].items()):
+        lines.append(f'tracker_request_errors_total{{action="{action}"}} {n}')
+    lines.append("# TYPE tracker_requests_in_flight gauge")
+    for action, n in sorted(snap["in_flight"].items()):
+        lines.append(f'tracker_requests_in_flight{{action="{action}"}} {n}')
+    lines.append("# TYPE tracker_rejected_total counter")
+    for reason, n in sorted(snap["rejected"].items()):
+        lines.append(f'tracker_rejected_total{{reason="{reason}"}} {n}')
+    lines.append("# TYPE tracker_request_duration_seconds histogram")
+    for action, hist in sorted(snap["latency_seconds"].items()):
+        histogram("tracker_request_duration_seconds", f'action="{action}",', hist)
+    lines.append("# TYPE tracker_state_writes_total counter")
+    lines.append(f'tracker_state_writes_total {snap["state_writes"]}')
+    lines.append("# TYPE tracker_state_write_bytes_total counter")
+    lines.append(f'tracker_state_write_bytes_total {snap["state_write_bytes_total"]}')
+    lines.append("# TYPE tracker_state_last_write_bytes gauge")
+    lines.append(f'tracker_state_last_write_bytes {snap["state_last_write_bytes"]}')
+    lines.append("# TYPE tracker_state_write_duration_seconds histogram")
+    histogram("tracker_state_write_duration_seconds", "", snap["state_write_seconds"])
+    for name, value in sorted(snap["gauges"].items()):
+        lines.append(f"# TYPE tracker_{name} gauge")
+        lines.append(f"tracker_{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,59 @@
+import math
+import random
+import time
+
+# Quantos peers o tracker devolve por arquivo em list_files/search
+TOP_K = 5
+# Slots de upload presumidos para um peer que (ainda) nao informou carga
+DEFAULT_FREE_SLOTS = 4
+# Carga mais velha que isto (s) e tratada como desconhecida
+LOAD_MAX_AGE = 60.0
+# Peso da pontuacao: (1 + score) ** SCORE_EXPONENT. Abaixo de 1 a pontuacao
+# ainda favorece quem colabora, mas nao a ponto de todos escolherem o mesmo peer
+SCORE_EXPONENT = 0.5
+
+
+def sanitize_load(load, max_slots=DEFAULT_FREE_SLOTS):
+    """Carga recebida num heartbeat, reduzida aos campos conhecidos com numeros validos.
+
+    Vem do proprio peer: um valor nao numerico quebraria peer_weight em toda
+    listagem que o inclui, e uma folga enorme o poria sempre em primeiro.
+    Uploads e slots ficam entre 0 e max_slots; campos invalidos sao omitidos
+    (peer_weight usa o padrao).
+    """
+    clean = {}
+    for key, limit in (("active_uploads", max_slots), ("free_slots", max_slots), ("throughput", None)):
+        value = load.get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            continue
+        value = max(0, value)
+        clean[key] = value if limit is None else min(value, limit)
+    return clean
+
+
+def peer_weight(score, load, now=None):
+    """Peso de um peer: pontuacao alta e folga de upload aumentam a chance de ser escolhido."""
+    now = now if now is not None else time.time()
+    if not load or now - load.get("at", 0) > LOAD_MAX_AGE:
+        active, free = 0, DEFAULT_FREE_SLOTS
+    else:
+        active, free = load.get("active_uploads", 0), load.get("free_slots", DEFAULT_FREE_SLOTS)
+    return (1.0 + max(0.0, score)) ** SCORE_EXPONENT * (1.0 + max(0, free)) / (1.0 + max(0, active))
+
+
+def select_peers(candidates, k=TOP_K, rng=random, now=None):
+    """Escolhe ate k peers ponderando pontuacao e carga, sem reposicao.
+
+    'candidates' e uma lista de (peer, score, load). Usa o sorteio ponderado de
+    Efraimidis-Spirakis (chave u ** (1/peso), maiores primeiro): peers com mais
+    peso tendem a vir na frente, mas pedidos simultaneos recebem conjuntos e
+    ordens diferentes, espalhando os downloads entre os semeadores.
+    Retorna [(peer, score, load)] na ordem de preferencia.
+    """
+    now = now if now is not None else time.time()
+    keyed = []
+    for candidate in candidates:
+        weight = peer_weight(candidate[1], candidate[2], now)
+        keyed.append((rng.random() ** (1.0 / weight), candidate))
+    keyed.sort(key=lambda item: item[0], reverse=True)
+    return [candidate for _, candidate in keyed[:k]]
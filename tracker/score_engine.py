@@ -0,0 +1,131 @@
+import math
+import threading
+import time
+
+# Pesos da pontuacao (os mesmos da formula antiga: 1 ponto por chunk de 1 MB
+# enviado e 0.01 ponto por segundo online), agora com decaimento exponencial
+UPLOAD_POINTS_PER_MB = 1.0
+UPTIME_POINTS_PER_SECOND = 0.01
+# Em quanto tempo uma pontuacao parada cai pela metade
+SCORE_HALF_LIFE = 7 * 24 * 3600
+# Maior expoente de exp(decay * (t - epoch)) antes de o epoch avancar (e^50 ~ 5e21,
+# longe do limite do float em e^709)
+REBASE_EXPONENT = 50.0
+
+
+class ScoreEngine:
+    """Pontuacoes com decaimento exponencial, atualizadas em O(1) por evento.
+
+    Cada entrada de peer_scores guarda o valor em um instante ("score" em
+    "score_at") e quantas sessoes do usuario estao abertas ("online"). Entre
+    dois eventos o valor evolui por uma formula fechada: decai com a meia-vida
+    e, se o usuario esta online, acumula uptime continuamente. Assim login,
+    logout e upload so ajustam a propria entrada, e qualquer processo (autoridade
+    ou replica) calcula a pontuacao atual a partir dela.
+
+    Para a reclassificacao em lote, cada entrada guarda tambem "k" e "k_epoch", tal que
+    pontuacao(t) = k * exp(-decay * (t - k_epoch)) + (online ? uptime_rate / decay : 0).
+    O fator exponencial e o mesmo para todas as entradas com o mesmo epoch, entao
+    reclassificar custa uma multiplicacao e uma soma por usuario. O epoch avanca
+    quando exp(decay * (t - epoch)) ficaria grande demais (tracker ligado por
+    muitas meias-vidas); entradas antigas continuam validas com o proprio k_epoch.
+    """
+
+    def __init__(self, half_life=SCORE_HALF_LIFE, uptime_rate=UPTIME_POINTS_PER_SECOND,
+                 upload_points_per_mb=UPLOAD_POINTS_PER_MB):
+        self.half_life = half_life
+        self.uptime_rate = uptime_rate
+        self.upload_points_per_mb = upload_points_per_mb
+        self.epoch = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def half_life(self):
+        return self._half_life
+
+    @half_life.setter
+    def half_life(self, seconds):
+        self._half_life = seconds
+        self.decay = math.log(2) / seconds
+
+    def value(self, entry, now=None):
+        """Pontuacao atual de uma entrada, sem altera-la."""
+        now = now if now is not None else time.time()
+        elapsed = max(0.0, now - entry.get("score_at", now))
+        factor = math.exp(-self.decay * elapsed)
+        score = entry.get("score", 0) * factor
+        if entry.get("online"):
+            # Integral do uptime decaido no intervalo
+            score += self.uptime_rate * (1.0 - factor) / self.decay
+        return score
+
+    def _settle(self, entry, now):
+        # Eventos fora de ordem (ex.: lease expirado no ultimo heartbeat) nao voltam no tempo
+        now = max(now, entry.get("score_at", now))
+        entry["score"] = self.value(entry, now)
+        entry["score_at"] = now
+
+    def _update_coefficient(self, entry):
+        score = entry["score"]
+        if entry.get("online"):
+            score -= self.uptime_rate / self.decay
+        if self.decay * (entry["score_at"] - self.epoch) > REBASE_EXPONENT:
+            self.epoch = entry["score_at"]
+        entry["k"] = score * math.exp(self.decay * (entry["score_at"] - self.epoch))
+        entry["k_epoch"] = self.epoch
+
+    def adopt(self, entry, now=None):
+        """Prepara uma entrada carregada do disco: sem sessoes abertas e com instante de referencia."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            entry.setdefault("score_at", now)
+            entry.setdefault("score", 0)
+            entry["online"] = 0
+            self._update_coefficient(entry)
+        return entry
+
+    def add_upload(self, entry, nbytes, now=None):
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._settle(entry, now)
+            entry["score"] += self.upload_points_per_mb * nbytes / (1024 * 1024)
+            self._update_coefficient(entry)
+
+    def session_started(self, entry, now=None):
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._settle(entry, now)
+            entry["online"] = entry.get("online", 0) + 1
+            self._update_coefficient(entry)
+
+    def session_ended(self, entry, now=None):
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._settle(entry, now)
+            entry["online"] = max(0, entry.get("online", 0) - 1)
+            self._update_coefficient(entry)
+
+    def rank(self, table, now=None):
+        """Calcula de uma vez a pontuacao atual de todos: {username: score}.
+
+        Usado pela reclassificacao periodica do tracker; as leituras entre duas
+        reclassificacoes sao so consultas a este dicionario.
+        """
+        now = now if now is not None else time.time()
+        factors = {}  # k_epoch -> exp(-decay * (now - k_epoch)); quase sempre um ou dois
+        steady = self.uptime_rate / self.decay
+        ranked = {}
+        for username, entry in list(table.items()):
+            k = entry.get("k")
+            if k is None:
+                ranked[username] = self.value(entry, now)
+                continue
+            epoch = entry.get("k_epoch", self.epoch)
+            factor = factors.get(epoch)
+            if factor is None:
+                factor = factors[epoch] = math.exp(-self.decay * (now - epoch))
+            if entry.get("online"):
+                ranked[username] = k * factor + steady
+            else:
+                ranked[username] = k * factor
+        return ranked
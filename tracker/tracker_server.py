@@ -4,35 +4,104 @@ import json
 import datetime
 import os
 import sys
+import time
+import signal
+import pickle
+import uuid
+from queue import Queue, Full
 
 # Garanta que o diretório pai esteja no PYTHONPATH para permitir "import utils"
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from auth_manager import register_user, authenticate_user, log, users_db
-from utils.config import TRACKER_HOST, TRACKER_PORT
+from auth_manager import register_user, authenticate_user, users_db
+from lease_manager import LeaseManager
+from metrics import TrackerMetrics, merge_snapshots, render_snapshot
+from score_engine import ScoreEngine, SCORE_HALF_LIFE
+from peer_selection import select_peers, sanitize_load, TOP_K
+from chunk_index import ChunkIndex
+from change_log import ChangeLog
+from admission import (RateLimiter, client_key, is_tracker_request, parse_limits, DEFAULT_LIMITS, MAX_HANDLERS,
+                       ADMISSION_QUEUE, OVERLOAD_RETRY_AFTER)
+from utils.config import TRACKER_HOST, TRACKER_PORT, UPLOAD_SLOTS
+from utils.chunk_manager import CHUNK_SIZE
+from utils.hashing import HASH_ALGORITHMS, DEFAULT_HASH_ALGO
+from utils import logger, profiling
+from utils.logger import log, enabled as log_enabled
+from common.connection import send_message, recv_request
+from common.catalog import catalog_digest
+from common.protocol import MAX_LOCATE_HASHES
 
 # --- ESTRUTURAS DE DADOS ---
 
 # Armazena metadados de arquivos
-# formato: { filename: {"size": int, "hash": str, "chunk_hashes": [str], "peers": [(ip, port)]} }
+# formato: { filename: {"size": int, "hash_algo": str, "hash": str, "chunk_hashes": [str], "peers": [(ip, port)]} }
 files_db = {}
 
+# Algoritmo de hash preferido, oferecido aos peers no login (o sha256 sempre vale,
+# para peers e anúncios antigos, que não informam "hash_algo")
+HASH_ALGO = DEFAULT_HASH_ALGO
+
+# Índice reverso por conteúdo: hash de chunk -> arquivos que o contêm (ação "locate_chunks")
+chunk_index = ChunkIndex()
+
 # Armazena peers atualmente logados
-# formato: { (ip, port): { "username": str, "login_time": datetime } }
+# formato: { (ip, port): { "username": str, "login_time": datetime, "last_seen": datetime,
+#                          "load": {"active_uploads", "free_slots", "throughput", "at"} } }
+# "load" chega nos heartbeats e orienta a escolha de peers (ver peer_selection.py)
 active_peers = {}
 
+# Índice reverso dos arquivos anunciados por cada peer (evita varrer files_db no logout)
+# formato: { (ip, port): {filename, ...} }
+peer_files = {}
+
+# Presença por lease: peers renovam com "heartbeat"; quem some é expirado como num logout
+LEASE_SECONDS = 30
+LEASE_CHECK_INTERVAL = 1.0
+leases = LeaseManager(LEASE_SECONDS)
+sessions_lock = threading.RLock()
+
+# Contadores e latências por ação (ação "get_metrics" ou porta HTTP --metrics-port)
+metrics = TrackerMetrics()
+# Modo multiprocesso: último snapshot de métricas enviado por cada worker (índice -> snapshot)
+worker_metrics = {}
+WORKER_METRICS_INTERVAL = 1.0  # segundos entre envios de cada worker à autoridade
+
 # Armazena pontuações de incentivo para cada usuário (persistente enquanto o tracker rodar)
-# formato: { username: {"uploads": int, "uptime_seconds": int, "score": float} }
+# formato: { username: {"uploads": int, "upload_bytes": int, "uptime_seconds": int,
+#                       "score": float, "score_at": float, "online": int} }
+# "score" vale no instante "score_at" e decai com o tempo (ver score_engine.py)
 peer_scores = {}
+score_engine = ScoreEngine(SCORE_HALF_LIFE)
+# Pontuações atuais de todos, recalculadas em lote a cada SCORE_RERANK_INTERVAL segundos
+SCORE_RERANK_INTERVAL = 1.0
+_ranking = {"at": 0.0, "scores": {}}
 
 # Armazena salas de chat
 # formato: { room_name: {"moderator": str, "address": "ip:port", "members": [usernames] } }
 chat_rooms = {}
 
+# Modo cluster: enderecos "ip:porta" de todos os shards e o indice deste processo.
+# O shard 0 e o primario: guarda usuarios, pontuacoes e salas. Os demais guardam
+# apenas a sua particao de files_db (ver common/hash_ring.py).
+SHARDS = []
+SHARD_INDEX = 0
+SCORE_CACHE_TTL = 2.0  # segundos que um shard secundario reaproveita as pontuacoes do primario
+_remote_scores = {"fetched_at": 0.0, "scores": {}}
+
 # Arquivo para persistir dados entre reinicios
 STATE_FILE = os.path.join(os.path.dirname(__file__), 'tracker_state.json')
 POPULATE_FILE = os.path.join(os.path.dirname(__file__), '..', 'populate', 'tracker_state.json')
 
+# Snapshot do catálogo e das sessões para reinício a quente. Em pickle: com
+# 100k arquivos carrega bem mais rápido que JSON. Definido a partir de
+# STATE_FILE (um por shard) ou por --catalog-file.
+CATALOG_FILE = None
+CATALOG_FORMAT = 1
+CATALOG_SNAPSHOT_INTERVAL = 10.0  # segundos entre gravações, só se o estado mudou
+_catalog_saved_version = None
+# Identifica esta execução do tracker; o peer percebe um reinício quando ele muda
+BOOT_ID = uuid.uuid4().hex[:12]
+
 
 def load_state():
     """Carrega dados persistidos ou usa o arquivo de populacao como base."""
@@ -46,239 +115,993 @@ def load_state():
             data = json.load(f)
             users_db.update(data.get('users', {}))
             peer_scores.update(data.get('scores', {}))
+            for stats in peer_scores.values():
+                score_engine.adopt(stats)
             chat_rooms.update(data.get('rooms', {}))
         if source == POPULATE_FILE:
             save_state()
 
 
 def save_state():
+    if not is_primary():
+        return  # shards secundarios nao possuem estado persistente
     data = {
         'users': users_db,
         'scores': peer_scores,
         'rooms': chat_rooms,
     }
-    with open(STATE_FILE, 'w') as f:
-        json.dump(data, f)
+    started = time.perf_counter()
+    with profiling.span("tracker.save_state"):
+        payload = json.dumps(data)
+        with open(STATE_FILE, 'w') as f:
+            f.write(payload)
+    metrics.observe_state_write(len(payload), time.perf_counter() - started)
+
+
+
+def default_catalog_file():
+    base = os.path.splitext(STATE_FILE)[0]
+    if SHARDS:
+        base += f".shard{SHARD_INDEX}"
+    return base + ".catalog"
+
+
+def save_catalog():
+    """Grava catálogo e sessões ativas; o arquivo só é trocado depois de escrito por inteiro."""
+    global _catalog_saved_version
+    if not CATALOG_FILE:
+        return
+    started = time.perf_counter()
+    with sessions_lock:
+        version = _catalog_version
+        payload = pickle.dumps({
+            "format": CATALOG_FORMAT,
+            "saved_at": time.time(),
+            "files": files_db,
+            "active_peers": active_peers,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path = CATALOG_FILE + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, CATALOG_FILE)
+    _catalog_saved_version = version
+    metrics.observe_state_write(len(payload), time.perf_counter() - started)
+
+
+def load_catalog():
+    """Restaura o último snapshot do catálogo. Sessões restauradas ganham um lease novo:
+    quem não voltar a mandar heartbeat expira normalmente."""
+    global _catalog_saved_version
+    if not CATALOG_FILE or not os.path.exists(CATALOG_FILE):
+        return False
+    started = time.perf_counter()
+    try:
+        with open(CATALOG_FILE, 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError) as e:
+        log(f"Snapshot do catálogo ilegível ({e}); iniciando com catálogo vazio.", "WARNING")
+        return False
+    if data.get("format") != CATALOG_FORMAT:
+        log("Snapshot do catálogo em formato antigo; ignorado.", "WARNING")
+        return False
+    with sessions_lock:
+        files_db.update(data["files"])
+        for fname, meta in files_db.items():
+            chunk_index.add(fname, meta["chunk_hashes"])
+            for peer_key in meta["peers"]:
+                peer_files.setdefault(peer_key, set()).add(fname)
+        now = datetime.datetime.now()
+        for peer_key, info in data["active_peers"].items():
+            info["last_seen"] = now
+            active_peers[peer_key] = info
+            leases.renew(peer_key)
+            if is_primary():
+                score_engine.session_started(initialize_peer_score(info["username"]))
+    _catalog_saved_version = _catalog_version
+    age = time.time() - data.get("saved_at", time.time())
+    log(f"Catálogo restaurado: {len(files_db)} arquivos e {len(active_peers)} sessões em "
+        f"{time.perf_counter() - started:.2f}s (snapshot de {age:.0f}s atrás).", "INFO")
+    return True
+
+
+def _catalog_snapshotter():
+    while True:
+        time.sleep(CATALOG_SNAPSHOT_INTERVAL)
+        if _catalog_version != _catalog_saved_version:
+            try:
+                save_catalog()
+            except Exception as e:
+                log(f"Erro ao gravar o snapshot do catálogo: {e}", "ERROR")
+
+
+def start_catalog_snapshots():
+    if CATALOG_FILE:
+        threading.Thread(target=_catalog_snapshotter, daemon=True).start()
 
 # Endereço do tracker definido em config.json
 HOST, PORT = TRACKER_HOST, TRACKER_PORT
 
-# --- LÓGICA DE INCENTIVO ---
+# --- MODO CLUSTER ---
+
+def is_primary():
+    return SHARD_INDEX == 0
+
+
+def _primary_address():
+    host, port = SHARDS[0].split(':')
+    return host, int(port)
+
 
-def calculate_score(stats):
-    """Calcula a pontuação de um peer com base em suas estatísticas."""
-    # Métrica híbrida: 1 ponto por upload, 0.01 pontos por segundo online.
-    score = (stats.get("uploads", 0) * 1.0) + (stats.get("uptime_seconds", 0) * 0.01)
-    return round(score, 2)
+def check_credentials(username, password):
+    """Valida credenciais localmente ou, em um shard secundario, consultando o primario."""
+    if is_primary():
+        return authenticate_user(username, password)
+    res = send_message(*_primary_address(), "verify_credentials", {"username": username, "password": password})
+    return bool(res.get("status"))
+
+
+def current_scores():
+    """Pontuações atuais de todos os usuários; reclassifica em lote no máximo a cada SCORE_RERANK_INTERVAL."""
+    now = time.time()
+    if now - _ranking["at"] > SCORE_RERANK_INTERVAL:
+        _ranking["scores"] = score_engine.rank(peer_scores, now)
+        _ranking["at"] = now
+    return _ranking["scores"]
+
+
+def get_score(username):
+    """Pontuacao de um usuario; shards secundarios usam um cache curto do primario."""
+    if is_primary():
+        return round(current_scores().get(username, 0), 2)
+    now = time.time()
+    if now - _remote_scores["fetched_at"] > SCORE_CACHE_TTL:
+        res = send_message(*_primary_address(), "get_scores", {})
+        if res.get("status"):
+            _remote_scores["scores"] = {u: st.get("score", 0) for u, st in res.get("scores", [])}
+        _remote_scores["fetched_at"] = now
+    return _remote_scores["scores"].get(username, 0)
+
+# --- LÓGICA DE INCENTIVO ---
 
 def initialize_peer_score(username):
     """Inicializa a pontuação para um novo usuário ou um usuário que retorna."""
     if username not in peer_scores:
-        peer_scores[username] = {"uploads": 0, "uptime_seconds": 0, "score": 0}
+        peer_scores[username] = score_engine.adopt({"uploads": 0, "upload_bytes": 0, "uptime_seconds": 0, "score": 0})
+        mark_changed("scores", username)
         log(f"Pontuação inicializada para o usuário '{username}'", "INFO")
+    return peer_scores[username]
+
+# --- SESSÕES E LEASES ---
+
+def end_session(peer_key, ended_at=None):
+    """Encerra a sessão de um peer: soma o uptime à pontuação e o remove dos arquivos.
+
+    Retorna o uptime da sessão em segundos, ou None se o peer não estava logado.
+    """
+    with sessions_lock:
+        info = active_peers.pop(peer_key, None)
+        if info is None:
+            return None
+        leases.revoke(peer_key)
+
+        # Calcula o tempo de atividade da sessão
+        ended_at = ended_at or datetime.datetime.now()
+        uptime_seconds = max(0, int((ended_at - info['login_time']).total_seconds()))
+
+        # O uptime já entrou na pontuação durante a sessão; aqui só para de acumular
+        user_stats = initialize_peer_score(info['username'])
+        user_stats["uptime_seconds"] = user_stats.get("uptime_seconds", 0) + uptime_seconds
+        score_engine.session_ended(user_stats, ended_at.timestamp())
+        mark_changed("sessions", peer_key)
+        mark_changed("scores", info['username'])
+
+        # Remove o peer de todos os arquivos que ele sediava
+        for fname in peer_files.pop(peer_key, ()):
+            file_meta = files_db.get(fname)
+            if file_meta and peer_key in file_meta['peers']:
+                file_meta['peers'].remove(peer_key)
+                mark_changed("files", fname)
+
+    save_state()
+    return uptime_seconds
+
+
+def drop_peer_file(peer_key, fname):
+    """Tira o peer da lista de um arquivo; o arquivo sai do catálogo se ninguém mais o tiver."""
+    peer_files.get(peer_key, set()).discard(fname)
+    entry = files_db.get(fname)
+    if entry and peer_key in entry['peers']:
+        entry['peers'].remove(peer_key)
+        if not entry['peers']:
+            del files_db[fname]
+            chunk_index.remove(fname, entry['chunk_hashes'])
+        mark_changed("files", fname)
+
+
+def _lease_reaper():
+    """Expira sessões cujo lease venceu sem heartbeat."""
+    while True:
+        time.sleep(LEASE_CHECK_INTERVAL)
+        with sessions_lock:
+            expired = leases.pop_expired()
+            for peer_key in expired:
+                info = active_peers.get(peer_key)
+                if not info:
+                    continue
+                # Peer sumiu: o uptime conta só até o último sinal de vida
+                uptime_seconds = end_session(peer_key, info.get('last_seen'))
+                log(f"Lease de '{info['username']}' {peer_key} expirou. Uptime da sessão: {uptime_seconds}s.", "WARNING")
+
+
+def start_lease_reaper():
+    threading.Thread(target=_lease_reaper, daemon=True).start()
+
+# --- MÉTRICAS ---
+
+def metric_gauges():
+    """Tamanhos das estruturas em memória expostos junto com as métricas."""
+    return {
+        "files": len(files_db),
+        "chunk_hashes": len(chunk_index),
+        "active_peers": len(active_peers),
+        "leases": len(leases),
+        "users": len(users_db),
+        "rooms": len(chat_rooms),
+        "state_version": STATE_VERSION,
+    }
+
+
+def metrics_snapshot():
+    """Métricas deste processo somadas às dos workers (as leituras são atendidas por eles)."""
+    snap = metrics.snapshot(metric_gauges())
+    if not worker_metrics:
+        return snap
+    return merge_snapshots([snap, *list(worker_metrics.values())], snap["gauges"])
+
+
+def start_metrics_http(port):
+    """Serve as métricas em texto em http://HOST:port/metrics para um coletor local."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render_snapshot(metrics_snapshot()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # não polui o terminal do tracker a cada coleta
+
+    server = ThreadingHTTPServer((HOST, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log(f"Métricas disponíveis em http://{HOST}:{port}/metrics", "INFO")
 
 # --- LÓGICA PRINCIPAL DO TRACKER ---
 
-def handle_request(conn, addr):
-    """Processa uma requisição de um peer."""
-    try:
-        data = conn.recv(4096)
-        if not data:
-            conn.close()
-            return
-        request = json.loads(data.decode())
-        action = request.get("action")
-        response = {}
-
-        ip, port = addr
-        # A porta relevante é a porta TCP que o peer está escutando, enviada na requisição
-        peer_listening_port = request.get("port", port)
-        peer_key = (ip, peer_listening_port)
-        username = request.get("username")
-
-        log(f"Requisição '{action}' recebida de {addr} para o usuário '{username}'", "INFO")
-
-        if action == "register":
-            ok, msg = register_user(request['username'], request['password'])
-            if ok:
-                initialize_peer_score(request['username'])
-                save_state()
-            log(f"Registro de usuário '{request['username']}': {msg}", "INFO")
-            response = {"status": ok, "message": msg}
-
-        elif action == "login":
-            ok = authenticate_user(request['username'], request['password'])
-            if ok:
-                # Garante que a pontuação seja inicializada se o tracker reiniciou
-                initialize_peer_score(request['username'])
+def serialize_files(names, max_peers=TOP_K):
+    """Monta a visao publica dos arquivos com ate max_peers peers ativos por arquivo.
+
+    Os peers sao sorteados ponderando pontuacao e carga informada nos
+    heartbeats, para que downloads simultaneos nao caiam todos no mesmo peer.
+    """
+    serializable_db = {}
+    now = time.time()
+    for fname in names:
+        meta = files_db.get(fname)
+        if meta is None:
+            continue  # removido enquanto a lista era montada
+        candidates = []
+        for ip_peer, port_peer in meta["peers"]:
+            # Encontra o username do peer para buscar sua pontuação
+            peer_info = active_peers.get((ip_peer, port_peer))
+            if peer_info:
+                score = get_score(peer_info.get("username"))
+                candidates.append((f"{ip_peer}:{port_peer}", score, peer_info.get("load")))
+
+        peers = []
+        for peer, score, load in select_peers(candidates, max_peers, now=now):
+            entry = {"peer": peer, "score": score}
+            if load:
+                entry["load"] = {key: load[key] for key in ("active_uploads", "free_slots", "throughput") if key in load}
+            peers.append(entry)
+
+        serializable_db[fname] = {
+            "size": meta["size"], "hash_algo": meta.get("hash_algo", DEFAULT_HASH_ALGO),
+            "hash": meta["hash"], "chunk_hashes": meta["chunk_hashes"],
+            "peers": peers, "peer_count": len(candidates)
+        }
+    return serializable_db
+
+def process_request(request, addr):
+    """Executa uma ação do protocolo e retorna a resposta (sem E/S de socket)."""
+    action = request.get("action")
+    response = {}
+
+    ip, port = addr
+    # A porta relevante é a porta TCP que o peer está escutando, enviada na requisição
+    peer_listening_port = request.get("port", port)
+    peer_key = (ip, peer_listening_port)
+    username = request.get("username")
+
+    if log_enabled("NETWORK"):
+        log(f"Requisição '{action}' recebida de {addr} para o usuário '{username}'", "NETWORK")
+
+    if action == "register":
+        ok, msg = register_user(request['username'], request['password'])
+        if ok:
+            initialize_peer_score(request['username'])
+            save_state()
+        log(f"Registro de usuário '{request['username']}': {msg}", "INFO")
+        response = {"status": ok, "message": msg}
+
+    elif action == "login":
+        ok = check_credentials(request['username'], request['password'])
+        if ok:
+            # Garante que a pontuação seja inicializada se o tracker reiniciou
+            user_stats = initialize_peer_score(request['username'])
+            now = datetime.datetime.now()
+            with sessions_lock:
+                previous = active_peers.get(peer_key)
+                if previous:
+                    # Novo login na mesma porta substitui a sessão anterior
+                    score_engine.session_ended(initialize_peer_score(previous['username']), now.timestamp())
+                    mark_changed("scores", previous['username'])
+                # A partir daqui o uptime entra na pontuação continuamente
+                score_engine.session_started(user_stats, now.timestamp())
                 active_peers[peer_key] = {
                     "username": request['username'],
-                    "login_time": datetime.datetime.now()
+                    "login_time": now,
+                    "last_seen": now
                 }
-                log(f"Usuário '{request['username']}' logado em {peer_key}", "SUCCESS")
-                response = {"status": True, "message": "Login realizado."}
-            else:
-                log(f"Falha no login para '{request['username']}'", "WARNING")
-                response = {"status": False, "message": "Credenciais inválidas."}
-        
-        elif action == "logout":
-            if peer_key in active_peers:
-                # Calcula o tempo de atividade da sessão
-                session_duration = datetime.datetime.now() - active_peers[peer_key]['login_time']
-                uptime_seconds = int(session_duration.total_seconds())
-
-                # Atualiza as estatísticas de pontuação
-                user_stats = peer_scores.get(username, {})
-                user_stats["uptime_seconds"] = user_stats.get("uptime_seconds", 0) + uptime_seconds
-                user_stats["score"] = calculate_score(user_stats)
-                peer_scores[username] = user_stats
-
-                save_state()
-
-                # Remove o peer dos ativos e de todos os arquivos que ele sediava
-                del active_peers[peer_key]
-                for file_meta in files_db.values():
-                    if peer_key in file_meta['peers']:
-                        file_meta['peers'].remove(peer_key)
-                
-                log(f"Usuário '{username}' {peer_key} deslogado. Uptime da sessão: {uptime_seconds}s.", "INFO")
-                response = {"status": True, "message": "Logout realizado com sucesso."}
-            else:
-                response = {"status": False, "message": "Peer não estava logado."}
-
-        elif action == "announce":
-            if peer_key not in active_peers:
-                response = {"status": False, "message": "Ação não permitida. Faça login primeiro."}
-            else:
-                files = request.get("files", [])
+                leases.renew(peer_key)
+                mark_changed("sessions", peer_key)
+                mark_changed("scores", request['username'])
+            log(f"Usuário '{request['username']}' logado em {peer_key}", "SUCCESS")
+            response = {"status": True, "message": "Login realizado.", "lease_seconds": LEASE_SECONDS,
+                        "boot_id": BOOT_ID, "hash_algos": list(dict.fromkeys([HASH_ALGO, DEFAULT_HASH_ALGO]))}
+        else:
+            log(f"Falha no login para '{request['username']}'", "WARNING")
+            response = {"status": False, "message": "Credenciais inválidas."}
+    
+    elif action == "logout":
+        uptime_seconds = end_session(peer_key)
+        if uptime_seconds is not None:
+            log(f"Usuário '{username}' {peer_key} deslogado. Uptime da sessão: {uptime_seconds}s.", "INFO")
+            response = {"status": True, "message": "Logout realizado com sucesso."}
+        else:
+            response = {"status": False, "message": "Peer não estava logado."}
+
+    elif action == "heartbeat":
+        # Renova o lease de presença; não toca em files_db nem em disco
+        with sessions_lock:
+            info = active_peers.get(peer_key)
+            if info:
+                info["last_seen"] = datetime.datetime.now()
+                leases.renew(peer_key)
+                if isinstance(request.get("load"), dict):
+                    info["load"] = {**sanitize_load(request["load"], UPLOAD_SLOTS), "at": time.time()}
+                    # Carga nova vai para as réplicas, mas não justifica regravar o catálogo
+                    mark_changed("sessions", peer_key, persist=False)
+        if info:
+            response = {"status": True, "lease_seconds": LEASE_SECONDS, "boot_id": BOOT_ID}
+        else:
+            response = {"status": False, "expired": True, "message": "Sessão expirada. Faça login novamente."}
+
+    elif action == "announce":
+        if peer_key not in active_peers:
+            response = {"status": False, "message": "Ação não permitida. Faça login primeiro."}
+        else:
+            files = request.get("files", [])
+            rejected = [f['name'] for f in files if f.get("hash_algo", DEFAULT_HASH_ALGO) not in HASH_ALGORITHMS]
+            conflicts = []  # nomes já listados com outro conteúdo, servido por outros peers
+            with sessions_lock:
                 for f in files:
-                    entry = files_db.setdefault(f['name'], {
-                        "size": f['size'], "hash": f['hash'], "chunk_hashes": f.get("chunk_hashes", []), "peers": []
-                    })
+                    algo = f.get("hash_algo", DEFAULT_HASH_ALGO)
+                    if algo not in HASH_ALGORITHMS:
+                        continue
+                    entry = files_db.get(f['name'])
+                    changed = False
+                    if entry and (entry['hash'] != f['hash'] or entry.get('hash_algo', DEFAULT_HASH_ALGO) != algo):
+                        if any(p != peer_key for p in entry['peers']):
+                            # Outros peers servem a versão listada: o nome continua com ela. Se este
+                            # peer a tinha, alterou a própria cópia e deixa de servir a versão listada
+                            conflicts.append(f['name'])
+                            drop_peer_file(peer_key, f['name'])
+                            continue
+                        # Só este peer tinha o arquivo: a versão nova substitui a anterior
+                        peer_files.get(peer_key, set()).discard(f['name'])
+                        chunk_index.remove(f['name'], entry['chunk_hashes'])
+                        entry = None
+                    if entry is None:
+                        entry = files_db[f['name']] = {
+                            "size": f['size'], "hash_algo": algo, "hash": f['hash'],
+                            "chunk_hashes": f.get("chunk_hashes", []), "peers": []
+                        }
+                        chunk_index.add(f['name'], entry['chunk_hashes'])
+                        changed = True
                     if peer_key not in entry['peers']:
                         entry['peers'].append(peer_key)
-                        log(f"Peer {peer_key} anunciou arquivo '{f['name']}'", "INFO")
-                response = {"status": True, "message": "Arquivos registrados."}
-
-        elif action == "list_files":
-            serializable_db = {}
-            for fname, meta in files_db.items():
-                peers_with_scores = []
-                for ip_peer, port_peer in meta["peers"]:
-                    # Encontra o username do peer para buscar sua pontuação
-                    peer_info = active_peers.get((ip_peer, port_peer))
+                        peer_files.setdefault(peer_key, set()).add(f['name'])
+                        changed = True
+                    if changed:
+                        mark_changed("files", f['name'])
+                        if log_enabled("NETWORK"):
+                            log(f"Peer {peer_key} anunciou arquivo '{f['name']}'", "NETWORK")
+            response = {"status": True, "message": "Arquivos registrados."}
+            if rejected:
+                log(f"Peer {peer_key} anunciou {len(rejected)} arquivo(s) com algoritmo de hash desconhecido", "WARNING")
+                response["rejected"] = rejected
+            if conflicts:
+                log(f"Peer {peer_key} anunciou {len(conflicts)} arquivo(s) com nome já usado por outro conteúdo",
+                    "WARNING")
+                response["conflicts"] = conflicts
+            if rejected or conflicts:
+                response["message"] = ("Arquivos registrados, exceto os de algoritmo de hash desconhecido ('rejected') "
+                                       "e os de nome já usado por outro conteúdo ('conflicts').")
+
+    elif action == "unannounce":
+        # Anúncio incremental: o peer deixou de compartilhar estes arquivos
+        if peer_key not in active_peers:
+            response = {"status": False, "message": "Ação não permitida. Faça login primeiro."}
+        else:
+            with sessions_lock:
+                for fname in request.get("files", []):
+                    drop_peer_file(peer_key, fname)
+            response = {"status": True, "message": "Arquivos removidos."}
+
+    elif action == "reconcile":
+        # Após um reinício, o peer confere por um resumo se o catálogo restaurado
+        # ainda tem a sua versão dos arquivos, sem reenviar os hashes de chunk
+        with sessions_lock:
+            known = peer_key in active_peers
+            held = {fname: files_db[fname]["hash"] for fname in peer_files.get(peer_key, ()) if fname in files_db}
+        if not known:
+            response = {"status": False, "expired": True, "message": "Sessão expirada. Faça login novamente."}
+        else:
+            in_sync = catalog_digest(held) == request.get("digest")
+            response = {"status": True, "in_sync": in_sync, "boot_id": BOOT_ID}
+            if not in_sync:
+                response["files"] = held
+
+    elif action == "list_files":
+        response = {"files": serialize_files(list(files_db), request.get("max_peers", TOP_K))}
+
+    elif action == "search":
+        # Busca por trecho do nome (sem diferenciar maiusculas)
+        query = request.get("query", "").lower()
+        matches = [fname for fname in list(files_db) if query in fname.lower()]
+        response = {"status": True, "files": serialize_files(matches, request.get("max_peers", TOP_K))}
+
+    elif action == "locate_chunks":
+        # Quem tem estes chunks em qualquer arquivo (conteúdo igual com outro nome)
+        exclude = request.get("exclude_file")
+        max_peers = request.get("max_peers", TOP_K)
+        now = time.time()
+        holders = {}
+        for chunk_hash in request.get("hashes", [])[:MAX_LOCATE_HASHES]:
+            candidates = {}
+            for fname in chunk_index.files_with(chunk_hash) - {exclude}:
+                meta = files_db.get(fname)
+                for peer_key in meta["peers"] if meta else ():
+                    peer_info = active_peers.get(peer_key)
                     if peer_info:
-                        uname = peer_info.get("username")
-                        score = peer_scores.get(uname, {}).get("score", 0)
-                        peers_with_scores.append({"peer": f"{ip_peer}:{port_peer}", "score": score})
+                        candidates[peer_key] = (f"{peer_key[0]}:{peer_key[1]}",
+                                                get_score(peer_info.get("username")), peer_info.get("load"))
+            if candidates:
+                holders[chunk_hash] = [c[0] for c in select_peers(list(candidates.values()), max_peers, now=now)]
+        response = {"status": True, "holders": holders}
 
-                # Ordena os peers pela pontuação (maior primeiro)
-                peers_with_scores.sort(key=lambda x: x['score'], reverse=True)
+    elif action == "verify_credentials":
+        # Usado pelos shards secundarios para validar logins no primario
+        ok = authenticate_user(request.get('username'), request.get('password'))
+        response = {"status": ok}
 
-                serializable_db[fname] = {
-                    "size": meta["size"], "hash": meta["hash"], "chunk_hashes": meta["chunk_hashes"],
-                    "peers": peers_with_scores
-                }
-            response = {"files": serializable_db}
-
-        elif action == "report_upload":
-            # Peer reporta que fez um upload para ganhar pontos
-            if username and username in peer_scores:
-                peer_scores[username]["uploads"] += 1
-                peer_scores[username]["score"] = calculate_score(peer_scores[username])
-                log(f"Ponto de upload registrado para '{username}'. Nova pontuação: {peer_scores[username]['score']}", "SUCCESS")
-                save_state()
-                response = {"status": True}
-            else:
-                response = {"status": False, "message": "Usuário não encontrado para premiar."}
-
-        elif action == "get_scores":
-            # Retorna o ranking de todos os peers
-            sorted_scores = sorted(peer_scores.items(), key=lambda item: item[1]['score'], reverse=True)
-            response = {"status": True, "scores": sorted_scores}
-
-        elif action == "get_peer_score":
-            target = request.get("target_username")
-            sc = peer_scores.get(target, {}).get("score", 0)
-            response = {"status": True, "score": sc}
-
-        elif action == "get_active_peers":
-            # Retorna peers ativos para o chat
-            peer_list = [{"username": v['username'], "address": f"{k[0]}:{k[1]}"}
-                         for k, v in active_peers.items() if k != peer_key]
-            response = {"status": True, "peers": peer_list}
-
-        elif action == "create_room":
-            room = request.get("room_name")
-            if room in chat_rooms:
-                response = {"status": False, "message": "Sala ja existe"}
-            else:
-                chat_rooms[room] = {
-                    "moderator": username,
-                    "address": f"{ip}:{peer_listening_port}",
-                    "members": []
-                }
-                log(f"Sala '{room}' criada pelo moderador {username}", "INFO")
-                save_state()
-                response = {"status": True}
-
-        elif action == "list_rooms":
-            response = {"status": True, "rooms": chat_rooms}
-
-        elif action == "delete_room":
-            room = request.get("room_name")
-            info = chat_rooms.get(room)
-            if info and info.get("moderator") == username:
-                del chat_rooms[room]
-                save_state()
-                response = {"status": True}
-            else:
-                response = {"status": False, "message": "Sala nao encontrada ou permissao negada"}
-
-        elif action == "room_member_update":
-            room = request.get("room_name")
-            member = request.get("username")
-            event = request.get("event")
-            info = chat_rooms.get(room)
-            if info:
-                members = info.setdefault("members", [])
-                if event == "join" and member not in members:
-                    members.append(member)
-                    log(f"{member} entrou na sala '{room}'", "INFO")
-                if event == "leave" and member in members:
-                    members.remove(member)
-                    log(f"{member} saiu da sala '{room}'", "INFO")
-                save_state()
-                response = {"status": True}
-            else:
-                response = {"status": False, "message": "Sala inexistente"}
+    elif action == "report_upload":
+        # Peer reporta que fez um upload para ganhar pontos
+        # Pontos proporcionais aos bytes enviados (peers antigos não mandam "bytes": vale um chunk).
+        # Um relato vale no máximo um chunk: cada upload servido gera o seu
+        try:
+            nbytes = min(int(request.get("bytes", CHUNK_SIZE)), CHUNK_SIZE)
+        except (TypeError, ValueError, OverflowError):
+            nbytes = 0
+        if nbytes <= 0:
+            response = {"status": False, "message": "Quantidade de bytes inválida."}
+        elif username and username in peer_scores:
+            with sessions_lock:
+                user_stats = peer_scores[username]
+                user_stats["uploads"] += 1
+                user_stats["upload_bytes"] = user_stats.get("upload_bytes", 0) + nbytes
+                score_engine.add_upload(user_stats, nbytes)
+                mark_changed("scores", username)
+            if log_enabled("NETWORK"):
+                log(f"Upload de {nbytes} B registrado para '{username}'. "
+                    f"Nova pontuação: {score_engine.value(user_stats):.2f}", "NETWORK")
+            save_state()
+            response = {"status": True}
+        else:
+            response = {"status": False, "message": "Usuário não encontrado para premiar."}
+
+    elif action == "get_scores":
+        # Retorna o ranking de todos os peers
+        ranked = current_scores()
+        sorted_scores = sorted(((u, {**stats, "score": round(ranked.get(u, 0), 2)}) for u, stats in list(peer_scores.items())),
+                               key=lambda item: item[1]['score'], reverse=True)
+        response = {"status": True, "scores": sorted_scores}
+
+    elif action == "get_peer_score":
+        target = request.get("target_username")
+        sc = round(current_scores().get(target, 0), 2)
+        response = {"status": True, "score": sc}
 
+    elif action == "get_active_peers":
+        # Retorna peers ativos para o chat
+        peer_list = [{"username": v['username'], "address": f"{k[0]}:{k[1]}"}
+                     for k, v in active_peers.items() if k != peer_key]
+        response = {"status": True, "peers": peer_list}
+
+    elif action == "create_room":
+        room = request.get("room_name")
+        if room in chat_rooms:
+            response = {"status": False, "message": "Sala ja existe"}
         else:
-            log(f"Ação desconhecida: {action}", "WARNING")
-            response = {"status": False, "message": "Ação desconhecida"}
+            chat_rooms[room] = {
+                "moderator": username,
+                "address": f"{ip}:{peer_listening_port}",
+                "members": []
+            }
+            mark_changed("rooms", room)
+            log(f"Sala '{room}' criada pelo moderador {username}", "INFO")
+            save_state()
+            response = {"status": True}
+
+    elif action == "list_rooms":
+        response = {"status": True, "rooms": chat_rooms}
 
+    elif action == "delete_room":
+        room = request.get("room_name")
+        info = chat_rooms.get(room)
+        if info and info.get("moderator") == username:
+            del chat_rooms[room]
+            mark_changed("rooms", room)
+            save_state()
+            response = {"status": True}
+        else:
+            response = {"status": False, "message": "Sala nao encontrada ou permissao negada"}
+
+    elif action == "room_member_update":
+        room = request.get("room_name")
+        member = request.get("username")
+        event = request.get("event")
+        info = chat_rooms.get(room)
+        if info:
+            members = info.setdefault("members", [])
+            if event == "join" and member not in members:
+                members.append(member)
+                log(f"{member} entrou na sala '{room}'", "INFO")
+            if event == "leave" and member in members:
+                members.remove(member)
+                log(f"{member} saiu da sala '{room}'", "INFO")
+            mark_changed("rooms", room)
+            save_state()
+            response = {"status": True}
+        else:
+            response = {"status": False, "message": "Sala inexistente"}
+
+    elif action == "profile":
+        # Grava arquivos no disco do tracker: só a partir da própria máquina
+        if ip in ("127.0.0.1", "::1"):
+            response = profiling.handle_command(request, label="tracker")
+        else:
+            response = {"status": False, "message": "Perfil só pode ser controlado a partir do host do tracker."}
+
+    elif action == "get_metrics":
+        if request.get("format") == "text":
+            response = {"status": True, "text": render_snapshot(metrics_snapshot())}
+        else:
+            response = {"status": True, "metrics": metrics_snapshot()}
+
+    else:
+        log(f"Ação desconhecida: {action}", "WARNING")
+        response = {"status": False, "message": "Ação desconhecida"}
+    return response
+
+
+# --- CONTROLE DE ADMISSÃO ---
+
+# Limites por cliente e classe de ação (--rate-limits; ver admission.py)
+rate_limiter = RateLimiter()
+# Conexões são atendidas por MAX_HANDLERS threads fixas (--max-handlers; 0 = uma
+# thread por conexão). Com a fila cheia, a conexão é recusada na hora com "retry_after".
+REQUEST_READ_TIMEOUT = 5
+pending_connections = None
+
+
+def admission_check(request, addr):
+    """None se a requisição pode seguir; senão a resposta de recusa para o cliente."""
+    if is_tracker_request(addr, request, SHARDS):
+        return None
+    retry_after = rate_limiter.check(client_key(addr, request, active_peers), request.get("action"))
+    if not retry_after:
+        return None
+    metrics.reject("rate_limit")
+    return {"status": False, "message": "Limite de requisições excedido; tente novamente mais tarde.",
+            "retry_after": round(retry_after, 3)}
+
+
+def _refuse_overloaded(conn):
+    """Fila de conexões cheia: responde na própria thread de accept, sem ocupar um handler."""
+    metrics.reject("overload")
+    try:
+        # Descarta o pedido que já chegou: fechar com dados não lidos faria o cliente receber RST
+        conn.setblocking(False)
+        try:
+            conn.recv(65536)
+        except OSError:
+            pass
+        conn.settimeout(1)
+        conn.sendall(json.dumps({"status": False, "message": "Tracker sobrecarregado; tente novamente mais tarde.",
+                                 "retry_after": OVERLOAD_RETRY_AFTER}).encode())
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def _handler_loop(handler):
+    while True:
+        conn, addr = pending_connections.get()
+        conn.settimeout(REQUEST_READ_TIMEOUT)
+        handler(conn, addr)
+
+
+def start_handlers(handler):
+    """Cria o pool fixo de handlers (chamado em cada processo que aceita conexões)."""
+    global pending_connections
+    if not MAX_HANDLERS:
+        return
+    pending_connections = Queue(maxsize=ADMISSION_QUEUE)
+    for _ in range(MAX_HANDLERS):
+        threading.Thread(target=_handler_loop, args=(handler,), daemon=True).start()
+
+
+def dispatch(conn, addr, handler):
+    """Entrega uma conexão aceita ao pool de handlers, ou a recusa se a fila estiver cheia."""
+    if pending_connections is None:
+        threading.Thread(target=handler, args=(conn, addr), daemon=True).start()
+        return
+    try:
+        pending_connections.put_nowait((conn, addr))
+    except Full:
+        _refuse_overloaded(conn)
+
+
+def handle_request(conn, addr, internal=False):
+    """Processa uma requisição de um peer."""
+    try:
+        with profiling.span("tracker.recv"):
+            request = recv_request(conn)
+        if request is None:
+            conn.close()
+            return
+        if not internal:
+            refusal = admission_check(request, addr)
+            if refusal:
+                conn.sendall(json.dumps(refusal).encode())
+                conn.close()
+                return
+        if internal:
+            # Requisição repassada por um worker (modo multiprocesso)
+            if request.get("action") == "replica_snapshot":
+                response = replica_snapshot(request.get("since", -1))
+                conn.sendall(json.dumps(response).encode())
+                conn.close()
+                return
+            if request.get("action") == "worker_metrics":
+                worker_metrics[request.get("worker")] = request.get("metrics")
+                conn.sendall(json.dumps({"status": True}).encode())
+                conn.close()
+                return
+            if "_client_addr" in request:
+                addr = tuple(request.pop("_client_addr"))
+        label = metrics.begin(request.get("action"))
+        started = time.perf_counter()
+        ok = False
+        try:
+            with profiling.span(f"tracker.{request.get('action')}"):
+                response = process_request(request, addr)
+            ok = True
+        finally:
+            metrics.end(label, time.perf_counter() - started, error=not ok)
     except Exception as e:
         log(f"Erro ao processar requisição de {addr}: {e}", "ERROR")
         response = {"status": False, "error": str(e)}
 
-    conn.sendall(json.dumps(response).encode())
+    with profiling.span("tracker.send"):
+        conn.sendall(json.dumps(response).encode())
     conn.close()
 
 def start_tracker():
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Reinício logo após encerrar: a porta ainda tem conexões em TIME_WAIT
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server.bind((HOST, PORT))
-    server.listen(15)
+    server.listen(ADMISSION_QUEUE)
     log(f"Tracker (TCP) iniciado em {HOST}:{PORT}", "INFO")
+    start_handlers(handle_request)
 
     try:
         while True:
             conn, addr = server.accept()
-            thread = threading.Thread(target=handle_request, args=(conn, addr), daemon=True)
-            thread.start()
+            dispatch(conn, addr, handle_request)
     except KeyboardInterrupt:
         print("\n[*] Encerrando o tracker...")
     finally:
         server.close()
+        save_catalog()
+
+# --- MODO MULTIPROCESSO (SO_REUSEPORT) ---
+
+# Ações somente leitura: respondidas pela réplica local de cada worker.
+# As demais são repassadas à autoridade (processo pai), única que altera o estado.
+READ_ACTIONS = {"list_files", "search", "locate_chunks", "get_peer_score", "get_scores", "get_active_peers", "list_rooms"}
+# "profile" vale para o processo que recebeu o pedido: cada worker tem o seu perfil
+LOCAL_ACTIONS = READ_ACTIONS | {"profile"}
+# Ações repassadas depois das quais o worker não sincroniza na hora: não alteram o
+# estado replicado, ou só mudam pontuações e carga, que a sincronização periódica entrega
+# ("reconcile" depende de peer_files, que as réplicas não mantêm)
+LAZY_SYNC_ACTIONS = LOCAL_ACTIONS | {"heartbeat", "verify_credentials", "get_metrics", "reconcile",
+                                     "report_upload", "register"}
+REPLICA_SYNC_INTERVAL = 0.2  # segundos entre verificações de versão nos workers
+
+STATE_VERSION = 0  # incrementado a cada mudança no estado replicado
+# Última chave alterada de cada estrutura replicada: réplicas recebem só o que mudou
+REPLICATED = ("files", "sessions", "scores", "rooms")
+_changes = {kind: ChangeLog() for kind in REPLICATED}
+# Versão da última mudança que entra no snapshot do catálogo (arquivos e sessões)
+_catalog_version = 0
+_version_lock = threading.Lock()
+_replica_lock = threading.Lock()
+AUTHORITY_ADDR = None  # endereço interno (127.0.0.1) da autoridade, conhecido pelos workers
+
+
+def mark_changed(kind, key, persist=True):
+    """Registra que a chave 'key' da estrutura 'kind' mudou (chamar depois de alterá-la)."""
+    global STATE_VERSION, _catalog_version
+    with _version_lock:
+        STATE_VERSION += 1
+        _changes[kind].mark(key, STATE_VERSION)
+        if persist and kind in ("files", "sessions"):
+            _catalog_version = STATE_VERSION
+
+
+def _replica_value(kind, key):
+    """Valor atual de uma chave no formato enviado às réplicas (None se foi removida)."""
+    if kind == "files":
+        meta = files_db.get(key)
+        return meta and {**meta, "peers": [list(p) for p in meta["peers"]]}
+    if kind == "sessions":
+        info = active_peers.get(key)
+        return info and [info["username"], info["login_time"].timestamp(), info.get("load")]
+    if kind == "scores":
+        stats = peer_scores.get(key)
+        return stats and dict(stats)
+    room = chat_rooms.get(key)
+    return room and {**room, "members": list(room.get("members", []))}
+
+
+def _replica_table(kind):
+    return {"files": files_db, "sessions": active_peers, "scores": peer_scores, "rooms": chat_rooms}[kind]
+
+
+def replica_snapshot(since):
+    """Mudanças no estado replicável (catálogo, sessões, pontuações, salas) desde a versão 'since'.
+
+    Cada estrutura vai como {"full": bool, "items": [[chave, valor ou None], ...]}:
+    só as chaves alteradas, ou todas se o histórico de mudanças não alcança 'since'.
+    """
+    with _version_lock:
+        version = STATE_VERSION
+        if since == version:
+            return {"status": True, "version": version, "unchanged": True}
+        changed = {kind: log.since(since) for kind, log in _changes.items()}
+    response = {"status": True, "version": version}
+    # Copiado sob o lock das sessões: as entradas não mudam no meio da cópia
+    with sessions_lock:
+        for kind, keys in changed.items():
+            full = keys is None
+            if full:
+                keys = list(_replica_table(kind))
+            if keys:
+                # Chaves de sessão são tuplas (ip, porta): viajam como lista
+                response[kind] = {"full": full,
+                                  "items": [[list(k) if kind == "sessions" else k, _replica_value(kind, k)]
+                                            for k in keys]}
+    return response
+
+
+def _apply_replica_part(kind, part):
+    """Aplica na réplica local as mudanças de uma estrutura recebidas da autoridade."""
+    global files_db, chunk_index, active_peers, peer_scores, chat_rooms
+    items = part["items"]
+    if kind == "files":
+        for _, meta in items:
+            if meta:
+                meta["peers"] = [tuple(p) for p in meta["peers"]]
+    elif kind == "sessions":
+        items = [(tuple(key), value and {"username": value[0], "login_time": datetime.datetime.fromtimestamp(value[1]),
+                                         "load": value[2]})
+                 for key, value in items]
+    if part["full"]:
+        # Troca a referência de uma vez: leituras em andamento veem o estado antigo ou o novo
+        table = {key: value for key, value in items if value is not None}
+        if kind == "files":
+            files_db, chunk_index = table, ChunkIndex.build(table)
+        elif kind == "sessions":
+            active_peers = table
+        elif kind == "scores":
+            peer_scores = table
+        else:
+            chat_rooms = table
+        return
+    table = _replica_table(kind)
+    for key, value in items:
+        if kind == "files":
+            old = table.get(key)
+            if old:
+                chunk_index.remove(key, old["chunk_hashes"])
+            if value:
+                chunk_index.add(key, value["chunk_hashes"])
+        if value is None:
+            table.pop(key, None)
+        else:
+            table[key] = value
+
+
+def sync_replica():
+    """Atualiza a réplica local do worker com as mudanças da autoridade desde a sua versão."""
+    global STATE_VERSION
+    with _replica_lock:
+        res = send_message(*AUTHORITY_ADDR, "replica_snapshot", {"since": STATE_VERSION})
+        if not res.get("status") or res.get("unchanged"):
+            return
+        for kind in REPLICATED:
+            if kind in res:
+                _apply_replica_part(kind, res[kind])
+        STATE_VERSION = res["version"]
+
+
+def _replica_sync_loop():
+    while True:
+        time.sleep(REPLICA_SYNC_INTERVAL)
+        try:
+            sync_replica()
+        except Exception as e:
+            log(f"Falha ao sincronizar réplica: {e}", "ERROR")
+
+
+def _worker_metrics_loop(index):
+    """Envia à autoridade os contadores deste worker; ela os soma em get_metrics e /metrics."""
+    while True:
+        time.sleep(WORKER_METRICS_INTERVAL)
+        try:
+            send_message(*AUTHORITY_ADDR, "worker_metrics", {"worker": index, "metrics": metrics.snapshot()})
+        except Exception as e:
+            log(f"Falha ao enviar métricas à autoridade: {e}", "ERROR")
+
+
+def handle_worker_request(conn, addr):
+    """Worker: responde leituras pela réplica e repassa escritas à autoridade."""
+    try:
+        with profiling.span("tracker.recv"):
+            request = recv_request(conn)
+        if request is None:
+            conn.close()
+            return
+        action = request.get("action")
+        refusal = admission_check(request, addr)
+        if refusal:
+            response = refusal
+        elif action in LOCAL_ACTIONS:
+            label = metrics.begin(action)
+            started = time.perf_counter()
+            ok = False
+            try:
+                with profiling.span(f"tracker.{action}"):
+                    response = process_request(request, addr)
+                ok = True
+            finally:
+                metrics.end(label, time.perf_counter() - started, error=not ok)
+        else:
+            request.pop("action", None)
+            request["_client_addr"] = list(addr)
+            with profiling.span(f"tracker.forward.{action}"):
+                response = send_message(*AUTHORITY_ADDR, action, request)
+            # Garante que o mesmo cliente enxergue a própria escrita na próxima leitura
+            if action not in LAZY_SYNC_ACTIONS:
+                sync_replica()
+    except Exception as e:
+        log(f"Erro ao processar requisição de {addr}: {e}", "ERROR")
+        response = {"status": False, "error": str(e)}
+
+    conn.sendall(json.dumps(response).encode())
+    conn.close()
+
+
+def run_worker(index):
+    """Processo filho: aceita conexões na porta pública compartilhada via SO_REUSEPORT."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server.bind((HOST, PORT))
+    server.listen(ADMISSION_QUEUE)
+    threading.Thread(target=_replica_sync_loop, daemon=True).start()
+    threading.Thread(target=_worker_metrics_loop, args=(index,), daemon=True).start()
+    start_handlers(handle_worker_request)
+    log(f"Worker {index} (pid {os.getpid()}) escutando em {HOST}:{PORT}", "INFO")
+    try:
+        while True:
+            conn, addr = server.accept()
+            dispatch(conn, addr, handle_worker_request)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def start_multiprocess_tracker(num_workers):
+    """Autoridade única para escritas + N workers que dividem a porta pública."""
+    global AUTHORITY_ADDR
+    if not hasattr(socket, "SO_REUSEPORT") or not hasattr(os, "fork"):
+        log("SO_REUSEPORT/fork indisponível nesta plataforma; usando um único processo.", "WARNING")
+        start_lease_reaper()
+        start_catalog_snapshots()
+        start_tracker()
+        return
+
+    authority = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    authority.bind(("127.0.0.1", 0))
+    authority.listen(128)
+    AUTHORITY_ADDR = authority.getsockname()
+    # SIGTERM encerra a autoridade e os workers da mesma forma que Ctrl+C
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+
+    children = []
+    for i in range(num_workers):
+        pid = os.fork()
+        if pid == 0:
+            authority.close()
+            try:
+                run_worker(i)
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    # Só a autoridade expira leases e grava snapshots; iniciados após o fork para os workers não herdarem as threads
+    start_lease_reaper()
+    start_catalog_snapshots()
+    log(f"Tracker multiprocesso: {num_workers} workers em {HOST}:{PORT}, autoridade em {AUTHORITY_ADDR}", "INFO")
+    try:
+        while True:
+            conn, addr = authority.accept()
+            thread = threading.Thread(target=handle_request, args=(conn, addr, True), daemon=True)
+            thread.start()
+    except KeyboardInterrupt:
+        print("\n[*] Encerrando o tracker...")
+    finally:
+        authority.close()
+        save_catalog()
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
 
 if __name__ == "__main__":
     import argparse
@@ -287,9 +1110,56 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--host', default=HOST, help='Endereco para o tracker')
     parser.add_argument('--port', type=int, default=PORT, help='Porta do tracker')
+    parser.add_argument('--shards', default='', help='Lista ip:porta,ip:porta,... de todos os shards (modo cluster)')
+    parser.add_argument('--shard-index', type=int, default=0, help='Posicao deste tracker na lista de shards')
+    parser.add_argument('--state-file', default=STATE_FILE, help='Arquivo de estado persistente')
+    parser.add_argument('--catalog-file', default=None,
+                        help='Snapshot do catálogo para reinício a quente (padrão: ao lado do arquivo de estado; "" desliga)')
+    parser.add_argument('--workers', type=int, default=0, help='Processos worker compartilhando a porta (SO_REUSEPORT)')
+    parser.add_argument('--lease-seconds', type=int, default=LEASE_SECONDS, help='Segundos sem heartbeat ate expirar um peer')
+    parser.add_argument('--score-half-life', type=float, default=SCORE_HALF_LIFE,
+                        help='Segundos para uma pontuação parada cair pela metade')
+    parser.add_argument('--hash-algo', default=HASH_ALGO, choices=sorted(HASH_ALGORITHMS),
+                        help='Algoritmo de hash oferecido aos peers para arquivos e chunks')
+    parser.add_argument('--max-handlers', type=int, default=MAX_HANDLERS,
+                        help='Threads que atendem requisicoes (0 = uma thread por conexao, sem limite)')
+    parser.add_argument('--rate-limits', default=','.join(f"{c}={r:g}:{b:g}" for c, (r, b) in DEFAULT_LIMITS.items()),
+                        help='Limites por cliente: classe=req_por_s:rajada,... (catalog, read, write, session) ou "off"; '
+                             'com --workers, divididos entre os workers')
+    parser.add_argument('--metrics-port', type=int, default=0, help='Porta HTTP para expor /metrics em texto (0 = desligado)')
+    parser.add_argument('--log-level', default=None, help='Nivel minimo de log (DEBUG, NETWORK, INFO, WARNING, ERROR)')
     args = parser.parse_args()
 
+    # Terminal fora do caminho das requisicoes: o log e escrito por uma thread propria
+    logger.configure(level=args.log_level, async_writes=os.environ.get("LOG_ASYNC", "1") == "1")
+    STATE_FILE = args.state_file
+    SHARDS = [s.strip() for s in args.shards.split(',') if s.strip()]
+    SHARD_INDEX = args.shard_index
+    if SHARDS:
+        # O endereco de escuta passa a ser o deste shard na lista
+        shard_host, shard_port = SHARDS[SHARD_INDEX].split(':')
+        args.host, args.port = shard_host, int(shard_port)
+        log(f"Modo cluster: shard {SHARD_INDEX + 1} de {len(SHARDS)}", "INFO")
+
     set_tracker_address(args.host, args.port)
     HOST, PORT = args.host, args.port
-    load_state()
-    start_tracker()
+    LEASE_SECONDS = args.lease_seconds
+    leases.duration = LEASE_SECONDS
+    score_engine.half_life = args.score_half_life
+    HASH_ALGO = args.hash_algo
+    MAX_HANDLERS = max(0, args.max_handlers)
+    rate_limiter.limits = parse_limits(args.rate_limits, args.workers)
+    CATALOG_FILE = default_catalog_file() if args.catalog_file is None else args.catalog_file
+    if is_primary():
+        load_state()
+    load_catalog()
+    if args.metrics_port:
+        start_metrics_http(args.metrics_port)
+    if args.workers > 0:
+        start_multiprocess_tracker(args.workers)
+    else:
+        # SIGTERM também grava o snapshot do catálogo antes de sair
+        signal.signal(signal.SIGTERM, _raise_interrupt)
+        start_lease_reaper()
+        start_catalog_snapshots()
+        start_tracker()
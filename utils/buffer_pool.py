@@ -0,0 +1,41 @@
+import threading
+from contextlib import contextmanager
+
+
+class BufferPool:
+    """Conjunto limitado de bytearrays reutilizaveis de tamanho fixo.
+
+    Os buffers sao alocados sob demanda ate 'count'; depois disso acquire()
+    espera um ser devolvido, entao a memoria usada nunca passa de
+    count * buffer_size.
+    """
+
+    def __init__(self, buffer_size, count):
+        self.buffer_size = buffer_size
+        self.count = count
+        self.allocated = 0
+        self._free = []
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while not self._free and self.allocated >= self.count:
+                self._cond.wait()
+            if self._free:
+                return self._free.pop()
+            self.allocated += 1
+        return bytearray(self.buffer_size)
+
+    def release(self, buf):
+        with self._cond:
+            self._free.append(buf)
+            self._cond.notify()
+
+    @contextmanager
+    def buffer(self):
+        """Empresta um buffer durante o bloco 'with' e o devolve ao final."""
+        buf = self.acquire()
+        try:
+            yield buf
+        finally:
+            self.release(buf)
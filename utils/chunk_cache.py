@@ -0,0 +1,78 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class ChunkCache:
+    """Cache LRU de chunks limitado por bytes, compartilhado entre uploads."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # formato: { path: (mtime_ns, size, memoryview) }
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Retorna o chunk como memoryview somente leitura (ou None se nao existir)."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.invalidate(path)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            # O arquivo pode ter sido regravado por um novo anuncio
+            if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        with open(path, 'rb') as f:
+            data = memoryview(f.read()).toreadonly()
+        self._store(path, st.st_mtime_ns, st.st_size, data)
+        return data
+
+    def _store(self, path, mtime_ns, size, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old:
+                self.current_bytes -= len(old[2])
+            self._entries[path] = (mtime_ns, size, data)
+            self.current_bytes += len(data)
+            while self.current_bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, path):
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old:
+                self.current_bytes -= len(old[2])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Retorna contadores de uso do cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
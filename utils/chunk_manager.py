@@ -1,21 +1,29 @@
 import os
-import hashlib
+
+from utils.hashing import new_hasher, DEFAULT_HASH_ALGO
 
 # Define um tamanho de chunk padrao (1MB). Pode ser ajustado.
 CHUNK_SIZE = 1024 * 1024
 
 
-def split_file_into_chunks(file_path):
-    """Divide um arquivo em chunks e retorna seu hash e dos chunks."""
+def split_file_into_chunks(file_path, store=None, algo=DEFAULT_HASH_ALGO):
+    """Divide um arquivo em chunks e retorna seu hash e dos chunks.
+
+    Com 'store' (utils/chunk_store.py) os chunks vao para o repositorio
+    enderecado por hash, e os que ja estao la nao sao regravados; sem ele,
+    para a pasta <nome>_chunks ao lado do arquivo. 'algo' e um dos
+    algoritmos de utils/hashing.py.
+    """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Arquivo nao encontrado: {file_path}")
 
-    file_name = os.path.basename(file_path)
-    chunks_dir = os.path.join(os.path.dirname(file_path), f"{file_name}_chunks")
-    os.makedirs(chunks_dir, exist_ok=True)
+    if store is None:
+        file_name = os.path.basename(file_path)
+        chunks_dir = os.path.join(os.path.dirname(file_path), f"{file_name}_chunks")
+        os.makedirs(chunks_dir, exist_ok=True)
 
     chunk_hashes = []
-    file_hash_obj = hashlib.sha256()
+    file_hash_obj = new_hasher(algo)
 
     with open(file_path, 'rb') as f:
         chunk_index = 0
@@ -23,12 +31,15 @@ def split_file_into_chunks(file_path):
             chunk_data = f.read(CHUNK_SIZE)
             if not chunk_data:
                 break
-            chunk_hash = hashlib.sha256(chunk_data).hexdigest()
+            chunk_hash = new_hasher(algo, chunk_data).hexdigest()
             chunk_hashes.append(chunk_hash)
             file_hash_obj.update(chunk_data)
-            chunk_file_path = os.path.join(chunks_dir, f"chunk_{chunk_index}")
-            with open(chunk_file_path, 'wb') as chunk_f:
-                chunk_f.write(chunk_data)
+            if store is not None:
+                store.put(chunk_hash, chunk_data)
+            else:
+                chunk_file_path = os.path.join(chunks_dir, f"chunk_{chunk_index}")
+                with open(chunk_file_path, 'wb') as chunk_f:
+                    chunk_f.write(chunk_data)
             chunk_index += 1
 
     return file_hash_obj.hexdigest(), chunk_hashes
@@ -46,3 +57,14 @@ def reassemble_chunks(chunks_dir, output_file, total_chunks):
                 f_out.write(f_in.read())
     print(f"Arquivo '{output_file}' reconstruido com sucesso a partir de {total_chunks} chunks.")
 
+
+
+def assemble_from_store(store, chunk_hashes, output_file):
+    """Monta um arquivo a partir dos chunks do repositorio enderecado por hash."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'wb') as f_out:
+        for chunk_hash in chunk_hashes:
+            if not store.has(chunk_hash):
+                raise FileNotFoundError(f"Chunk ausente no repositorio: {chunk_hash}")
+            with open(store.path(chunk_hash), 'rb') as f_in:
+                f_out.write(f_in.read())
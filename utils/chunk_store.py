@@ -0,0 +1,136 @@
+import os
+import string
+import threading
+import uuid
+
+from utils.config import CHUNK_STORE_BYTES
+
+# Pasta do repositorio de chunks do peer (ao lado de shared/ e downloads/)
+CHUNK_STORE_FOLDER = 'chunks'
+
+
+class ChunkStore:
+    """Chunks guardados pelo proprio hash: <raiz>/<2 primeiros digitos>/<hash>.
+
+    Conteudo repetido (o mesmo arquivo com outro nome, versoes que mudam poucos
+    chunks, blocos iguais dentro do arquivo) ocupa um so arquivo no disco, e
+    um pedido pelo hash e atendido seja qual for o nome do arquivo de origem.
+    Um chunk so entra aqui depois de verificado, entao o nome garante o conteudo.
+
+    Chunks de arquivos anunciados e de downloads em andamento (ver pin) ficam;
+    os demais, sobras de downloads terminados, sao um cache limitado a
+    'max_bytes' e saem dos menos usados para os mais usados (ver trim).
+    """
+
+    def __init__(self, root=CHUNK_STORE_FOLDER, max_bytes=None):
+        self.root = root
+        self.max_bytes = max_bytes  # None = sem limite
+        self._pins = {}  # hash -> downloads em andamento que contam com o chunk
+        self._lock = threading.Lock()
+
+    def path(self, chunk_hash):
+        # O hash vem da rede: so digitos hexadecimais, nada de '..' ou '/'
+        if not isinstance(chunk_hash, str) or not 32 <= len(chunk_hash) <= 128 \
+                or not all(c in string.hexdigits for c in chunk_hash):
+            raise ValueError(f"Hash de chunk invalido: {chunk_hash!r}")
+        chunk_hash = chunk_hash.lower()
+        return os.path.join(self.root, chunk_hash[:2], chunk_hash)
+
+    def has(self, chunk_hash):
+        try:
+            return os.path.exists(self.path(chunk_hash))
+        except ValueError:
+            return False
+
+    def put(self, chunk_hash, data):
+        """Grava um chunk ja verificado. Retorna False se ele ja estava no repositorio."""
+        path = self.path(chunk_hash)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Grava num temporario e renomeia: leitores nunca veem um chunk pela metade
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return True
+
+    def read(self, chunk_hash):
+        with open(self.path(chunk_hash), 'rb') as f:
+            return f.read()
+
+    def touch(self, chunk_hash):
+        """Marca o chunk como usado agora (ordem de descarte do trim)."""
+        try:
+            os.utime(self.path(chunk_hash))
+        except (OSError, ValueError):
+            pass
+
+    def pin(self, chunk_hashes):
+        """Segura os chunks no repositorio ate o unpin correspondente."""
+        with self._lock:
+            for chunk_hash in set(chunk_hashes):
+                self._pins[chunk_hash] = self._pins.get(chunk_hash, 0) + 1
+
+    def unpin(self, chunk_hashes):
+        with self._lock:
+            for chunk_hash in set(chunk_hashes):
+                count = self._pins.get(chunk_hash, 0) - 1
+                if count > 0:
+                    self._pins[chunk_hash] = count
+                else:
+                    self._pins.pop(chunk_hash, None)
+
+    def remove(self, chunk_hash):
+        """Apaga um chunk, exceto se um download em andamento conta com ele."""
+        with self._lock:
+            if chunk_hash in self._pins:
+                return False
+            try:
+                os.remove(self.path(chunk_hash))
+                return True
+            except (FileNotFoundError, ValueError):
+                return False
+
+    def _entries(self):
+        """(mtime, tamanho, hash) de cada chunk gravado."""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        with os.scandir(self.root) as prefixes:
+            for prefix in prefixes:
+                if not prefix.is_dir():
+                    continue
+                with os.scandir(prefix.path) as chunks:
+                    for chunk in chunks:
+                        if chunk.name.endswith('.tmp'):
+                            continue
+                        try:
+                            st = chunk.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((st.st_mtime, st.st_size, chunk.name))
+        return entries
+
+    def trim(self, keep=()):
+        """Descarta os chunks menos usados ate o repositorio caber em max_bytes.
+
+        Os de 'keep' (arquivos anunciados) e os presos por pin nunca saem.
+        Retorna quantos chunks foram apagados.
+        """
+        if self.max_bytes is None:
+            return 0
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, chunk_hash in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if chunk_hash not in keep and self.remove(chunk_hash):
+                total -= size
+                removed += 1
+        return removed
+
+
+# Repositorio do peer, compartilhado por anuncio, download e upload
+store = ChunkStore(max_bytes=CHUNK_STORE_BYTES)
@@ -41,11 +41,50 @@ def load_config():
     if data.get('tracker_ip') == 'auto':
         data['tracker_ip'] = detect_local_ip()
     data.setdefault('tracker_port', 9000)
+    # Orcamento de memoria (MB) do cache de chunks servidos pelo peer
+    env_cache = os.environ.get('CHUNK_CACHE_MB')
+    if env_cache:
+        try:
+            data['chunk_cache_mb'] = int(env_cache)
+        except ValueError:
+            pass
+    data.setdefault('chunk_cache_mb', 64)
+    # Limite (MB) do repositorio de chunks para o que sobra de downloads terminados
+    env_store = os.environ.get('CHUNK_STORE_MB')
+    if env_store:
+        try:
+            data['chunk_store_mb'] = int(env_store)
+        except ValueError:
+            pass
+    data.setdefault('chunk_store_mb', 1024)
+    # Uploads atendidos ao mesmo tempo pelo peer (os demais esperam numa fila)
+    env_slots = os.environ.get('UPLOAD_SLOTS')
+    if env_slots:
+        try:
+            data['upload_slots'] = int(env_slots)
+        except ValueError:
+            pass
+    data.setdefault('upload_slots', 4)
+    # Troca de listas de fontes entre peers (PEX); PEX=0 desliga
+    env_pex = os.environ.get('PEX')
+    if env_pex:
+        data['pex'] = env_pex.lower() not in ('0', 'false', 'no')
+    data.setdefault('pex', True)
+    # Cluster de trackers: lista "ip:porta"; o primeiro e o shard primario
+    env_shards = os.environ.get('TRACKER_SHARDS')
+    if env_shards:
+        data['tracker_shards'] = [s.strip() for s in env_shards.split(',') if s.strip()]
+    data.setdefault('tracker_shards', [])
     return data
 
 _data = load_config()
 TRACKER_HOST = _data['tracker_ip']
 TRACKER_PORT = _data['tracker_port']
+CHUNK_CACHE_BYTES = _data['chunk_cache_mb'] * 1024 * 1024
+CHUNK_STORE_BYTES = max(0, _data['chunk_store_mb']) * 1024 * 1024
+UPLOAD_SLOTS = max(1, _data['upload_slots'])
+PEX_ENABLED = bool(_data['pex'])
+TRACKER_SHARDS = _data['tracker_shards']
 
 
 def set_tracker_address(host: str, port: int):
@@ -55,3 +94,12 @@ def set_tracker_address(host: str, port: int):
         TRACKER_HOST = host
     if port:
         TRACKER_PORT = port
+
+
+def set_tracker_shards(shards):
+    """Ativa o modo cluster. O primeiro shard passa a ser o tracker padrao."""
+    global TRACKER_SHARDS
+    TRACKER_SHARDS = list(shards)
+    if TRACKER_SHARDS:
+        host, port = TRACKER_SHARDS[0].split(':')
+        set_tracker_address(host, int(port))
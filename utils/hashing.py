@@ -1,4 +1,32 @@
 import hashlib
 
-def calcular_hash(data):
-    return hashlib.sha256(data).hexdigest()
+# Algoritmos aceitos para hashes de arquivo e de chunk (campo "hash_algo" do anuncio).
+# Os dois geram 32 bytes (64 digitos hex); anuncios sem o campo sao sha256.
+HASH_ALGORITHMS = {
+    "sha256": hashlib.sha256,
+    "blake2b": lambda data=b'': hashlib.blake2b(data, digest_size=32),
+}
+DEFAULT_HASH_ALGO = "sha256"
+
+
+def new_hasher(algo=DEFAULT_HASH_ALGO, data=b''):
+    """Cria um objeto de hash incremental (update/hexdigest) do algoritmo pedido."""
+    try:
+        return HASH_ALGORITHMS[algo](data)
+    except KeyError:
+        raise ValueError(f"Algoritmo de hash nao suportado: {algo}") from None
+
+
+def negotiate(offered):
+    """Primeiro algoritmo da lista oferecida (em ordem de preferencia) que conhecemos.
+
+    Sem lista (tracker antigo) ou sem nada em comum, fica o sha256, que todos entendem.
+    """
+    for algo in offered or ():
+        if algo in HASH_ALGORITHMS:
+            return algo
+    return DEFAULT_HASH_ALGO
+
+
+def calcular_hash(data, algo=DEFAULT_HASH_ALGO):
+    return new_hasher(algo, data).hexdigest()
@@ -1,16 +1,174 @@
+import atexit
 import datetime
+import json
+import os
+import queue
+import sys
+import threading
+import time
 
+# Ordem de gravidade; mensagens abaixo do nivel configurado sao descartadas na hora
+LEVELS = {
+    "DEBUG": 10,
+    "NETWORK": 15,  # trafego por requisicao/chunk, o mais frequente
+    "INFO": 20,
+    "SUCCESS": 25,
+    "WARNING": 30,
+    "ERROR": 40,
+}
+COLORS = {
+    "INFO": "\033[94m",     # Azul
+    "SUCCESS": "\033[92m",  # Verde
+    "WARNING": "\033[93m",  # Amarelo
+    "ERROR": "\033[91m",    # Vermelho
+    "NETWORK": "\033[96m",  # Ciano (para tráfego de rede)
+}
+END_COLOR = "\033[0m"
 
-def log(msg, level="INFO"):
-    now = datetime.datetime.now().strftime("%H:%M:%S")
-    color_map = {
-        "INFO": "\033[94m",     # Azul
-        "SUCCESS": "\033[92m",  # Verde
-        "WARNING": "\033[93m",  # Amarelo
-        "ERROR": "\033[91m",    # Vermelho
-        "NETWORK": "\033[96m",  # Ciano (para tráfego de rede)
-    }
-    end_color = "\033[0m"
-    color = color_map.get(level.upper(), "")
-    print(f"{color}[{now}] [{level.upper()}] {msg}{end_color}")
+_threshold = LEVELS["INFO"]
+_format = "text"   # 'text' (colorido, como sempre foi) ou 'json' (uma linha por registro)
+_sample = {}       # nivel -> registra 1 a cada N mensagens
+_counters = {}
+_queue = None      # fila da thread de escrita; None = escrita sincrona
+_writer_thread = None
+_stream = sys.stdout
+_last_second = None
+_last_stamp = ""
 
+
+def _parse_sample(text):
+    sample = {}
+    for item in filter(None, (text or "").split(',')):
+        level, every = item.split(':')
+        sample[level.strip().upper()] = max(1, int(every))
+    return sample
+
+
+def configure(level=None, fmt=None, sample=None, async_writes=None, stream=None):
+    """Ajusta o backend de log. Os padroes vem de LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE e LOG_ASYNC.
+
+    sample: {"NETWORK": 10} registra so 1 a cada 10 mensagens daquele nivel.
+    async_writes: formata e escreve numa thread propria, fora do caminho de quem chamou.
+    """
+    global _threshold, _format, _sample, _stream
+    if level is not None:
+        _threshold = LEVELS.get(level.upper(), LEVELS["INFO"])
+    if fmt is not None:
+        _format = fmt
+    if sample is not None:
+        _sample = {k.upper(): max(1, int(v)) for k, v in sample.items()}
+        _counters.clear()
+    if stream is not None:
+        _stream = stream
+    if async_writes is not None:
+        if async_writes:
+            _start_writer()
+        else:
+            _stop_writer()
+
+
+def enabled(level):
+    """Permite pular a montagem de mensagens caras quando o nivel esta desligado."""
+    return LEVELS.get(level, 0) >= _threshold
+
+
+def log(msg, level="INFO", **fields):
+    priority = LEVELS.get(level)
+    if priority is None:
+        level = level.upper()
+        priority = LEVELS.get(level, LEVELS["INFO"])
+    if priority < _threshold:
+        return
+    every = _sample.get(level)
+    if every:
+        # Contador sem lock: sob concorrencia a amostragem fica aproximada, o que basta
+        n = _counters.get(level, 0)
+        _counters[level] = n + 1
+        if n % every:
+            return
+    record = (time.time(), level, msg, fields)
+    if _queue is not None:
+        _queue.put(record)
+    else:
+        _write([record])
+
+
+def _stamp(ts):
+    global _last_second, _last_stamp
+    second = int(ts)
+    if second != _last_second:
+        _last_stamp = datetime.datetime.fromtimestamp(second).strftime("%H:%M:%S")
+        _last_second = second
+    return _last_stamp
+
+
+def _render(record):
+    ts, level, msg, fields = record
+    if _format == "json":
+        return json.dumps({"ts": round(ts, 3), "level": level, "msg": str(msg), **fields}, default=str)
+    extra = "".join(f" {k}={v}" for k, v in fields.items())
+    return f"{COLORS.get(level, '')}[{_stamp(ts)}] [{level}] {msg}{extra}{END_COLOR}"
+
+
+def _write(records):
+    try:
+        _stream.write("\n".join(_render(r) for r in records) + "\n")
+        _stream.flush()
+    except (OSError, ValueError):
+        pass  # terminal fechado; log nunca derruba quem chamou
+
+
+def _writer(q):
+    while True:
+        batch = [q.get()]
+        # Junta o que ja estiver na fila numa unica escrita
+        while True:
+            try:
+                batch.append(q.get_nowait())
+            except queue.Empty:
+                break
+        stop = None in batch
+        records = [r for r in batch if r is not None]
+        if records:
+            _write(records)
+        if stop:
+            return
+
+
+def _start_writer():
+    global _queue, _writer_thread
+    if _queue is None:
+        _queue = queue.SimpleQueue()
+        _writer_thread = threading.Thread(target=_writer, args=(_queue,), daemon=True, name="log-writer")
+        _writer_thread.start()
+
+
+def _stop_writer():
+    """Esvazia a fila e volta a escrever de forma sincrona."""
+    global _queue
+    q, _queue = _queue, None
+    if q is not None:
+        q.put(None)
+        _writer_thread.join(timeout=5)
+
+
+def flush():
+    """Garante que tudo o que foi registrado ate agora ja foi escrito."""
+    if _queue is not None:
+        _stop_writer()
+        _start_writer()
+
+
+def _after_fork():
+    # A thread de escrita nao sobrevive ao fork (tracker multiprocesso): recria no filho
+    global _queue
+    if _queue is not None:
+        _queue = None
+        _start_writer()
+
+
+_sample = _parse_sample(os.environ.get("LOG_SAMPLE"))
+configure(level=os.environ.get("LOG_LEVEL", "INFO"), fmt=os.environ.get("LOG_FORMAT", "text"),
+          async_writes=os.environ.get("LOG_ASYNC", "0") == "1")
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(_stop_writer)
@@ -0,0 +1,320 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+# Perfil sob demanda do tracker e do peer, ligado e desligado em tempo de execucao
+# (acao "profile" do tracker, comando "profile" do peer_ctl):
+# - spans: tempo acumulado por acao/etapa ("tracker.announce", "download.store"...);
+# - captura: cProfile ou pilhas amostradas por uma janela de tempo, gravadas em PROFILE_DIR.
+# Desligado, span() so confere duas variaveis e devolve um objeto vazio.
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+CAPTURE_MODES = ("cprofile", "sample")
+DEFAULT_CAPTURE_SECONDS = 10.0
+MAX_CAPTURE_SECONDS = 300.0
+SAMPLE_INTERVAL = 0.005  # segundos entre amostras de pilha
+# Linhas do resumo em texto gravado junto do .prof
+SUMMARY_LINES = 40
+# No 3.12+ o cProfile usa sys.monitoring e um unico perfilador vale para todas as
+# threads; antes disso cada thread liga o seu ao entrar no span mais externo
+_SHARED_PROFILER = sys.version_info >= (3, 12)
+
+_spans_on = os.environ.get("PROFILE_SPANS", "").lower() in ("1", "true", "yes")
+_stats = {}  # span -> [contagem, segundos, maior duracao]
+_stats_lock = threading.Lock()
+_capture = None  # captura em andamento
+_last_capture = None  # resumo da ultima captura terminada
+_capture_lock = threading.Lock()
+_local = threading.local()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "started", "outermost")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        depth = getattr(_local, "depth", 0)
+        _local.depth = depth + 1
+        self.outermost = depth == 0
+        capture = _capture
+        if self.outermost and capture is not None:
+            capture.enter(self.name)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        _local.depth -= 1
+        if _spans_on:
+            with _stats_lock:
+                entry = _stats.get(self.name)
+                if entry is None:
+                    _stats[self.name] = [1, elapsed, elapsed]
+                else:
+                    entry[0] += 1
+                    entry[1] += elapsed
+                    if elapsed > entry[2]:
+                        entry[2] = elapsed
+        if self.outermost:
+            capture = getattr(_local, "capture", None)
+            if capture is not None:
+                capture.leave()
+        return False
+
+
+def span(name):
+    """Mede um trecho: `with span("tracker.announce"): ...`.
+
+    Spans aninhados contam cada um o proprio tempo (o externo inclui os internos).
+    """
+    if not _spans_on and _capture is None:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def set_spans(enabled):
+    global _spans_on
+    _spans_on = bool(enabled)
+
+
+def spans_enabled():
+    return _spans_on
+
+
+def reset_spans():
+    with _stats_lock:
+        _stats.clear()
+
+
+def span_stats():
+    """Tempos acumulados por span, do mais caro para o mais barato (em ms)."""
+    with _stats_lock:
+        items = [(name, list(entry)) for name, entry in _stats.items()]
+    items.sort(key=lambda item: item[1][1], reverse=True)
+    return {name: {"count": count, "total_ms": round(total * 1000, 3),
+                   "mean_ms": round(total * 1000 / count, 3), "max_ms": round(longest * 1000, 3)}
+            for name, (count, total, longest) in items}
+
+
+class _Capture:
+    """Uma janela de captura. Termina sozinha depois de 'seconds' e grava os arquivos."""
+
+    def __init__(self, mode, seconds, label, interval, all_threads):
+        self.mode = mode
+        self.seconds = seconds
+        self.interval = interval
+        self.all_threads = all_threads
+        self.started_at = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        self.base_path = os.path.abspath(os.path.join(PROFILE_DIR, f"{label or 'profile'}-{stamp}-{os.getpid()}-{mode}"))
+        self.files = []
+        self.samples = 0
+        self.error = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._profilers = []  # modo cprofile, um por thread (antes do 3.12)
+        self._profiling = 0  # threads com o perfilador ligado agora
+        self._shared = None
+        self._active = {}  # thread -> span mais externo em andamento (modo sample)
+        self._stacks = {}
+
+    # --- chamado pelos spans, na thread medida ---
+
+    def enter(self, name):
+        _local.capture = self
+        if self.mode == "sample":
+            self._active[threading.get_ident()] = name
+        elif not _SHARED_PROFILER:
+            with self._lock:
+                if self._stop.is_set():
+                    return
+                self._profiling += 1
+            if getattr(_local, "profiler_capture", None) is not self:
+                _local.profiler = cProfile.Profile()
+                _local.profiler_capture = self
+                with self._lock:
+                    self._profilers.append(_local.profiler)
+            _local.profiler.enable()
+            _local.profiling = True
+
+    def leave(self):
+        _local.capture = None
+        if self.mode == "sample":
+            self._active.pop(threading.get_ident(), None)
+        elif getattr(_local, "profiling", False):
+            _local.profiler.disable()
+            _local.profiling = False
+            with self._lock:
+                self._profiling -= 1
+
+    # --- thread da captura ---
+
+    def run(self):
+        try:
+            if self.mode == "sample":
+                self._sample()
+            else:
+                if _SHARED_PROFILER:
+                    self._shared = cProfile.Profile()
+                    self._shared.enable()
+                self._stop.wait(self.seconds)
+                if self._shared is not None:
+                    self._shared.disable()
+            self._stop.set()
+            self._write()
+        except Exception as e:
+            self.files = []
+            self.error = str(e)
+        finally:
+            _finish(self)
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        deadline = time.monotonic() + self.seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            active = dict(self._active)
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                root = active.get(ident)
+                if root is None:
+                    if not self.all_threads:
+                        continue
+                    root = names.get(ident) or f"thread-{ident}"
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(root)
+                key = ";".join(reversed(stack))
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+                self.samples += 1
+        self._stop.set()
+
+    def _write(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if self.mode == "sample":
+            # Formato "pilhas colapsadas": uma pilha por linha e o numero de amostras
+            # (entrada do flamegraph.pl, speedscope e similares)
+            path = self.base_path + ".folded"
+            with open(path, "w") as f:
+                for key, count in sorted(self._stacks.items(), key=lambda item: -item[1]):
+                    f.write(f"{key} {count}\n")
+            self.files = [path]
+            return
+        profilers = [self._shared] if self._shared is not None else self._drain_profilers()
+        if not profilers:
+            self.files = []
+            return
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        path = self.base_path + ".prof"
+        stats.dump_stats(path)
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        with open(self.base_path + ".txt", "w") as f:
+            f.write(summary.getvalue())
+        self.files = [path, self.base_path + ".txt"]
+
+    def _drain_profilers(self):
+        # Threads ainda dentro de um span desligam o proprio perfilador ao sair
+        deadline = time.monotonic() + 1.0
+        while self._profiling and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with self._lock:
+            return [p for p in self._profilers if p.getstats()]
+
+    def status(self):
+        return {"mode": self.mode, "seconds": self.seconds, "started_at": round(self.started_at, 3),
+                "remaining": round(max(0.0, self.started_at + self.seconds - time.time()), 3),
+                "samples": self.samples, "files": self.files, "error": self.error}
+
+
+def _finish(capture):
+    global _capture, _last_capture
+    with _capture_lock:
+        if _capture is capture:
+            _capture = None
+        _last_capture = capture.status()
+
+
+def start_capture(mode="sample", seconds=DEFAULT_CAPTURE_SECONDS, label="", interval=SAMPLE_INTERVAL,
+                  all_threads=False):
+    """Inicia uma captura em segundo plano e retorna o seu estado.
+
+    mode "cprofile" mede cada chamada de funcao dentro dos spans (.prof + resumo .txt);
+    "sample" anota a pilha das threads a cada 'interval' s (.folded). Com
+    all_threads, as threads fora de spans (ociosas inclusive) tambem entram.
+    """
+    global _capture
+    if mode not in CAPTURE_MODES:
+        raise ValueError(f"Modo de captura desconhecido: {mode}")
+    seconds = min(max(float(seconds), 0.1), MAX_CAPTURE_SECONDS)
+    with _capture_lock:
+        if _capture is not None:
+            raise RuntimeError("Já existe uma captura em andamento")
+        capture = _capture = _Capture(mode, seconds, label, max(float(interval), 0.001), all_threads)
+    threading.Thread(target=capture.run, name="profile-capture", daemon=True).start()
+    return capture.status()
+
+
+def stop_capture():
+    """Encerra a captura em andamento antes do prazo (os arquivos sao gravados mesmo assim)."""
+    capture = _capture
+    if capture is not None:
+        capture._stop.set()
+    return capture is not None
+
+
+def capture_status():
+    capture = _capture
+    return {"running": capture.status() if capture else None, "last": _last_capture}
+
+
+def handle_command(request, label=""):
+    """Atende {"op": ...} vindo da acao "profile" do tracker ou da API de controle do peer.
+
+    op: status | spans_on | spans_off | reset | capture (mode, seconds, interval, all_threads) | stop
+    """
+    op = request.get("op", "status")
+    try:
+        if op == "spans_on":
+            set_spans(True)
+        elif op == "spans_off":
+            set_spans(False)
+        elif op == "reset":
+            reset_spans()
+        elif op == "capture":
+            start_capture(request.get("mode", "sample"), request.get("seconds", DEFAULT_CAPTURE_SECONDS), label,
+                          request.get("interval", SAMPLE_INTERVAL), bool(request.get("all_threads")))
+        elif op == "stop":
+            stop_capture()
+        elif op != "status":
+            return {"status": False, "message": f"Operação de perfil desconhecida: {op}"}
+    except (TypeError, ValueError, RuntimeError) as e:
+        return {"status": False, "message": str(e)}
+    return {"status": True, "pid": os.getpid(), "spans_enabled": _spans_on, "spans": span_stats(),
+            "capture": capture_status()}
@@ -0,0 +1,37 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Balde de fichas: limita uma taxa media permitindo rajadas ate 'capacity'."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.timestamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.timestamp
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.timestamp = now
+
+    def try_consume(self, amount=1):
+        """Consome sem bloquear. Retorna 0 se conseguiu ou os segundos ate haver fichas."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    def consume(self, amount=1):
+        """Consome bloqueando ate que a taxa permita (pedidos maiores que a capacidade viram divida)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)